@@ -3,10 +3,12 @@ import streamlit as st
 from utils.auth import check_login
 from utils.lang import init_language
 from utils.database import initialize_db
-from modules import dashboard, families, products, gammas, measurements, users, features
+from utils.archive import archive_measurements_if_due
+from modules import dashboard, families, products, gammas, measurements, users, features, capability
 
-# Initialize database
+# Initialize database, move old measurements to the Parquet archive
 initialize_db()
+archive_measurements_if_due()
 
 st.set_page_config(
     page_title="SPaCial - SMART production control", 
@@ -28,6 +30,7 @@ if user_session:
         lang("features"),
         lang("gammas"),
         lang("measurements"),
+        lang("capability"),
         lang("users") if user_session["role"] == "admin" else ""
     ])
 
@@ -44,6 +47,8 @@ if user_session:
         gammas.app(lang)
     elif menu == lang("measurements"):
         measurements.app(lang)
+    elif menu == lang("capability"):
+        capability.app(lang)
     elif menu == lang("users") and user_session["role"] == "admin":
         users.app(lang)
     else:
@@ -0,0 +1,71 @@
+# =============================================================================
+# modules/capability.py
+import streamlit as st
+import plotly.graph_objects as go
+from datetime import datetime, timedelta
+from utils.database import get_db_connection
+from utils.capability import capability_table, CPK_TARGET
+
+WINDOWS = {"30d": 30, "90d": 90, "1y": 365, "all": None}
+HEATMAP_GAMMAS = 40
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_capability(since):
+    return capability_table(get_db_connection(), since)
+
+def app(lang):
+    st.title(f"📐 {lang('capability', 'Capability')}")
+
+    window = st.radio("Window", list(WINDOWS.keys()), index=1, horizontal=True, key="cap_window")
+    days = WINDOWS[window]
+    since = (datetime.now() - timedelta(days=days)).date().isoformat() if days else ""
+
+    df = load_capability(since)
+    measured = df[df["n"] > 1]
+    if measured.empty:
+        st.info("No measurements for the configured gamma features")
+        return
+
+    # KPIs
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Features", f"{len(measured)}/{len(df)}")
+    col2.metric(f"Cpk ≥ {CPK_TARGET}", f"{(measured['cpk'] >= CPK_TARGET).mean():.0%}")
+    col3.metric("Median Cpk", f"{measured['cpk'].median():.2f}")
+    col4.metric("PPM (all)", f"{measured['ppm'].mul(measured['n']).sum() / measured['n'].sum():,.0f}")
+
+    # Heatmap: worst gammas first, features of each gamma ordered worst to best
+    st.subheader("🌡️ Cpk by Gamma")
+    ranked = measured.assign(label=measured["product"] + " - " + measured["gamma"])
+    worst = ranked.groupby("label")["cpk"].min().nsmallest(HEATMAP_GAMMAS).index
+    ranked = ranked[ranked["label"].isin(worst)].sort_values("cpk")
+    ranked["rank"] = ranked.groupby("label").cumcount() + 1
+    z = ranked.pivot(index="label", columns="rank", values="cpk").reindex(worst)
+    names = ranked.pivot(index="label", columns="rank", values="feature").reindex(worst)
+
+    fig = go.Figure(go.Heatmap(
+        z=z.values, x=z.columns, y=z.index, text=names.values,
+        colorscale="RdYlGn", zmin=0, zmax=2 * CPK_TARGET,
+        hovertemplate="%{y}<br>%{text}<br>Cpk: %{z:.2f}<extra></extra>"
+    ))
+    fig.update_layout(xaxis_title="Feature (worst → best)", yaxis_autorange="reversed",
+                      height=max(300, 22 * len(z) + 120))
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Full table, sortable by any column
+    st.subheader("📋 Capability Table")
+    st.dataframe(
+        measured.sort_values("cpk"),
+        use_container_width=True,
+        hide_index=True,
+        column_order=["product", "gamma", "feature", "unit", "n", "mean", "lsl", "target", "usl",
+                      "cp", "cpk", "pp", "ppk", "ppm", "sigma_level"],
+        column_config={
+            "mean": st.column_config.NumberColumn("Mean", format="%.4f"),
+            "cp": st.column_config.NumberColumn("Cp", format="%.2f"),
+            "cpk": st.column_config.NumberColumn("Cpk", format="%.2f"),
+            "pp": st.column_config.NumberColumn("Pp", format="%.2f"),
+            "ppk": st.column_config.NumberColumn("Ppk", format="%.2f"),
+            "ppm": st.column_config.NumberColumn("PPM", format="%.0f"),
+            "sigma_level": st.column_config.NumberColumn("Sigma", format="%.2f"),
+        }
+    )
@@ -12,24 +12,19 @@ def app(lang):
     
     conn = get_db_connection()
     
-    # KPIs
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        total_products = pd.read_sql("SELECT COUNT(*) as count FROM products", conn).iloc[0]['count']
-        st.metric("Products", total_products)
-    
-    with col2:
-        total_features = pd.read_sql("SELECT COUNT(*) as count FROM features", conn).iloc[0]['count']
-        st.metric("Features", total_features)
+    # KPIs (one round trip for all four counts)
+    total_products, total_features, total_gammas, total_measurements = conn.execute("""
+        SELECT (SELECT COUNT(*) FROM products),
+               (SELECT COUNT(*) FROM features),
+               (SELECT COUNT(*) FROM gammas),
+               (SELECT COUNT(*) FROM measurements)
+    """).fetchone()
     
-    with col3:
-        total_gammas = pd.read_sql("SELECT COUNT(*) as count FROM gammas", conn).iloc[0]['count']
-        st.metric("Control Gammas", total_gammas)
-        
-    with col4:
-        total_measurements = pd.read_sql("SELECT COUNT(*) as count FROM measurements", conn).iloc[0]['count']
-        st.metric("Measurements", total_measurements)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Products", total_products)
+    col2.metric("Features", total_features)
+    col3.metric("Control Gammas", total_gammas)
+    col4.metric("Measurements", total_measurements)
     
     # Charts
     col1, col2 = st.columns(2)
@@ -37,14 +32,14 @@ def app(lang):
     with col1:
         st.subheader("📈 Measurements Trend")
         df_measurements = pd.read_sql("""
-            SELECT DATE(timestamp) as date, COUNT(*) as count 
-            FROM measurements 
-            GROUP BY DATE(timestamp)
-            ORDER BY date DESC LIMIT 30
+            SELECT day as date, SUM(count) as count, SUM(oos_count) as out_of_spec
+            FROM daily_rollups 
+            GROUP BY day
+            ORDER BY day DESC LIMIT 30
         """, conn)
         
         if not df_measurements.empty:
-            fig = px.line(df_measurements, x='date', y='count', title="Daily Measurements")
+            fig = px.line(df_measurements, x='date', y=['count', 'out_of_spec'], title="Daily Measurements")
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No measurement data")
@@ -73,6 +68,4 @@ def app(lang):
     """, conn)
     
     if not recent.empty:
-        st.dataframe(recent, use_container_width=True)
-    
-    conn.close()
\ No newline at end of file
+        st.dataframe(recent, use_container_width=True)
\ No newline at end of file
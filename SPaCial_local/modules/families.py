@@ -2,6 +2,7 @@
 
 # =============================================================================
 # modules/families.py
+import sqlite3
 import streamlit as st
 import pandas as pd
 from utils.database import get_db_connection
@@ -57,8 +58,10 @@ def app(lang):
                 
                 with col2:
                     if st.button(f"{lang('delete')}", key=f"del_fam_{family['id']}"):
-                        cursor.execute("DELETE FROM families WHERE id = ?", (family['id'],))
-                        conn.commit()
-                        st.rerun()
-    
-    conn.close()
\ No newline at end of file
+                        try:
+                            cursor.execute("DELETE FROM families WHERE id = ?", (family['id'],))
+                            conn.commit()
+                            st.rerun()
+                        except sqlite3.IntegrityError:
+                            conn.rollback()
+                            st.error("This family still has products. Delete or move them first.")
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 # =============================================================================
 # modules/features.py
+import sqlite3
 import streamlit as st
 import pandas as pd
 from utils.database import get_db_connection
@@ -84,8 +85,10 @@ def app(lang):
                     
                     with col2:
                         if st.button("Delete", key=f"del_feat_{feature['id']}"):
-                            cursor.execute("DELETE FROM features WHERE id = ?", (feature['id'],))
-                            conn.commit()
-                            st.rerun()
-    
-    conn.close()
\ No newline at end of file
+                            try:
+                                cursor.execute("DELETE FROM features WHERE id = ?", (feature['id'],))
+                                conn.commit()
+                                st.rerun()
+                            except sqlite3.IntegrityError:
+                                conn.rollback()
+                                st.error("This feature has measurements and cannot be deleted.")
\ No newline at end of file
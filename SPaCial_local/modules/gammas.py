@@ -1,5 +1,6 @@
 # =============================================================================
 # modules/gammas.py
+import sqlite3
 import streamlit as st
 import pandas as pd
 from utils.database import get_db_connection
@@ -143,8 +144,10 @@ def app(lang, user_session=None):
                     
                     # Delete gamma
                     if st.button("Delete", key=f"del_gamma_{gamma['id']}"):
-                        cursor.execute("DELETE FROM gammas WHERE id = ?", (gamma['id'],))
-                        conn.commit()
-                        st.rerun()
-    
-    conn.close()
+                        try:
+                            cursor.execute("DELETE FROM gammas WHERE id = ?", (gamma['id'],))
+                            conn.commit()
+                            st.rerun()
+                        except sqlite3.IntegrityError:
+                            conn.rollback()
+                            st.error("This gamma has measurements or operations. Deactivate it instead.")
@@ -4,9 +4,30 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.database import get_db_connection
+from utils.database import get_db_connection, insert_measurement
+from utils.archive import load_spc_series, read_archived
+from utils.export import FORMATS, export_query, offer_download
 from datetime import datetime
 
+def archived_export_rows(conn, gamma_id, feature_id):
+    """Archived measurements of one gamma/feature, in the column order of the export query"""
+    info = conn.execute("""
+        SELECT g.product_id, p.code, g.name, f.name, gf.lsl, gf.target, gf.usl, f.unit
+        FROM gammas g
+        JOIN products p ON g.product_id = p.id
+        JOIN features f ON f.id = ?
+        LEFT JOIN gamma_features gf ON gf.gamma_id = g.id AND gf.feature_id = f.id
+        WHERE g.id = ?
+    """, (feature_id, gamma_id)).fetchone()
+    if info is None:
+        return []
+    product_id, product, gamma, feature, lsl, target, usl, unit = info
+    cold = read_archived(product_id, gamma_id, feature_id,
+                         ["id", "serial_number", "value", "timestamp", "operator", "notes"])
+    cold = cold.astype(object).where(cold.notna(), None)
+    return [(id_, product, gamma, feature, serial, value, lsl, target, usl, unit, ts, operator, notes)
+            for id_, serial, value, ts, operator, notes in cold.itertuples(index=False)]
+
 def app(lang):
     st.title(f"📏 {lang('measurements')}")
     
@@ -71,11 +92,9 @@ def app(lang):
                                 """, conn, params=(gamma_id,)).iloc[0]['product_id']
                                 
                                 feature_id = feature_options[selected_feature]
-                                cursor.execute("""INSERT INTO measurements 
-                                                (product_id, gamma_id, feature_id, serial_number, value, timestamp, operator, notes) 
-                                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", 
-                                             (product_id, gamma_id, feature_id, serial_number, value, 
-                                              datetime.now().isoformat(), operator, notes))
+                                insert_measurement(cursor, int(product_id), int(gamma_id), int(feature_id),
+                                                   serial_number, value, datetime.now().isoformat(),
+                                                   operator, notes)
                                 conn.commit()
                                 st.success("Measurement added!")
                                 st.rerun()
@@ -136,16 +155,8 @@ def app(lang):
     if 'selected_gamma_filter' in locals() and 'selected_feature_filter' in locals() and selected_gamma_filter and selected_feature_filter:
         feature_id_filter = feature_filter_options[selected_feature_filter]
         
-        # Get measurement data
-        measurements_data = pd.read_sql("""
-            SELECT m.value, m.timestamp, m.serial_number, m.operator,
-                   gf.target, gf.usl, gf.lsl, f.unit, f.name as feature_name
-            FROM measurements m
-            JOIN gamma_features gf ON m.gamma_id = gf.gamma_id AND m.feature_id = gf.feature_id
-            JOIN features f ON m.feature_id = f.id
-            WHERE m.gamma_id = ? AND m.feature_id = ?
-            ORDER BY m.timestamp
-        """, conn, params=(gamma_id_filter, feature_id_filter))
+        # Get measurement data (SQLite + Parquet archive)
+        measurements_data = load_spc_series(conn, gamma_id_filter, feature_id_filter)
         
         if not measurements_data.empty:
             # SPC Control Chart
@@ -191,27 +202,52 @@ def app(lang):
             st.plotly_chart(fig, use_container_width=True)
             
             # Statistics
+            values = measurements_data['value']
+            mean, std = values.mean(), values.std()
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Mean", f"{measurements_data['value'].mean():.3f}")
+                st.metric("Mean", f"{mean:.3f}")
             with col2:
-                st.metric("Std Dev", f"{measurements_data['value'].std():.3f}")
+                st.metric("Std Dev", f"{std:.3f}")
             with col3:
-                if measurements_data['value'].std() > 0:
-                    cpk = min((usl - measurements_data['value'].mean()) / (3 * measurements_data['value'].std()),
-                             (measurements_data['value'].mean() - lsl) / (3 * measurements_data['value'].std()))
+                if std > 0:
+                    cpk = min(usl - mean, mean - lsl) / (3 * std)
                     st.metric("Cpk", f"{cpk:.2f}")
                 else:
                     st.metric("Cpk", "N/A")
             with col4:
-                out_of_spec = len(measurements_data[(measurements_data['value'] > usl) | (measurements_data['value'] < lsl)])
+                out_of_spec = int(((values > usl) | (values < lsl)).sum())
                 st.metric("Out of Spec", f"{out_of_spec}/{len(measurements_data)}")
             
             # Recent measurements table
             st.subheader("Recent Measurements")
             recent_measurements = measurements_data.tail(10)[['serial_number', 'value', 'timestamp', 'operator']]
             st.dataframe(recent_measurements, use_container_width=True, hide_index=True)
+            
+            # Export: archived rows first, then the ones streamed from SQLite
+            with st.expander("📤 Export Measurements"):
+                export_format = st.selectbox("Format", list(FORMATS), key="measurement_export_format")
+                if st.button("Export", key="measurement_export"):
+                    bar = st.progress(0.0, text="Exporting...")
+                    st.session_state.measurement_export = export_query(
+                        conn, """
+                            SELECT m.id, p.code AS product, g.name AS gamma, f.name AS feature,
+                                   m.serial_number, m.value, gf.lsl, gf.target, gf.usl, f.unit,
+                                   m.timestamp, m.operator, m.notes
+                            FROM measurements m
+                            JOIN products p ON m.product_id = p.id
+                            JOIN gammas g ON m.gamma_id = g.id
+                            JOIN features f ON m.feature_id = f.id
+                            LEFT JOIN gamma_features gf ON gf.gamma_id = m.gamma_id AND gf.feature_id = m.feature_id
+                            WHERE m.gamma_id = ? AND m.feature_id = ?
+                            ORDER BY m.timestamp
+                        """, (gamma_id_filter, feature_id_filter), export_format, "measurements",
+                        progress=lambda done, total: bar.progress(done / total if total else 1.0,
+                                                                  text=f"Exporting... {done:,}/{total:,}"),
+                        head=archived_export_rows(conn, gamma_id_filter, feature_id_filter)
+                    )
+                export = st.session_state.get("measurement_export")
+                if export:
+                    offer_download(export, "📥 Download", "measurement_export_download")
         else:
-            st.info("No measurements found for selected gamma and feature")
-    
-    conn.close()
\ No newline at end of file
+            st.info("No measurements found for selected gamma and feature")
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 # =============================================================================
 # modules/products.py
+import sqlite3
 import streamlit as st
 import pandas as pd
 from utils.database import get_db_connection
@@ -16,12 +17,12 @@ def app(lang):
     cursor = conn.cursor()
 
     filters = get_spc_filters(lang)
-    filter_family_id = ""
+    filter_family_id, filter_params = "", ()
     if filters:
         if filters["family_id"]:
-            filter_family_id = "WHERE family_id = "  + str(filters["family_id"])
+            filter_family_id, filter_params = "WHERE p.family_id = ?", (filters["family_id"],)
         elif filters["product_id"]:
-            filter_family_id = "WHERE product_id = " + str(filters["product_id"])
+            filter_family_id, filter_params = "WHERE p.id = ?", (filters["product_id"],)
 
     #st.write("Selected:", filters)
     
@@ -68,7 +69,7 @@ def app(lang):
         LEFT JOIN features feat ON p.id = feat.product_id
         {filter_family_id}
         GROUP BY p.id, p.code, p.name, f.name, p.description
-    """, conn)
+    """, conn, params=filter_params)
     
     if not products_df.empty:
         for idx, product in products_df.iterrows():
@@ -93,8 +94,10 @@ def app(lang):
                 
                 with col2:
                     if st.button(f"{lang('delete')}", key=f"del_prod_{product['id']}"):
-                        cursor.execute("DELETE FROM products WHERE id = ?", (product['id'],))
-                        conn.commit()
-                        st.rerun()
-    
-    conn.close()
\ No newline at end of file
+                        try:
+                            cursor.execute("DELETE FROM products WHERE id = ?", (product['id'],))
+                            conn.commit()
+                            st.rerun()
+                        except sqlite3.IntegrityError:
+                            conn.rollback()
+                            st.error("This product still has gammas or measurements. Delete them first.")
\ No newline at end of file
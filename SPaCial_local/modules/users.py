@@ -68,6 +68,4 @@ def app(lang, user_session=None):
                     if st.button("Delete", key=f"delete_{user['id']}"):
                         cursor.execute("DELETE FROM users WHERE id = ?", (user['id'],))
                         conn.commit()
-                        st.rerun()
-    
-    conn.close()
\ No newline at end of file
+                        st.rerun()
\ No newline at end of file
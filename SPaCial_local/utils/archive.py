@@ -0,0 +1,166 @@
+# =============================================================================
+# utils/archive.py
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import pandas as pd
+from utils.database import get_pool
+
+# pyarrow is optional: without it nothing is archived and reads stay on SQLite
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:
+    pa = None
+
+# Measurements older than ARCHIVE_AFTER_DAYS move from SQLite to Parquet files
+# partitioned as product_id=/feature_id=/month=/part-*.parquet (0 disables)
+ARCHIVE_DIR = Path(os.environ.get("SPC_ARCHIVE_DIR", "archive"))
+ARCHIVE_AFTER_DAYS = int(os.environ.get("SPC_ARCHIVE_AFTER_DAYS", 365))
+ARCHIVE_INTERVAL = 24 * 3600
+ARCHIVE_CHUNK_ROWS = 200_000
+_archive_lock = threading.Lock()
+_last_archive = 0.0
+
+COLUMNS = ["id", "product_id", "gamma_id", "feature_id", "serial_number",
+           "value", "timestamp", "operator", "notes"]
+SPC_COLUMNS = ["value", "timestamp", "serial_number", "operator"]
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("id", pa.int64()),
+        ("product_id", pa.int64()),
+        ("gamma_id", pa.int64()),
+        ("feature_id", pa.int64()),
+        ("serial_number", pa.string()),
+        ("value", pa.float64()),
+        ("timestamp", pa.string()),
+        ("operator", pa.string()),
+        ("notes", pa.string()),
+        ("month", pa.string()),
+    ])
+    PARTITIONING = ds.partitioning(
+        pa.schema([("product_id", pa.int64()), ("feature_id", pa.int64()), ("month", pa.string())]),
+        flavor="hive"
+    )
+    MONTH_PARTITIONING = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+
+def archive_available():
+    return pa is not None and ARCHIVE_AFTER_DAYS > 0
+
+def archive_measurements(conn, older_than_days=ARCHIVE_AFTER_DAYS):
+    """
+    Move measurements older than `older_than_days` into the Parquet archive.
+    Rows go by id chunks: each chunk's file is written, then its rows are
+    deleted and committed, so an interrupted run only redoes its last chunk
+    (same file names, and read_archived drops duplicated ids).
+    Daily rollups are kept, so trends still cover the archived history.
+    Returns the number of archived rows.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).date().isoformat()
+    # Rows inserted while archiving (even backdated ones) are left for the next run
+    last_id = conn.execute("SELECT MAX(id) FROM measurements").fetchone()[0] or 0
+
+    archived = 0
+    after = 0
+    while True:
+        chunk = conn.execute(f"""
+            SELECT {", ".join(COLUMNS)}, SUBSTR(timestamp, 1, 7) AS month
+            FROM measurements WHERE timestamp < ? AND id > ? AND id <= ?
+            ORDER BY id LIMIT ?
+        """, (cutoff, after, last_id, ARCHIVE_CHUNK_ROWS)).fetchall()
+        if not chunk:
+            return archived
+        first, after = chunk[0][0], chunk[-1][0]
+
+        table = pa.Table.from_arrays([pa.array(column, type=field.type)
+                                      for column, field in zip(zip(*chunk), SCHEMA)], schema=SCHEMA)
+        table = table.sort_by([("product_id", "ascending"), ("feature_id", "ascending"),
+                               ("timestamp", "ascending")])
+        ds.write_dataset(
+            table, ARCHIVE_DIR, format="parquet", partitioning=PARTITIONING,
+            basename_template=f"part-{first}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_partitions=1_000_000,
+        )
+        conn.execute("DELETE FROM measurements WHERE timestamp < ? AND id BETWEEN ? AND ?",
+                     (cutoff, first, after))
+        conn.commit()
+        archived += len(chunk)
+
+def _archive(pool):
+    conn = pool.get()
+    try:
+        archived = archive_measurements(conn)
+        if archived:
+            print(f"📦 Archived {archived} measurements")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Archiving failed: {e}")
+
+def archive_measurements_if_due():
+    """Archiving in a background thread (at most once per ARCHIVE_INTERVAL)"""
+    global _last_archive
+    if not archive_available():
+        return
+    with _archive_lock:
+        now = time.time()
+        if now - _last_archive < ARCHIVE_INTERVAL:
+            return
+        _last_archive = now
+    threading.Thread(target=_archive, args=(get_pool(),), daemon=True, name="archive").start()
+
+def read_archived(product_id, gamma_id, feature_id, columns=SPC_COLUMNS):
+    """
+    Archived rows of one gamma/feature, ordered by timestamp.
+    Only the feature's partition directory is opened (memory-mapped) and the
+    gamma filter is pushed down to the Parquet row groups.
+    """
+    folder = ARCHIVE_DIR / f"product_id={product_id}" / f"feature_id={feature_id}"
+    if pa is None or not folder.is_dir():
+        return pd.DataFrame(columns=columns)
+
+    dataset = ds.dataset(str(folder), format="parquet", partitioning=MONTH_PARTITIONING,
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    table = dataset.to_table(columns=["id", *[c for c in columns if c != "id"]],
+                             filter=pc.field("gamma_id") == gamma_id)
+    # A chunk rewritten after an interrupted run may leave a stale copy behind
+    frame = table.sort_by("timestamp").to_pandas().drop_duplicates("id")
+    return frame[columns].reset_index(drop=True)
+
+def load_spc_series(conn, gamma_id, feature_id):
+    """
+    SPC series for one gamma/feature: archived rows followed by the ones still
+    in SQLite, with the gamma limits and feature unit on every row.
+    """
+    hot = pd.read_sql("""
+        SELECT m.value, m.timestamp, m.serial_number, m.operator,
+               gf.target, gf.usl, gf.lsl, f.unit, f.name as feature_name
+        FROM measurements m
+        JOIN gamma_features gf ON m.gamma_id = gf.gamma_id AND m.feature_id = gf.feature_id
+        JOIN features f ON m.feature_id = f.id
+        WHERE m.gamma_id = ? AND m.feature_id = ?
+        ORDER BY m.timestamp
+    """, conn, params=(gamma_id, feature_id))
+
+    if pa is None or not ARCHIVE_DIR.is_dir():
+        return hot
+    product = conn.execute("SELECT product_id FROM gammas WHERE id = ?", (gamma_id,)).fetchone()
+    cold = read_archived(product[0], gamma_id, feature_id) if product else pd.DataFrame()
+    if cold.empty:
+        return hot
+
+    limits = conn.execute("""
+        SELECT gf.target, gf.usl, gf.lsl, f.unit, f.name
+        FROM gamma_features gf JOIN features f ON gf.feature_id = f.id
+        WHERE gf.gamma_id = ? AND gf.feature_id = ?
+    """, (gamma_id, feature_id)).fetchone()
+    if limits is None:
+        return hot
+    cold = cold.assign(**dict(zip(["target", "usl", "lsl", "unit", "feature_name"], limits)))
+    return pd.concat([cold, hot], ignore_index=True)
@@ -16,7 +16,6 @@ def authenticate_user(username, password):
                   (username, hash_password(password)))
     
     user = cursor.fetchone()
-    conn.close()
     
     if user:
         return {
@@ -0,0 +1,60 @@
+# =============================================================================
+# utils/capability.py
+import numpy as np
+import pandas as pd
+
+# Minimum Cpk for a capable feature
+CPK_TARGET = 1.33
+
+# d2 constant for moving ranges of two consecutive readings
+D2 = 1.128
+
+# One grouped pass over the daily rollups for every configured gamma feature.
+# The average moving range gives the within sigma (Cp/Cpk), all readings
+# together give the overall sigma (Pp/Ppk).
+CAPABILITY_SQL = """
+    SELECT p.code AS product, g.name AS gamma, f.name AS feature, f.unit,
+           gf.gamma_id, gf.feature_id, gf.lsl, gf.target, gf.usl,
+           COALESCE(r.n, 0) AS n, r.total, r.total_sq, r.oos, r.mr_sum, r.mr_count
+    FROM gamma_features gf
+    JOIN gammas g ON g.id = gf.gamma_id
+    JOIN products p ON p.id = g.product_id
+    JOIN features f ON f.id = gf.feature_id
+    LEFT JOIN (
+        SELECT gamma_id, feature_id,
+               SUM(count) AS n, SUM(sum) AS total, SUM(sum_sq) AS total_sq,
+               SUM(oos_count) AS oos, SUM(mr_sum) AS mr_sum, SUM(mr_count) AS mr_count
+        FROM daily_rollups
+        WHERE day >= ?
+        GROUP BY gamma_id, feature_id
+    ) r ON r.gamma_id = gf.gamma_id AND r.feature_id = gf.feature_id
+"""
+
+def capability_table(conn, since=""):
+    """
+    Cp, Cpk, Pp, Ppk, observed PPM and sigma level (3 x Cpk) for every
+    feature of every gamma, from rollup days >= `since` (ISO date, "" = all).
+    """
+    df = pd.read_sql(CAPABILITY_SQL, conn, params=(since,))
+
+    n = df["n"].to_numpy(float)
+    lsl = df["lsl"].to_numpy(float)
+    usl = df["usl"].to_numpy(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = df["total"].to_numpy(float) / n
+        overall_var = (df["total_sq"].to_numpy(float) - n * mean ** 2) / (n - 1)
+        # float rounding can leave a tiny negative variance
+        sigma_overall = np.sqrt(np.clip(overall_var, 0, None))
+        sigma_within = df["mr_sum"].to_numpy(float) / df["mr_count"].to_numpy(float) / D2
+
+        tolerance = usl - lsl
+        cp = tolerance / (6 * sigma_within)
+        cpk = np.minimum(usl - mean, mean - lsl) / (3 * sigma_within)
+        pp = tolerance / (6 * sigma_overall)
+        ppk = np.minimum(usl - mean, mean - lsl) / (3 * sigma_overall)
+        ppm = df["oos"].to_numpy(float) / n * 1e6
+
+    df = df.assign(mean=mean, sigma_within=sigma_within, sigma_overall=sigma_overall,
+                   cp=cp, cpk=cpk, pp=pp, ppk=ppk, ppm=ppm, sigma_level=3 * cpk)
+    df = df.drop(columns=["total", "total_sq", "oos", "mr_sum", "mr_count"])
+    return df.replace([np.inf, -np.inf], np.nan)
@@ -1,24 +1,147 @@
 
 # =============================================================================
 # utils/database.py
+import os
 import sqlite3
+import threading
+import streamlit as st
 import hashlib
 from pathlib import Path
 from datetime import datetime, timedelta
 import random
+import time
 
-DB_PATH = Path("spc.sqlite")
+# SPC_DB_PATH points the app at another database file (e.g. a generated benchmark set)
+DB_PATH = Path(os.environ.get("SPC_DB_PATH", "spc.sqlite"))
+
+# Daily rollups: how often the compaction job runs and how many days it rebuilds
+ROLLUP_COMPACTION_INTERVAL = 3600
+ROLLUP_COMPACTION_DAYS = 2
+_compaction_lock = threading.Lock()
+_last_compaction = 0.0
+
+# Connection profile: WAL lets readers run while a measurement is written,
+# NORMAL sync is safe under WAL, and reads go through a memory map
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+]
+BUSY_TIMEOUT = 10
+
+# Schema migrations, applied in order; PRAGMA user_version records the last one
+MIGRATIONS = [
+    # 1: indexes for the hot reads (SPC series, recent measurements, filters)
+    #    and for the foreign key checks run on deletes
+    [
+        """CREATE INDEX IF NOT EXISTS idx_measurements_gamma_feature_ts
+           ON measurements (gamma_id, feature_id, timestamp, value)""",
+        "CREATE INDEX IF NOT EXISTS idx_measurements_timestamp ON measurements (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_measurements_product ON measurements (product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_measurements_feature ON measurements (feature_id)",
+        "CREATE INDEX IF NOT EXISTS idx_gamma_features_feature ON gamma_features (feature_id)",
+        "CREATE INDEX IF NOT EXISTS idx_features_product ON features (product_id, name)",
+        "CREATE INDEX IF NOT EXISTS idx_products_family ON products (family_id, code)",
+        "CREATE INDEX IF NOT EXISTS idx_gammas_product ON gammas (product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_operations_gamma ON operations (gamma_id, step_number)",
+    ],
+    # 2: moving ranges (|reading - previous reading| of the same gamma feature)
+    #    summed per rollup day, for the capability within sigma
+    [
+        "ALTER TABLE daily_rollups ADD COLUMN mr_sum REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE daily_rollups ADD COLUMN mr_count INTEGER NOT NULL DEFAULT 0",
+        """UPDATE daily_rollups SET mr_sum = s.mr_sum, mr_count = s.mr_count
+           FROM (
+               SELECT DATE(timestamp) AS day, COALESCE(product_id, 0) AS product_id,
+                      COALESCE(gamma_id, 0) AS gamma_id, COALESCE(feature_id, 0) AS feature_id,
+                      TOTAL(mr) AS mr_sum, COUNT(mr) AS mr_count
+               FROM (SELECT *, ABS(value - LAG(value) OVER (
+                                   PARTITION BY gamma_id, feature_id ORDER BY timestamp)) AS mr
+                     FROM measurements)
+               GROUP BY 1, 2, 3, 4
+           ) s
+           WHERE daily_rollups.day = s.day AND daily_rollups.product_id = s.product_id
+             AND daily_rollups.gamma_id = s.gamma_id AND daily_rollups.feature_id = s.feature_id""",
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Compiled statements kept per connection (sqlite3 keys them by SQL text,
+# so pass values as parameters instead of formatting them into the query)
+STATEMENT_CACHE_SIZE = 256
+
+class ConnectionPool:
+    """
+    One connection per script thread. Connections of finished threads
+    (Streamlit starts a new one per rerun) are rolled back and reused.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._idle = []
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def get(self):
+        thread = threading.current_thread()
+        with self._lock:
+            conn = self._owners.get(thread)
+            if conn is None:
+                for finished in [t for t in self._owners if not t.is_alive()]:
+                    idle = self._owners.pop(finished)
+                    idle.rollback()
+                    self._idle.append(idle)
+                conn = self._idle.pop() if self._idle else self.connect()
+                self._owners[thread] = conn
+        return conn
+
+@st.cache_resource
+def get_pool(path=str(DB_PATH)):
+    return ConnectionPool(path)
 
 def get_db_connection():
-    return sqlite3.connect(DB_PATH)
+    """Pooled connection for the current thread (do not close it)"""
+    return get_pool().get()
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def initialize_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
+    rollups_missing = create_schema(cursor)
+    migrate(cursor)
+    
+    # Seed admin user if not exists
+    cursor.execute("SELECT COUNT(*) FROM users WHERE username='admin'")
+    if cursor.fetchone()[0] == 0:
+        hashed_pw = hash_password("admin")
+        cursor.execute("""INSERT INTO users (username, password, role, preferred_language) 
+                         VALUES (?, ?, ?, ?)""", ("admin", hashed_pw, "admin", "en"))
+        
+        # Add demo data
+        seed_demo_data(cursor)
+        rollups_missing = True
+    
+    # Build rollups from scratch for new or freshly seeded databases
+    if rollups_missing:
+        compact_rollups(cursor, days=None)
+    
+    conn.commit()
+
+    compact_rollups_if_due()
+
+def create_schema(cursor):
+    """Create missing tables. Returns True if daily_rollups was just created."""
     # Users table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
@@ -127,18 +250,37 @@ def initialize_db():
     )
     """)
     
-    # Seed admin user if not exists
-    cursor.execute("SELECT COUNT(*) FROM users WHERE username='admin'")
-    if cursor.fetchone()[0] == 0:
-        hashed_pw = hash_password("admin")
-        cursor.execute("""INSERT INTO users (username, password, role, preferred_language) 
-                         VALUES (?, ?, ?, ?)""", ("admin", hashed_pw, "admin", "en"))
-        
-        # Add demo data
-        seed_demo_data(cursor)
-    
-    conn.commit()
-    conn.close()
+    # Daily rollups (per day / product / gamma / feature) for trend charts
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='daily_rollups'")
+    rollups_missing = cursor.fetchone()[0] == 0
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL DEFAULT 0,
+        gamma_id INTEGER NOT NULL DEFAULT 0,
+        feature_id INTEGER NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        oos_count INTEGER NOT NULL DEFAULT 0,
+        sum REAL NOT NULL DEFAULT 0,
+        sum_sq REAL NOT NULL DEFAULT 0,
+        min REAL,
+        max REAL,
+        PRIMARY KEY (day, product_id, gamma_id, feature_id)
+    )
+    """)
+    return rollups_missing
+
+def migrate(cursor):
+    """Apply pending MIGRATIONS. Returns the schema version."""
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f"PRAGMA user_version = {number}")
+    if version < SCHEMA_VERSION:
+        cursor.execute("ANALYZE")
+    return SCHEMA_VERSION
 
 def seed_demo_data(cursor):
     # Families
@@ -184,4 +326,112 @@ def seed_demo_data(cursor):
                       (1, 1, f"SN{1000+i}", 
                        round(random.normalvariate(50.0, 0.05), 3),
                        (datetime.now() - timedelta(days=random.randint(0, 30))).isoformat(),
-                       "operator1"))
\ No newline at end of file
+                       "operator1"))
+
+# -----------------------------------------------------------------------------
+# Measurements & daily rollups
+
+# Out-of-spec test against the gamma limits (NULL limits never flag)
+OOS_SQL = "(m.value > gf.usl OR m.value < gf.lsl)"
+
+def insert_measurement(cursor, product_id, gamma_id, feature_id, serial_number,
+                       value, timestamp, operator, notes=None):
+    """Insert one measurement and fold it into its daily rollup row"""
+    cursor.execute("""SELECT value FROM measurements WHERE gamma_id IS ? AND feature_id IS ?
+                    ORDER BY timestamp DESC LIMIT 1""", (gamma_id, feature_id))
+    previous = cursor.fetchone()
+    moving_range = abs(value - previous[0]) if previous else 0.0
+
+    cursor.execute("""INSERT INTO measurements 
+                    (product_id, gamma_id, feature_id, serial_number, value, timestamp, operator, notes) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", 
+                 (product_id, gamma_id, feature_id, serial_number, value, timestamp, operator, notes))
+
+    cursor.execute("SELECT usl, lsl FROM gamma_features WHERE gamma_id = ? AND feature_id = ?",
+                   (gamma_id, feature_id))
+    limits = cursor.fetchone()
+    usl, lsl = limits if limits else (None, None)
+    oos = int((usl is not None and value > usl) or (lsl is not None and value < lsl))
+
+    cursor.execute("""
+        INSERT INTO daily_rollups 
+            (day, product_id, gamma_id, feature_id, count, oos_count, sum, sum_sq, min, max,
+             mr_sum, mr_count)
+        VALUES (DATE(?), ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, product_id, gamma_id, feature_id) DO UPDATE SET
+            count     = count + 1,
+            oos_count = oos_count + excluded.oos_count,
+            sum       = sum + excluded.sum,
+            sum_sq    = sum_sq + excluded.sum_sq,
+            min       = MIN(min, excluded.min),
+            max       = MAX(max, excluded.max),
+            mr_sum    = mr_sum + excluded.mr_sum,
+            mr_count  = mr_count + excluded.mr_count
+    """, (timestamp, product_id or 0, gamma_id or 0, feature_id or 0, oos,
+          value, value * value, value, value, moving_range, int(previous is not None)))
+
+def compact_rollups(cursor, days=ROLLUP_COMPACTION_DAYS):
+    """
+    Rebuild daily rollups from raw measurements.
+    days=None rebuilds everything, otherwise only the last `days` days.
+    A full rebuild only sees measurements still in SQLite (not the archive).
+    The moving range of the first rebuilt reading of each gamma feature is
+    taken against its last reading before the period, as insert_measurement does.
+    """
+    where = ""
+    cutoff = ""
+    if days is not None:
+        cutoff = (datetime.now() - timedelta(days=days)).date().isoformat()
+        where = "WHERE timestamp >= ?"
+        cursor.execute("DELETE FROM daily_rollups WHERE day >= ?", (cutoff,))
+    else:
+        cursor.execute("DELETE FROM daily_rollups")
+
+    cursor.execute(f"""
+        WITH recent AS (SELECT * FROM measurements {where}),
+        seeds AS (
+            SELECT k.gamma_id, k.feature_id,
+                   (SELECT p.value FROM measurements p
+                    WHERE p.gamma_id IS k.gamma_id AND p.feature_id IS k.feature_id AND p.timestamp < ?
+                    ORDER BY p.timestamp DESC LIMIT 1) AS value
+            FROM (SELECT DISTINCT gamma_id, feature_id FROM recent) k
+        )
+        INSERT INTO daily_rollups 
+            (day, product_id, gamma_id, feature_id, count, oos_count, sum, sum_sq, min, max,
+             mr_sum, mr_count)
+        SELECT DATE(m.timestamp),
+               COALESCE(m.product_id, 0), COALESCE(m.gamma_id, 0), COALESCE(m.feature_id, 0),
+               COUNT(*),
+               SUM(CASE WHEN {OOS_SQL} THEN 1 ELSE 0 END),
+               SUM(m.value), SUM(m.value * m.value), MIN(m.value), MAX(m.value),
+               TOTAL(m.mr), COUNT(m.mr)
+        FROM (SELECT *, ABS(value - LAG(value) OVER (
+                            PARTITION BY gamma_id, feature_id ORDER BY seed DESC, timestamp)) AS mr
+              FROM (SELECT product_id, gamma_id, feature_id, value, timestamp, 0 AS seed FROM recent
+                    UNION ALL
+                    SELECT NULL, gamma_id, feature_id, value, NULL, 1 FROM seeds)) m
+        LEFT JOIN gamma_features gf ON gf.gamma_id = m.gamma_id AND gf.feature_id = m.feature_id
+        WHERE m.seed = 0
+        GROUP BY DATE(m.timestamp), COALESCE(m.product_id, 0),
+                 COALESCE(m.gamma_id, 0), COALESCE(m.feature_id, 0)
+    """, (cutoff, cutoff) if where else (cutoff,))
+
+def _compact_recent_rollups(pool):
+    conn = pool.get()
+    try:
+        compact_rollups(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Rollup compaction failed: {e}")
+
+def compact_rollups_if_due():
+    """Compaction of recent days in a background thread (at most once per ROLLUP_COMPACTION_INTERVAL)"""
+    global _last_compaction
+    with _compaction_lock:
+        now = time.time()
+        if now - _last_compaction < ROLLUP_COMPACTION_INTERVAL:
+            return
+        _last_compaction = now
+    threading.Thread(target=_compact_recent_rollups, args=(get_pool(),), daemon=True,
+                     name="rollup-compaction").start()
@@ -0,0 +1,203 @@
+# =============================================================================
+# utils/export.py
+import csv
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+import streamlit as st
+
+# pyarrow and xlsxwriter are optional: without them Parquet / Excel are not offered
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# Query results are streamed from the SQLite cursor EXPORT_BATCH rows at a
+# time into a file under EXPORT_DIR, so exports never hold the whole result.
+# Files up to DOWNLOAD_LIMIT_MB are offered as a download, larger ones stay on
+# the server (Streamlit sends a download in a single websocket message).
+EXPORT_DIR = Path(os.environ.get("SPC_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "spc_exports")))
+EXPORT_BATCH = 5000
+EXCEL_ROWS = 1_048_575  # data rows per sheet, below the header
+DOWNLOAD_LIMIT_MB = 200
+KEEP_HOURS = 24
+
+FORMATS = {"CSV": ".csv", "NDJSON": ".ndjson"}
+if pa is not None:
+    FORMATS["Parquet"] = ".parquet"
+if xlsxwriter is not None:
+    FORMATS["Excel"] = ".xlsx"
+
+MIME_TYPES = {
+    ".csv": "text/csv",
+    ".ndjson": "application/x-ndjson",
+    ".parquet": "application/vnd.apache.parquet",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class Export(NamedTuple):
+    """A finished export file; `skipped` values did not fit their column type and were left empty"""
+    path: Path
+    skipped: int = 0
+
+
+def _new_path(name, fmt):
+    """Fresh export file, removing exports older than KEEP_HOURS"""
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - KEEP_HOURS * 3600
+    for old in EXPORT_DIR.iterdir():
+        if old.is_file() and old.stat().st_mtime < cutoff:
+            old.unlink(missing_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    fd, path = tempfile.mkstemp(prefix=f"{name}_{stamp}_", suffix=FORMATS[fmt], dir=EXPORT_DIR)
+    os.close(fd)
+    return Path(path)
+
+
+def _write_csv(path, columns, batches):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(rows)
+    return 0
+
+
+def _write_ndjson(path, columns, batches):
+    with open(path, "w", encoding="utf-8") as f:
+        for rows in batches:
+            f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+    return 0
+
+
+def _write_parquet(path, columns, batches):
+    writer = None
+    skipped = 0
+    try:
+        for rows in batches:
+            table = pa.table([_column(values) for values in zip(*rows)], names=columns)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            elif table.schema != writer.schema:
+                table, lost = _cast(table, writer.schema)
+                skipped += lost
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pq.write_table(pa.table({c: pa.array([], pa.string()) for c in columns}), path)
+    return skipped
+
+
+def _column(values):
+    """SQLite column values → Arrow array (columns mixing types become text)"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def _cast(table, schema):
+    """
+    Cast a batch to the file schema (an all-null column in the first batch has
+    type null). A column that does not cast is cast value by value, so only
+    the values that do not fit are left empty. Returns (table, values left empty).
+    """
+    columns = []
+    skipped = 0
+    for column, field in zip(table.columns, schema):
+        try:
+            columns.append(column.cast(field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            values = [_cast_value(v, field.type) for v in column]
+            skipped += sum(v is None for v in values) - column.null_count
+            columns.append(pa.array(values, field.type))
+    return pa.table(columns, schema=schema), skipped
+
+
+def _cast_value(value, typ):
+    try:
+        return value.cast(typ).as_py()
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return None
+
+
+def _write_excel(path, columns, batches):
+    book = xlsxwriter.Workbook(str(path), {"constant_memory": True, "nan_inf_to_errors": True,
+                                           "strings_to_formulas": False, "strings_to_urls": False})
+    sheet, row = None, EXCEL_ROWS + 1
+    for rows in batches:
+        for values in rows:
+            if row > EXCEL_ROWS:
+                sheet = book.add_worksheet()
+                sheet.write_row(0, 0, columns)
+                row = 1
+            sheet.write_row(row, 0, values)
+            row += 1
+    if sheet is None:
+        book.add_worksheet().write_row(0, 0, columns)
+    book.close()
+    return 0
+
+
+WRITERS = {"CSV": _write_csv, "NDJSON": _write_ndjson, "Parquet": _write_parquet, "Excel": _write_excel}
+
+
+def export_query(conn, sql, params=(), fmt="CSV", name="export", progress=None, head=()):
+    """
+    Stream a SQLite query into a new export file and return an Export.
+    `head` rows (same columns as the query, e.g. archived measurements) are
+    written first. progress(rows done, total rows) is called after every batch.
+    """
+    total = len(head) + conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+    cursor = conn.execute(sql, params)
+    columns = [d[0] for d in cursor.description]
+
+    def chunks():
+        for start in range(0, len(head), EXPORT_BATCH):
+            yield head[start:start + EXPORT_BATCH]
+        while rows := cursor.fetchmany(EXPORT_BATCH):
+            yield rows
+
+    def batches():
+        done = 0
+        for rows in chunks():
+            # BLOBs (none in the schema, but SQLite allows them anywhere) as hex text
+            yield [tuple(v.hex() if isinstance(v, bytes) else v for v in row) for row in rows]
+            done += len(rows)
+            if progress:
+                progress(done, total)
+
+    path = _new_path(name, fmt)
+    try:
+        skipped = WRITERS[fmt](path, columns, batches())
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    return Export(path, skipped)
+
+
+def offer_download(export, label, key):
+    """Download button for a finished export, or its server path when too large to send"""
+    path = export.path
+    if not path.exists():
+        return
+    if export.skipped:
+        st.warning(f"⚠️ {export.skipped:,} values did not fit their column type and were left empty")
+    size = path.stat().st_size
+    if size > DOWNLOAD_LIMIT_MB * 2**20:
+        st.info(f"📁 {path} ({size / 2**20:,.0f} MB)")
+        return
+    with path.open("rb") as f:
+        st.download_button(label, f, file_name=path.name, mime=MIME_TYPES[path.suffix], key=key)
@@ -58,8 +58,6 @@ def get_spc_filters(lang):
         )
     product_id = None if sel_product == ALL_PROD else product_map[sel_product]
 
-    conn.close()
-
     return {
         "family_id": family_id,
         "product_id": product_id
@@ -51,6 +51,7 @@ def get_default_translations():
         "features": "Features",
         "gammas": "Control Gammas",
         "measurements": "Measurements",
+        "capability": "Capability",
         "users": "Users",
         "access_denied": "Access denied",
         "login": "Login",
@@ -0,0 +1,120 @@
+# benchmarks/importtime.py
+"""
+Cold-start import profile.
+
+Runs `python -X importtime` on main.py and on every page module, each in a
+fresh interpreter, and reports cumulative import time. Fails if importing
+main.py pulls in a heavy library that `import streamlit` does not already load.
+
+    python benchmarks/importtime.py [--json report.json] [--top 15]
+"""
+
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Libraries that must only load when a page needs them
+HEAVY = ("pandas", "numpy", "plotly", "PIL", "pyarrow", "streamlit_drawable_canvas", "cv2", "easyocr")
+
+
+def read_pages() -> dict:
+    """Page registry from main.py, read without importing it"""
+    tree = ast.parse((ROOT / "main.py").read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign) and getattr(node.target, "id", None) == "PAGES":
+            return ast.literal_eval(node.value)
+    raise RuntimeError("PAGES registry not found in main.py")
+
+
+def profile(statement: str) -> list:
+    """Return [(module, self_us, cumulative_us)] for one import statement"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # the name column is " " + two spaces per nesting level + module
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    if proc.returncode:
+        raise RuntimeError(f"`{statement}` failed:\n{proc.stderr[-2000:]}")
+    return rows
+
+
+def loaded(rows) -> set:
+    return {name.strip() for name, _, _ in rows}
+
+
+def heavy_packages(modules) -> list:
+    return sorted({name.split(".")[0] for name in modules} & set(HEAVY))
+
+
+def total_ms(rows) -> float:
+    # top-level imports have no leading indentation
+    return sum(cum for name, _, cum in rows if not name.startswith(" ")) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list for main.py")
+    args = parser.parse_args()
+
+    baseline = profile("import streamlit")
+    startup = profile("import main")
+    heavy = heavy_packages(loaded(startup) - loaded(baseline))
+
+    report = {
+        "python": sys.version.split()[0],
+        "streamlit_ms": round(total_ms(baseline), 1),
+        "main_ms": round(total_ms(startup), 1),
+        "main_heavy_imports": heavy,
+        "slowest": [
+            {"module": name.strip(), "cumulative_ms": round(cum / 1000, 1)}
+            for name, _, cum in sorted(startup, key=lambda r: -r[2])[:args.top]
+        ],
+        "pages": {},
+    }
+    for page, module in read_pages().items():
+        try:
+            rows = profile(f"import main, {module}")
+        except RuntimeError as e:
+            report["pages"][page] = {"module": module, "error": str(e).splitlines()[-1]}
+            continue
+        report["pages"][page] = {
+            "module": module,
+            "first_visit_ms": round(sum(cum for name, _, cum in rows if name == module) / 1000, 1),
+            "heavy_imports": heavy_packages(loaded(rows) - loaded(baseline)),
+        }
+
+    print(f"import streamlit : {report['streamlit_ms']:8.1f} ms")
+    print(f"import main      : {report['main_ms']:8.1f} ms")
+    print("\nslowest imports under main.py:")
+    for row in report["slowest"]:
+        print(f"  {row['cumulative_ms']:8.1f} ms  {row['module']}")
+    print("\nfirst visit per page (on top of main.py):")
+    for page, row in report["pages"].items():
+        if "error" in row:
+            print(f"  {page:<16}   failed  {row['error']}")
+        else:
+            print(f"  {page:<16} {row['first_visit_ms']:8.1f} ms  {', '.join(row['heavy_imports'])}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    if heavy:
+        print(f"\nFAIL: main.py imports heavy modules at startup: {', '.join(heavy)}")
+        sys.exit(1)
+    print("\nOK: no heavy library is imported before the first page is opened")
+
+
+if __name__ == "__main__":
+    main()
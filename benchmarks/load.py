@@ -0,0 +1,231 @@
+# benchmarks/load.py
+"""
+Load benchmark for the main page data paths at each synthetic scale.
+
+For every scale it (re)generates the data set with benchmarks/synthetic.py,
+then times the queries behind the filters, dashboard, characteristics
+listing, SPC analysis and admin CRUD, against MongoDB (the real utils
+functions, caches cleared before each run) and/or SPaCial_local's SQLite
+file (the pages' SQL). Results are written as a JSON report that can be
+compared with an earlier one.
+
+    python benchmarks/load.py --scales small medium --target sqlite --out load.json
+    python benchmarks/load.py --scales small --target mongo sqlite --compare load.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+import synthetic
+
+ROOT = synthetic.ROOT
+
+
+def timed(fn, repeat: int) -> dict:
+    """Run fn `repeat` times, return min/median/max in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {
+        "min_ms": round(min(samples), 2),
+        "median_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+# -----------------------------------------------------------------------------
+# MongoDB paths (utils/* as used by the pages)
+
+def mongo_paths(db_name: str) -> dict:
+    os.environ["MONGO_DB"] = db_name
+    sys.path.insert(0, str(ROOT))
+    from utils.mongo import get_db
+    from utils import repository
+    from utils.kpis import get_dashboard_kpis
+    from utils.rollups import get_monthly_production, get_characteristic_trend
+    from utils.measurement_store import find_measurements, count_measurements
+
+    db = get_db()
+    family = db.families.find_one({}, sort=[("name", 1)])
+    char = db.characteristics.find_one({}, skip=db.characteristics.estimated_document_count() // 2)
+    op = db.operations.find_one({"_id": char["operation_id"]})
+    route = db.routes.find_one({"_id": op["route_id"]})
+    since = datetime.now(timezone.utc) - timedelta(days=30)
+
+    def uncached(*funcs):
+        for func in funcs:
+            func.clear()
+
+    def filters():
+        uncached(repository.list_ateliers, repository.list_families, repository.list_products)
+        repository.list_ateliers()
+        repository.list_families()
+        repository.list_products(family["_id"])
+
+    def dashboard():
+        uncached(get_dashboard_kpis, get_monthly_production)
+        get_dashboard_kpis()
+        get_monthly_production()
+
+    def characteristics():
+        uncached(repository.process_tree)
+        repository.process_tree(route["product_id"])
+
+    def spc():
+        uncached(get_characteristic_trend)
+        meta = {"characteristic_id": char["_id"]}
+        count_measurements(meta, since)
+        find_measurements(meta, since, limit=500)
+        get_characteristic_trend(char["_id"])
+
+    def admin_crud():
+        list(db.products.find({}))
+        _id = db.products.insert_one({"code": f"BENCH-{time.time_ns()}", "name": "bench"}).inserted_id
+        db.products.update_one({"_id": _id}, {"$set": {"name": "bench (edited)"}})
+        db.products.delete_one({"_id": _id})
+        repository.invalidate("products")
+
+    return {"filters": filters, "dashboard": dashboard, "characteristics": characteristics,
+            "spc": spc, "admin_crud": admin_crud}
+
+
+# -----------------------------------------------------------------------------
+# SQLite paths (the SQL issued by SPaCial_local pages)
+
+def sqlite_paths(path: Path) -> dict:
+    conn = sqlite3.connect(path)
+    family_id = conn.execute("SELECT id FROM families ORDER BY name LIMIT 1").fetchone()[0]
+    gamma_id, feature_id = conn.execute(
+        "SELECT gamma_id, feature_id FROM gamma_features LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM gamma_features)"
+    ).fetchone()
+
+    def filters():
+        conn.execute("SELECT id, name FROM families ORDER BY name").fetchall()
+        conn.execute("SELECT id, code FROM products WHERE family_id = ? ORDER BY code", (family_id,)).fetchall()
+
+    def dashboard():
+        conn.execute("""SELECT (SELECT COUNT(*) FROM products), (SELECT COUNT(*) FROM features),
+                               (SELECT COUNT(*) FROM gammas), (SELECT COUNT(*) FROM measurements)""").fetchone()
+        pd.read_sql("""SELECT day as date, SUM(count) as count, SUM(oos_count) as out_of_spec
+                       FROM daily_rollups GROUP BY day ORDER BY day DESC LIMIT 30""", conn)
+        pd.read_sql("""SELECT f.name, COUNT(p.id) as count FROM families f
+                       LEFT JOIN products p ON f.id = p.family_id GROUP BY f.name""", conn)
+        pd.read_sql("""SELECT p.code as product, f.name as feature, m.value, m.timestamp, m.operator
+                       FROM measurements m JOIN products p ON m.product_id = p.id
+                       JOIN features f ON m.feature_id = f.id
+                       ORDER BY m.timestamp DESC LIMIT 10""", conn)
+
+    def characteristics():
+        pd.read_sql("""SELECT f.id, f.name, f.description, f.nominal, f.tolerance_plus, f.tolerance_minus,
+                              f.unit, f.measurement_type, p.code as product_code, p.name as product_name
+                       FROM features f JOIN products p ON f.product_id = p.id
+                       ORDER BY p.code, f.name""", conn)
+
+    def spc():
+        pd.read_sql("""SELECT m.value, m.timestamp, m.serial_number, m.operator,
+                              gf.target, gf.usl, gf.lsl, f.unit, f.name as feature_name
+                       FROM measurements m
+                       JOIN gamma_features gf ON m.gamma_id = gf.gamma_id AND m.feature_id = gf.feature_id
+                       JOIN features f ON m.feature_id = f.id
+                       WHERE m.gamma_id = ? AND m.feature_id = ?
+                       ORDER BY m.timestamp""", conn, params=(gamma_id, feature_id))
+
+    def admin_crud():
+        pd.read_sql("""SELECT p.id, p.code, p.name, f.name as family_name, p.description,
+                              COUNT(feat.id) as feature_count
+                       FROM products p LEFT JOIN families f ON p.family_id = f.id
+                       LEFT JOIN features feat ON p.id = feat.product_id
+                       GROUP BY p.id, p.code, p.name, f.name, p.description""", conn)
+        cur = conn.execute("INSERT INTO products (code, name, family_id) VALUES (?, 'bench', ?)",
+                           (f"BENCH-{time.time_ns()}", family_id))
+        conn.execute("UPDATE products SET name = 'bench (edited)' WHERE id = ?", (cur.lastrowid,))
+        conn.execute("DELETE FROM products WHERE id = ?", (cur.lastrowid,))
+        conn.commit()
+
+    return {"filters": filters, "dashboard": dashboard, "characteristics": characteristics,
+            "spc": spc, "admin_crud": admin_crud}
+
+
+# -----------------------------------------------------------------------------
+
+def git_commit() -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip()
+
+
+def compare(report: dict, baseline: dict):
+    """Print median ratios (new / baseline) for every path present in both reports"""
+    print("\npath                                   baseline    current   ratio")
+    for scale, targets in report["scales"].items():
+        for target in ("mongo", "sqlite"):
+            for path, stats in targets.get(target, {}).items():
+                old = baseline.get("scales", {}).get(scale, {}).get(target, {}).get(path)
+                if not old:
+                    continue
+                ratio = stats["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+                print(f"{scale:<7}{target:<7}{path:<24}{old['median_ms']:9.1f}{stats['median_ms']:11.1f}{ratio:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", nargs="+", choices=synthetic.SCALES, default=["small"])
+    parser.add_argument("--target", nargs="+", choices=["mongo", "sqlite"], default=["sqlite"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reuse", action="store_true", help="reuse data generated by an earlier run")
+    parser.add_argument("--out", default=None, help="JSON report path")
+    parser.add_argument("--compare", default=None, help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "scales": {},
+    }
+
+    for scale in args.scales:
+        params = synthetic.scale_params(scale)
+        factory = None if args.reuse else synthetic.build_factory(params)
+        result = report["scales"][scale] = {"params": params, "generate_s": {}}
+        print(f"== {scale}: {params}")
+
+        if "mongo" in args.target:
+            db_name = f"spacial_bench_{scale}"
+            if factory is not None:
+                result["generate_s"]["mongo"] = synthetic.write_mongo(factory, db_name)
+            result["mongo"] = {name: timed(fn, args.repeat) for name, fn in mongo_paths(db_name).items()}
+
+        if "sqlite" in args.target:
+            path = synthetic.DATA_DIR / f"spc_{scale}.sqlite"
+            if factory is not None:
+                result["generate_s"]["sqlite"] = synthetic.write_sqlite(factory, path)
+            result["sqlite"] = {name: timed(fn, args.repeat) for name, fn in sqlite_paths(path).items()}
+
+        for target in ("mongo", "sqlite"):
+            for name, stats in result.get(target, {}).items():
+                print(f"  {target:<7}{name:<18}{stats['median_ms']:10.1f} ms (min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f})")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.out}")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
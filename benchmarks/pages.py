@@ -0,0 +1,320 @@
+# benchmarks/pages.py
+"""
+Headless end-to-end page benchmark built on streamlit.testing.v1.AppTest.
+
+Drives main.py (MongoDB) and SPaCial_local/main.py (SQLite) through every
+menu entry plus common interactions (filter changes, editor saves, SPC
+selection). Each page runs in its own worker process so peak RSS is per
+page. For every step it records wall time, query count and peak RSS, and
+it exits non-zero when a step regresses past --threshold against a
+--baseline report.
+
+    python benchmarks/pages.py --app main local --backend mongomock --scale small --out pages.json
+    python benchmarks/pages.py --app main --backend mongod --mongo-uri mongodb://localhost:27017 \\
+        --baseline pages.json --threshold 0.25
+
+Backends for main.py: `mongod` (a running server, data generated into
+spacial_bench_<scale> unless --no-generate) or `mongomock` (in memory,
+generated inside each worker with at most 10k measurements; mongomock
+lacks $unionWith/$merge, so the dashboard KPIs and rollups report errors
+there). SPaCial_local always runs on benchmarks/data/spc_<scale>.sqlite.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import synthetic
+from importtime import read_pages
+
+ROOT = synthetic.ROOT
+LOCAL_ROOT = ROOT / "SPaCial_local"
+LOCAL_PAGES = ["home", "families", "products", "features", "gammas", "measurements", "capability", "users"]
+RESULT_PREFIX = "RESULT "
+
+# mongomock is pure Python: keep its data set small and skip the rollup
+# compaction ($merge is not implemented there)
+MONGOMOCK_MAX_MEASUREMENTS = 10_000
+
+# Regressions smaller than these are noise, whatever the ratio
+NOISE_MS = 50
+NOISE_QUERIES = 2
+NOISE_RSS_MB = 20
+
+
+# -----------------------------------------------------------------------------
+# Interactions (run inside the worker, on a live AppTest)
+
+def _select(at, key, index=1):
+    box = at.selectbox(key=key)
+    if len(box.options) > index:
+        box.set_value(box.options[index])
+    return at.run()
+
+
+def _click(at, *words):
+    for button in at.button:
+        if all(w.lower() in str(button.label).lower() for w in words):
+            return button.click().run()
+    return at.run()
+
+
+def _select_product(at):
+    return _select(at, "filter_product")
+
+
+def _spc_select(at):
+    # last characteristic and a wider window
+    boxes = [b for b in at.selectbox if b.key is None]
+    if boxes:
+        boxes[-1].set_value(boxes[-1].options[-1])
+    at.radio(key="meas_window").set_value("30d")
+    return at.run()
+
+
+MAIN_STEPS = {
+    "products": [("filter", lambda at: _select(at, "filter_family")),
+                 ("editor_save", lambda at: _click(at, "save"))],
+    "routes": [("product", _select_product),
+               ("editor_save", lambda at: _click(at, "save", "route"))],
+    "characteristics": [("product", _select_product)],
+    "measurements": [("product", _select_product),
+                     ("spc_select", _spc_select)],
+}
+
+
+def _local_spc_select(at):
+    _select(at, "gamma_filter", -1)
+    return _select(at, "feature_filter", -1)
+
+
+def _local_add_measurement(at):
+    at.text_input[0].input("BENCH-0001")
+    return _click(at, "add")
+
+
+LOCAL_STEPS = {
+    "measurements": [("spc_select", _local_spc_select),
+                     ("add_measurement", _local_add_measurement)],
+}
+
+
+# -----------------------------------------------------------------------------
+# Worker
+
+class SQLiteQueryCounter:
+    """Counts statements on every sqlite3 connection opened by the app"""
+
+    def __init__(self):
+        import sqlite3
+        self.count = 0
+        connect = sqlite3.connect
+
+        def counting_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        sqlite3.connect = counting_connect
+
+    def _trace(self, statement):
+        self.count += 1
+
+
+def _mongomock_support():
+    """
+    mongomock gaps the app's bootstrap relies on, plus query counting
+    (mongomock has no command monitoring).
+    """
+    import mongomock.collection
+    import mongomock.database
+    from utils import profiler
+
+    database = mongomock.database.Database
+    database.list_collections = lambda self, filter=None, **kw: iter(
+        {"name": name, "type": "timeseries" if name == "measurements" else "collection"}
+        for name in self.list_collection_names()
+        if not filter or name == filter.get("name")
+    )
+    create_collection = database.create_collection
+    database.create_collection = lambda self, name, **kw: create_collection(self, name)
+
+    collection = mongomock.collection.Collection
+    for method in ("find", "find_one", "aggregate", "count_documents", "estimated_document_count",
+                   "insert_one", "insert_many", "update_one", "update_many", "delete_one",
+                   "delete_many", "bulk_write", "create_indexes", "distinct"):
+        original = getattr(collection, method)
+
+        def counted(self, *args, __original=original, __name=method, **kwargs):
+            profiler.record_query(__name)
+            return __original(self, *args, **kwargs)
+
+        setattr(collection, method, counted)
+
+
+def _errors(at) -> list:
+    return [str(e.value)[:300] for e in at.exception] + [str(e.value)[:300] for e in at.error]
+
+
+def run_worker(app: str, page: str, scale: str, backend: str, timeout: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    if app == "main":
+        sys.path.insert(0, str(ROOT))
+        os.chdir(ROOT)
+        from utils import profiler
+        if backend == "mongomock":
+            _mongomock_support()
+            params = synthetic.scale_params(scale)
+            params["measurements"] = min(params["measurements"], MONGOMOCK_MAX_MEASUREMENTS)
+            synthetic.write_mongo(synthetic.build_factory(params), os.environ["MONGO_DB"],
+                                  log=lambda *a, **k: None, rollups=False)
+        queries = lambda: profiler.snapshot()["queries"]
+        at = AppTest.from_file(str(ROOT / "main.py"), default_timeout=timeout)
+        if page == "users":
+            at.session_state["user"] = {"username": "admin", "role": "admin"}
+        pages = [p for p in read_pages() if p != "users"] + ["users"]
+        steps = MAIN_STEPS.get(page, [])
+    else:
+        sys.path.insert(0, str(LOCAL_ROOT))
+        os.chdir(LOCAL_ROOT)
+        counter = SQLiteQueryCounter()
+        queries = lambda: counter.count
+        at = AppTest.from_file(str(LOCAL_ROOT / "main.py"), default_timeout=timeout)
+        pages = LOCAL_PAGES
+        steps = LOCAL_STEPS.get(page, [])
+
+    result = {"steps": {}}
+
+    def measure(name, action):
+        q0, t0 = queries(), time.perf_counter()
+        action()
+        result["steps"][name] = {
+            "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "queries": queries() - q0,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "errors": _errors(at),
+        }
+
+    if app == "local":
+        measure("login", lambda: (at.run(), at.text_input[0].input("admin"),
+                                  at.text_input[1].input("admin"), _click(at, "login")))
+    else:
+        measure("startup", at.run)
+
+    def navigate():
+        radio = at.sidebar.radio[0]
+        radio.set_value(radio.options[pages.index(page)]).run()
+
+    if page != "home":
+        measure("open", navigate)
+    measure("rerun", at.run)
+    for name, action in steps:
+        measure(name, lambda: action(at))
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Driver
+
+def run_page(app, page, args, env) -> dict:
+    cmd = [sys.executable, __file__, "--worker", app, page, "--scale", args.scale,
+           "--backend", args.backend, "--timeout", str(args.timeout)]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {"steps": {}, "failed": (proc.stderr or proc.stdout)[-1000:]}
+
+
+def find_regressions(report: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for key, page in report["pages"].items():
+        old_page = baseline.get("pages", {}).get(key, {})
+        for step, cur in page["steps"].items():
+            old = old_page.get("steps", {}).get(step)
+            if not old:
+                continue
+            for metric, noise in (("wall_ms", NOISE_MS), ("queries", NOISE_QUERIES), ("peak_rss_mb", NOISE_RSS_MB)):
+                if cur[metric] > old[metric] * (1 + threshold) and cur[metric] - old[metric] > noise:
+                    regressions.append(f"{key}/{step} {metric}: {old[metric]} → {cur[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--app", nargs="+", choices=["main", "local"], default=["main", "local"])
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--scale", choices=synthetic.SCALES, default="small")
+    parser.add_argument("--pages", nargs="+", default=None, help="only these page keys")
+    parser.add_argument("--no-generate", action="store_true", help="reuse generated data")
+    parser.add_argument("--timeout", type=int, default=120, help="AppTest timeout per run (s)")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--worker", nargs=2, metavar=("APP", "PAGE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(RESULT_PREFIX + json.dumps(run_worker(*args.worker, args.scale, args.backend, args.timeout)))
+        return
+
+    env = dict(os.environ)
+    env["MONGO_DB"] = f"spacial_bench_{args.scale}"
+    env["MONGO_URI"] = "mongomock://" if args.backend == "mongomock" else args.mongo_uri
+    env["SPC_DB_PATH"] = str(synthetic.DATA_DIR / f"spc_{args.scale}.sqlite")
+    env.setdefault("COOKIE_PASSWORD", "benchmark")
+
+    if not args.no_generate:
+        factory = synthetic.build_factory(synthetic.scale_params(args.scale))
+        if "local" in args.app:
+            synthetic.write_sqlite(factory, Path(env["SPC_DB_PATH"]))
+        if "main" in args.app and args.backend == "mongod":
+            os.environ.update(MONGO_URI=env["MONGO_URI"], MONGO_DB=env["MONGO_DB"])
+            synthetic.write_mongo(factory, env["MONGO_DB"])
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "backend": args.backend,
+        "pages": {},
+    }
+    for app in args.app:
+        pages = [p for p in read_pages()] if app == "main" else LOCAL_PAGES
+        for page in pages:
+            if args.pages and page not in args.pages:
+                continue
+            key = f"{app}:{page}"
+            result = report["pages"][key] = run_page(app, page, args, env)
+            if "failed" in result:
+                print(f"{key:<26} FAILED {result['failed'].splitlines()[-1] if result['failed'] else ''}")
+            for step, row in result["steps"].items():
+                flag = "  ⚠ " + row["errors"][0][:60] if row["errors"] else ""
+                print(f"{key:<26}{step:<16}{row['wall_ms']:9.1f} ms {row['queries']:6d} q "
+                      f"{row['peak_rss_mb']:8.1f} MB{flag}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.out}")
+
+    if args.baseline:
+        regressions = find_regressions(report, json.loads(Path(args.baseline).read_text()), args.threshold)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nOK: no regression above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/query_plans.py
+"""
+EXPLAIN QUERY PLAN checks for SPaCial_local's hot SQL.
+
+Builds a synthetic SQLite database (or opens --db), runs EXPLAIN QUERY PLAN
+on the queries behind the SPC chart, the dashboard, the filters, the
+capability overview and the measurement insert, and fails when one of them
+stops using its index (full table scan or a temporary B-tree for the ORDER BY).
+
+    python benchmarks/query_plans.py
+    python benchmarks/query_plans.py --db SPaCial_local/spc.sqlite -v
+"""
+
+import argparse
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import synthetic
+
+sys.path.insert(0, str(synthetic.ROOT / "SPaCial_local"))
+from utils.capability import CAPABILITY_SQL
+
+# name -> (sql, index the plan must use, tables/aliases that must not be scanned, ordered)
+HOT_QUERIES = {
+    "spc_series": ("""
+        SELECT m.value, m.timestamp, m.serial_number, m.operator,
+               gf.target, gf.usl, gf.lsl, f.unit, f.name as feature_name
+        FROM measurements m
+        JOIN gamma_features gf ON m.gamma_id = gf.gamma_id AND m.feature_id = gf.feature_id
+        JOIN features f ON m.feature_id = f.id
+        WHERE m.gamma_id = 1 AND m.feature_id = 1
+        ORDER BY m.timestamp""",
+        "idx_measurements_gamma_feature_ts", {"m", "gf", "f"}, True),
+    "recent_measurements": ("""
+        SELECT p.code as product, f.name as feature, m.value, m.timestamp, m.operator
+        FROM measurements m
+        JOIN products p ON m.product_id = p.id
+        JOIN features f ON m.feature_id = f.id
+        ORDER BY m.timestamp DESC LIMIT 10""",
+        "idx_measurements_timestamp", {"p", "f"}, True),
+    "rollup_compaction": ("""
+        SELECT DATE(m.timestamp), COUNT(*), SUM(m.value), TOTAL(m.mr)
+        FROM (SELECT *, ABS(value - LAG(value) OVER (
+                            PARTITION BY gamma_id, feature_id ORDER BY timestamp)) AS mr
+              FROM measurements WHERE timestamp >= '2024-01-01') m
+        LEFT JOIN gamma_features gf ON gf.gamma_id = m.gamma_id AND gf.feature_id = m.feature_id
+        GROUP BY DATE(m.timestamp), COALESCE(m.product_id, 0),
+                 COALESCE(m.gamma_id, 0), COALESCE(m.feature_id, 0)""",
+        "idx_measurements_gamma_feature_ts", {"measurements", "gf"}, False),
+    "capability": (
+        CAPABILITY_SQL.replace("?", "'2024-01-01'"),
+        "sqlite_autoindex_daily_rollups_1", {"daily_rollups", "gf", "g", "f"}, False),
+    "gamma_features_of_gamma": ("""
+        SELECT f.id, f.name, gf.target, gf.usl, gf.lsl, f.unit
+        FROM features f
+        JOIN gamma_features gf ON f.id = gf.feature_id
+        WHERE gf.gamma_id = 1""",
+        "sqlite_autoindex_gamma_features_1", {"f", "gf"}, False),
+    "gamma_limits": (
+        "SELECT usl, lsl FROM gamma_features WHERE gamma_id = 1 AND feature_id = 1",
+        "sqlite_autoindex_gamma_features_1", {"gamma_features"}, False),
+    "features_of_product": (
+        "SELECT name, nominal, tolerance_plus, tolerance_minus, unit FROM features WHERE product_id = 1",
+        "idx_features_product", {"features"}, False),
+    "products_of_family": (
+        "SELECT id, code FROM products WHERE family_id = 1 ORDER BY code",
+        "idx_products_family", {"products"}, True),
+    "gammas_of_product": (
+        "SELECT id, name FROM gammas WHERE product_id = 1",
+        "idx_gammas_product", {"gammas"}, False),
+}
+
+
+def explain(conn, sql: str) -> list:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def check_plan(plan: list, index: str, no_scan: set, ordered: bool) -> list:
+    """Problems found in one plan (empty list = OK)"""
+    problems = []
+    if not any(re.search(rf"\bINDEX {index}\b", step) for step in plan):
+        problems.append(f"does not use {index}")
+    for step in plan:
+        scan = re.match(r"SCAN (\w+)$", step)
+        if scan and scan.group(1) in no_scan:
+            problems.append(f"full scan of {scan.group(1)}")
+        if ordered and "TEMP B-TREE FOR ORDER BY" in step:
+            problems.append("sorts in a temporary B-tree")
+    return problems
+
+
+def build_database(path: Path, measurements: int) -> Path:
+    params = synthetic.scale_params("small", products=20, measurements=measurements)
+    synthetic.write_sqlite(synthetic.build_factory(params), path, log=lambda *a, **k: None)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=None, help="check this database instead of a generated one")
+    parser.add_argument("--measurements", type=int, default=20_000, help="size of the generated database")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.db) if args.db else build_database(Path(tmp) / "plans.sqlite", args.measurements)
+        conn = sqlite3.connect(path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        expected = synthetic.load_local_database().SCHEMA_VERSION
+        if version < expected:
+            print(f"WARNING: {path} is at schema version {version}, the app migrates it to {expected} on startup")
+
+        failures = 0
+        for name, (sql, index, no_scan, ordered) in HOT_QUERIES.items():
+            plan = explain(conn, sql)
+            problems = check_plan(plan, index, no_scan, ordered)
+            failures += bool(problems)
+            print(f"{'FAIL' if problems else 'ok  '}  {name:<26}{'; '.join(problems)}")
+            if args.verbose or problems:
+                for step in plan:
+                    print(f"        {step}")
+        conn.close()
+
+    if failures:
+        print(f"\nFAIL: {failures} of {len(HOT_QUERIES)} queries lost their index")
+        sys.exit(1)
+    print(f"\nOK: {len(HOT_QUERIES)} query plans use their indexes")
+
+
+if __name__ == "__main__":
+    main()
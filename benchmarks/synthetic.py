@@ -0,0 +1,380 @@
+# benchmarks/synthetic.py
+"""
+Synthetic large-factory data set for load testing.
+
+Builds ateliers, workstations, families, products with their routes,
+operations and characteristics, plus a measurement history per
+characteristic with drift, step shifts and outliers. Writes through the
+bulk APIs: unordered insert_many into MongoDB and executemany inside one
+transaction into an SPaCial_local SQLite file.
+
+    python benchmarks/synthetic.py --scale small --target sqlite
+    python benchmarks/synthetic.py --scale large --target mongo sqlite
+    python benchmarks/synthetic.py --scale medium --measurements 30000000 --target sqlite
+
+Mongo is reached through MONGO_URI (env or secrets) and written to the
+database given by --mongo-db, never to the app database unless --force.
+"""
+
+import argparse
+import importlib.util
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# Per-scale sizes. routes/operations/characteristics are per parent.
+SCALES = {
+    "small": dict(ateliers=4, workstations=12, families=6, products=50,
+                  routes=2, operations=3, characteristics=3,
+                  measurements=100_000, days=90),
+    "medium": dict(ateliers=8, workstations=60, families=12, products=1_000,
+                   routes=2, operations=4, characteristics=4,
+                   measurements=2_000_000, days=365),
+    "large": dict(ateliers=20, workstations=200, families=30, products=5_000,
+                  routes=3, operations=5, characteristics=5,
+                  measurements=20_000_000, days=730),
+}
+
+NOMINALS = np.array([2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0])
+OPERATORS = np.array([f"operator{i:02d}" for i in range(1, 13)])
+WS_STATUSES = np.array(["Active", "Active", "Active", "Active", "Maintenance", "Inactive"])
+
+# Rows generated (and written) per measurement chunk
+CHUNK_ROWS = 200_000
+
+
+# -----------------------------------------------------------------------------
+# Factory layout (index based, independent of the target database)
+
+def build_factory(params: dict, seed: int = 42) -> dict:
+    """
+    Master data as numpy arrays of parent indexes.
+    Every characteristic carries its ancestry and its process model.
+    """
+    rng = np.random.default_rng(seed)
+    n_products = params["products"]
+    n_routes = n_products * params["routes"]
+    n_ops = n_routes * params["operations"]
+    n_chars = n_ops * params["characteristics"]
+
+    nominal = rng.choice(NOMINALS, n_chars)
+    half_tol = np.round(nominal * rng.uniform(0.002, 0.01, n_chars), 4)
+    width = 2 * half_tol
+
+    return {
+        "params": params,
+        "ws_atelier": np.arange(params["workstations"]) % params["ateliers"],
+        "ws_status": rng.choice(WS_STATUSES, params["workstations"]),
+        "atelier_capacity": rng.integers(50, 500, params["ateliers"]),
+        "product_family": rng.integers(0, params["families"], n_products),
+        "route_product": np.repeat(np.arange(n_products), params["routes"]),
+        "route_workstation": rng.integers(0, params["workstations"], n_routes),
+        "op_route": np.repeat(np.arange(n_routes), params["operations"]),
+        "op_step": np.tile(np.arange(1, params["operations"] + 1), n_routes),
+        "char_op": np.repeat(np.arange(n_ops), params["characteristics"]),
+        "char_nominal": nominal,
+        "char_tol": half_tol,
+        # Process model: capability, centring bias and total drift over the period
+        "char_sigma": width / (6 * rng.uniform(0.8, 2.2, n_chars)),
+        "char_bias": rng.normal(0, 0.08, n_chars) * width,
+        "char_drift": rng.normal(0, 0.15, n_chars) * width,
+    }
+
+
+def char_ancestry(factory: dict):
+    """(operation, route, product, workstation, atelier) index per characteristic"""
+    op = factory["char_op"]
+    route = factory["op_route"][op]
+    product = factory["route_product"][route]
+    ws = factory["route_workstation"][route]
+    atelier = factory["ws_atelier"][ws]
+    return op, route, product, ws, atelier
+
+
+def iter_measurements(factory: dict, seed: int = 7, chunk_rows: int = CHUNK_ROWS):
+    """
+    Yield measurement chunks as dicts of numpy arrays (char, timestamp, value,
+    serial_number, operator, out_of_spec). Each characteristic gets an evenly
+    spread series with linear drift, random step shifts and rare outliers.
+    """
+    rng = np.random.default_rng(seed)
+    params = factory["params"]
+    n_chars = len(factory["char_op"])
+    total = params["measurements"]
+    counts = np.full(n_chars, total // n_chars)
+    counts[: total % n_chars] += 1
+
+    period_ms = params["days"] * 86_400_000
+    end = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), "ms")
+    start = end - np.timedelta64(period_ms, "ms")
+
+    per_chunk = max(1, chunk_rows // max(1, counts.max()))
+    serial = 0
+    for first in range(0, n_chars, per_chunk):
+        chars = np.arange(first, min(first + per_chunk, n_chars))
+        n = counts[chars]
+        if not n.sum():
+            continue
+        char = np.repeat(chars, n)
+        starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+        pos = np.arange(len(char)) - np.repeat(starts, n)
+        frac = (pos + rng.uniform(0, 1, len(char))) / np.repeat(n, n)
+
+        sigma = factory["char_sigma"][char]
+        # Step shifts: ~3 per series, cumulated within each series
+        shift_inc = np.where(
+            rng.uniform(0, 1, len(char)) < 3 / np.repeat(n, n),
+            rng.normal(0, 1.5, len(char)) * sigma,
+            0.0
+        )
+        cum = np.cumsum(shift_inc)
+        shift = cum - np.repeat((cum - shift_inc)[starts], n)
+        outlier = np.where(rng.uniform(0, 1, len(char)) < 0.001,
+                           rng.choice([-5.0, 5.0], len(char)) * sigma, 0.0)
+
+        nominal = factory["char_nominal"][char]
+        tol = factory["char_tol"][char]
+        value = np.round(
+            nominal + factory["char_bias"][char] + factory["char_drift"][char] * frac
+            + shift + rng.normal(0, 1, len(char)) * sigma + outlier,
+            4
+        )
+
+        yield {
+            "char": char,
+            "timestamp": start + (frac * period_ms).astype("timedelta64[ms]"),
+            "value": value,
+            "serial_number": np.char.mod("SN%09d", np.arange(serial, serial + len(char))),
+            "operator": rng.choice(OPERATORS, len(char)),
+            "out_of_spec": (value < nominal - tol) | (value > nominal + tol),
+        }
+        serial += len(char)
+
+
+# -----------------------------------------------------------------------------
+# MongoDB writer
+
+def write_mongo(factory: dict, db_name: str, force: bool = False, log=print, rollups: bool = True) -> dict:
+    """Drop `db_name` and load the factory into it. Returns timings in seconds."""
+    if db_name == "spacial" and not force:
+        raise SystemExit("Refusing to overwrite the app database `spacial` (use --force).")
+    os.environ["MONGO_DB"] = db_name
+    sys.path.insert(0, str(ROOT))
+    from utils.mongo import (get_client, get_db, ensure_measurements_collection,
+                             apply_index_manifest, create_admin_user,
+                             META_COLLECTION, SCHEMA_VERSION)
+    from utils.rollups import compact_rollups
+
+    get_client().drop_database(db_name)
+    db = get_db()
+    timings = {}
+    params = factory["params"]
+    t0 = time.perf_counter()
+
+    def insert(coll, docs):
+        return np.array(db[coll].insert_many(docs, ordered=False).inserted_ids, dtype=object)
+
+    family_ids = insert("families", [{"name": f"Family {i + 1:03d}"} for i in range(params["families"])])
+    atelier_ids = insert("ateliers", [
+        {"name": f"Atelier {i + 1:02d}", "capacity": int(cap), "status": "Active"}
+        for i, cap in enumerate(factory["atelier_capacity"])
+    ])
+    ws_ids = insert("workstations", [
+        {"name": f"WS {i + 1:04d}", "atelier_id": atelier_ids[a], "status": str(status)}
+        for i, (a, status) in enumerate(zip(factory["ws_atelier"], factory["ws_status"]))
+    ])
+    # process documents carry their ancestry ids (utils.mongo.ANCESTRY); families have no atelier
+    product_family = factory["product_family"]
+    route_family = product_family[factory["route_product"]]
+    product_ids = insert("products", [
+        {"code": f"P-{i + 1:05d}", "name": f"Product {i + 1:05d}", "family_id": family_ids[f],
+         "atelier_id": None, "description": "Synthetic product"}
+        for i, f in enumerate(factory["product_family"])
+    ])
+    route_ids = insert("routes", [
+        {"product_id": product_ids[p], "family_id": family_ids[route_family[i]], "atelier_id": None,
+         "workstation_id": ws_ids[w], "name": f"P-{p + 1:05d}-R{i % params['routes'] + 1}"}
+        for i, (p, w) in enumerate(zip(factory["route_product"], factory["route_workstation"]))
+    ])
+    op_ids = insert("operations", [
+        {"route_id": route_ids[r], "product_id": product_ids[factory["route_product"][r]],
+         "family_id": family_ids[route_family[r]], "atelier_id": None,
+         "step_number": int(step), "name": f"Op{step} - R{r + 1}",
+         "description": "", "image_path": None, "annotation_path": None}
+        for r, step in zip(factory["op_route"], factory["op_step"])
+    ])
+    op, route, product, ws, atelier = char_ancestry(factory)
+    char_ids = insert("characteristics", [
+        {"operation_id": op_ids[o], "route_id": route_ids[route[i]], "product_id": product_ids[product[i]],
+         "family_id": family_ids[product_family[product[i]]], "atelier_id": None, "name": f"C{i + 1:07d}", "designation": "Diameter", "unit": "mm",
+         "nominal": float(nom), "tol_min": -float(tol), "tol_max": float(tol),
+         "image_path": None, "annotation_path": None, "active": True}
+        for i, (o, nom, tol) in enumerate(zip(factory["char_op"], factory["char_nominal"], factory["char_tol"]))
+    ])
+    timings["master_s"] = time.perf_counter() - t0
+    log(f"  mongo master data: {len(char_ids)} characteristics in {timings['master_s']:.1f}s")
+
+    ensure_measurements_collection(db)
+    meta = [
+        {"characteristic_id": char_ids[c], "operation_id": op_ids[op[c]], "route_id": route_ids[route[c]],
+         "product_id": product_ids[product[c]], "family_id": family_ids[product_family[product[c]]],
+         "workstation_id": ws_ids[ws[c]], "atelier_id": atelier_ids[atelier[c]]}
+        for c in range(len(char_ids))
+    ]
+    lsl = (factory["char_nominal"] - factory["char_tol"]).tolist()
+    usl = (factory["char_nominal"] + factory["char_tol"]).tolist()
+
+    t0 = time.perf_counter()
+    written = 0
+    for chunk in iter_measurements(factory):
+        docs = [
+            {"timestamp": ts, "meta": meta[c], "value": v, "unit": "mm", "serial_number": sn,
+             "operator": opr, "lsl": lsl[c], "usl": usl[c], "out_of_spec": oos}
+            for c, ts, v, sn, opr, oos in zip(
+                chunk["char"].tolist(), chunk["timestamp"].tolist(), chunk["value"].tolist(),
+                chunk["serial_number"].tolist(), chunk["operator"].tolist(), chunk["out_of_spec"].tolist()
+            )
+        ]
+        db.measurements.insert_many(docs, ordered=False)
+        written += len(docs)
+        log(f"  mongo measurements: {written:,}/{params['measurements']:,}", end="\r")
+    timings["measurements_s"] = time.perf_counter() - t0
+    log(f"\n  mongo measurements written in {timings['measurements_s']:.1f}s")
+
+    t0 = time.perf_counter()
+    apply_index_manifest(db)
+    # admin + schema version first: the app must not re-seed this database
+    create_admin_user("admin", "admin")
+    db[META_COLLECTION].update_one({"_id": "schema"}, {"$set": {"version": SCHEMA_VERSION}}, upsert=True)
+    if rollups:
+        compact_rollups(days=None)
+    timings["indexes_rollups_s"] = time.perf_counter() - t0
+    return timings
+
+
+# -----------------------------------------------------------------------------
+# SQLite writer (SPaCial_local schema)
+
+def load_local_database():
+    """SPaCial_local/utils/database.py, loaded by path (its `utils` package clashes with ours)"""
+    path = ROOT / "SPaCial_local" / "utils" / "database.py"
+    spec = importlib.util.spec_from_file_location("spacial_local_database", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_sqlite(factory: dict, path: Path, log=print) -> dict:
+    """
+    Create a fresh SPaCial_local database at `path`.
+    Routes map to gammas, characteristics to features + gamma_features.
+    """
+    database = load_local_database()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    cursor = conn.cursor()
+    database.create_schema(cursor)
+    cursor.execute("INSERT INTO users (username, password, role, preferred_language) VALUES (?, ?, ?, ?)",
+                   ("admin", database.hash_password("admin"), "admin", "en"))
+
+    timings = {}
+    params = factory["params"]
+    t0 = time.perf_counter()
+    cursor.executemany("INSERT INTO families (id, name, description) VALUES (?, ?, ?)",
+                       ((i + 1, f"Family {i + 1:03d}", "Synthetic family") for i in range(params["families"])))
+    cursor.executemany("INSERT INTO products (id, code, name, family_id, description) VALUES (?, ?, ?, ?, ?)",
+                       ((i + 1, f"P-{i + 1:05d}", f"Product {i + 1:05d}", int(f) + 1, "Synthetic product")
+                        for i, f in enumerate(factory["product_family"])))
+    created = datetime.now().isoformat()
+    cursor.executemany("INSERT INTO gammas (id, product_id, name, description, created_date, active) VALUES (?, ?, ?, ?, ?, 1)",
+                       ((i + 1, int(p) + 1, f"P-{p + 1:05d}-R{i % params['routes'] + 1}", "", created)
+                        for i, p in enumerate(factory["route_product"])))
+    cursor.executemany("INSERT INTO operations (id, gamma_id, step_number, name, description) VALUES (?, ?, ?, ?, '')",
+                       ((i + 1, int(r) + 1, int(step), f"Op{step}")
+                        for i, (r, step) in enumerate(zip(factory["op_route"], factory["op_step"]))))
+
+    op, route, product, _, _ = char_ancestry(factory)
+    nominal, tol = factory["char_nominal"].tolist(), factory["char_tol"].tolist()
+    cursor.executemany("""INSERT INTO features (id, product_id, name, description, nominal, tolerance_plus,
+                              tolerance_minus, unit, measurement_type)
+                          VALUES (?, ?, ?, '', ?, ?, ?, 'mm', 'dimension')""",
+                       ((c + 1, int(product[c]) + 1, f"C{c + 1:07d}", nominal[c], tol[c], -tol[c])
+                        for c in range(len(nominal))))
+    cursor.executemany("INSERT INTO gamma_features (gamma_id, feature_id, target, usl, lsl) VALUES (?, ?, ?, ?, ?)",
+                       ((int(route[c]) + 1, c + 1, nominal[c], nominal[c] + tol[c], nominal[c] - tol[c])
+                        for c in range(len(nominal))))
+    timings["master_s"] = time.perf_counter() - t0
+    log(f"  sqlite master data: {len(nominal)} features in {timings['master_s']:.1f}s")
+
+    product_of, gamma_of = (product + 1).tolist(), (route + 1).tolist()
+    t0 = time.perf_counter()
+    written = 0
+    for chunk in iter_measurements(factory):
+        chars = chunk["char"].tolist()
+        cursor.executemany("""INSERT INTO measurements
+                                  (product_id, gamma_id, feature_id, serial_number, value, timestamp, operator)
+                              VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                           zip([product_of[c] for c in chars], [gamma_of[c] for c in chars],
+                               [c + 1 for c in chars], chunk["serial_number"].tolist(), chunk["value"].tolist(),
+                               np.datetime_as_string(chunk["timestamp"], unit="ms").tolist(),
+                               chunk["operator"].tolist()))
+        written += len(chars)
+        log(f"  sqlite measurements: {written:,}/{params['measurements']:,}", end="\r")
+    timings["measurements_s"] = time.perf_counter() - t0
+    log(f"\n  sqlite measurements written in {timings['measurements_s']:.1f}s")
+
+    t0 = time.perf_counter()
+    database.migrate(cursor)
+    database.compact_rollups(cursor, days=None)
+    conn.commit()
+    conn.close()
+    timings["indexes_rollups_s"] = time.perf_counter() - t0
+    return timings
+
+
+# -----------------------------------------------------------------------------
+
+def scale_params(scale: str, **overrides) -> dict:
+    params = dict(SCALES[scale])
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--target", nargs="+", choices=["mongo", "sqlite"], default=["sqlite"])
+    parser.add_argument("--mongo-db", default=None, help="default: spacial_bench_<scale>")
+    parser.add_argument("--sqlite-path", default=None, help="default: benchmarks/data/spc_<scale>.sqlite")
+    parser.add_argument("--force", action="store_true", help="allow writing to the app database")
+    parser.add_argument("--seed", type=int, default=42)
+    for key in SCALES["small"]:
+        parser.add_argument(f"--{key}", type=int, default=None)
+    args = parser.parse_args()
+
+    params = scale_params(args.scale, **{k: getattr(args, k) for k in SCALES["small"]})
+    factory = build_factory(params, args.seed)
+    print(f"Generating `{args.scale}`: {params}")
+
+    if "mongo" in args.target:
+        print(write_mongo(factory, args.mongo_db or f"spacial_bench_{args.scale}", args.force))
+    if "sqlite" in args.target:
+        print(write_sqlite(factory, Path(args.sqlite_path or DATA_DIR / f"spc_{args.scale}.sqlite")))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,42 @@
+import importlib
 import streamlit as st
 from typing import Dict, Callable, Any
 from utils.lang import init_language
-from utils.auth import login_form, cookies
 from utils.mongo import initialize_mongo_if_needed
+from utils.rollups import compact_rollups_if_due
+from utils.stream import get_stream
 from utils.password_manager import change_password_form
 from modules.filters import get_global_filters
-from modules import (
-    dashboard, families, products,
-    routes, measurements, users,
-    characteristics, admin
-)
+
+# Page registry: menu key → page module.
+# A page module (and plotly, pandas, PIL… behind it) is imported the first
+# time the page is opened, not at startup.
+PAGES: Dict[str, str] = {
+    "home": "modules.dashboard",
+    "families": "modules.families",
+    "products": "modules.products",
+    "routes": "modules.routes",
+    "characteristics": "modules.characteristics",
+    "measurements": "modules.measurements",
+    "admin": "modules.admin",
+    "users": "modules.users",
+}
+
+# Pages rendered without the global Atelier/Family/Product filters
+UNFILTERED_PAGES = {"home", "families", "admin"}
+
+
+def load_page(page: str) -> Callable:
+    """Import the page module on first use and return its app()"""
+    return importlib.import_module(PAGES[page]).app
 
 def initialize_app() -> tuple:
     """Initialize core app components and return (lang, user)"""
     try:
         # 0) Initialize MongoDB
         initialize_mongo_if_needed()
+        compact_rollups_if_due()
+        get_stream()
 
         # 1) Restore user from URL params
         
@@ -44,6 +65,7 @@ def initialize_app() -> tuple:
 
 def render_header(lang, user):
     """Render app header with login"""
+    from utils.auth import login_form, cookies
     col_title, col_login = st.columns([7, 2], gap="small")
     with col_title:
         st.title("SPaCial – Smart Production Control")
@@ -69,73 +91,53 @@ def render_header(lang, user):
     )
 
 def get_navigation(lang, user) -> str:
-    """Setup sidebar navigation and return selected menu"""
-    options = [
-        lang("home"),
-        lang("families"),
-        lang("products"),
-        lang("routes"),
-        lang("characteristics"),
-        lang("measurements"),
-        lang("admin")
-    ]
-    
+    """Setup sidebar navigation and return the selected page key"""
+    pages = [page for page in PAGES if page != "users"]
     if user and user["role"] == "admin":
-        options.append(lang("users"))
+        pages.append("users")
 
-    return st.sidebar.radio(lang("navigate"), options)
+    labels = {lang(page): page for page in pages}
+    return labels[st.sidebar.radio(lang("navigate"), list(labels))]
 
 def main():
     # Initialize app
     lang, user = initialize_app()
     
     # Setup navigation
-    menu = get_navigation(lang, user)
+    page = get_navigation(lang, user)
 
     # Render header
-    if menu == lang("dashboard"):
+    if page == "home":
         render_header(lang, user)
 
 
-    # Save cookies
+    # Save cookies (the cookie component pulls in pandas/pyarrow, so it is
+    # imported after the navigation has been sent to the browser)
+    from utils.auth import cookies
     if cookies.ready():
         cookies.save()
 
     # Setup filters
     
-    filters = (
-        {} if menu == lang("home") or menu == lang("families") or menu == lang("admin")
-        else get_global_filters(lang)
-    )
+    filters = {} if page in UNFILTERED_PAGES else get_global_filters(lang)
 
     # Show dashboard description if on home
-    if menu == lang("home"):
+    if page == "home":
         st.sidebar.markdown(
             lang("dashboard_description", "Dashboard description…")
         )
 
-    # Route to modules
-    modules: Dict[str, Callable] = {
-        lang("home"): dashboard.app,
-        lang("families"): families.app,
-        lang("products"): products.app,
-        lang("routes"): routes.app,
-        lang("characteristics"): characteristics.app,
-        lang("measurements"): measurements.app,
-        lang("users"): users.app,
-        lang("admin"): admin.app
-    }
-
+    # Route to the page (imported on first visit)
     try:
-        if menu in modules:
-            if menu == lang("users") and user and user["role"] == "admin":
-                modules[menu](lang)
-            elif menu != lang("users"):
-                modules[menu](lang, filters)
+        if page not in PAGES:
+            st.error(lang("invalid_page"))
+        elif page == "users":
+            if user and user["role"] == "admin":
+                load_page(page)(lang)
             else:
                 st.warning(lang("access_denied"))
         else:
-            st.error(lang("invalid_page"))
+            load_page(page)(lang, filters)
     except Exception as e:
         st.error(f"Error loading module: {str(e)}")
 
@@ -1,13 +1,26 @@
 import streamlit as st
 from utils.mongo import get_db
+from utils.repository import invalidate
+from utils.frames import NESTED, collection_schema, find_frame
+from utils.export import FORMATS, export_collection, offer_download, progress_bar
+from utils.bulk_import import CHUNK_SIZE, UPSERT_KEYS, import_file
+from utils.ancestry import refresh, with_ancestry
+from utils.parallel import gather
+from utils.analytics import (
+    CATEGORICAL_TYPES, DATE_UNITS, NUMERIC_TYPES, SAMPLE_SIZE, UNSUPPORTED as ANALYTICS_UNSUPPORTED,
+    average_size, field_profile, fields_of_type, histogram, numeric_summary, time_series, value_counts,
+)
 import bson
 import pandas as pd
 import json
+import re
 from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
 
-db = get_db()
+# The page loads at most DETAILS_LIMIT documents (field hints, insertion form,
+# details explorer); counts and checks over the whole collection run on the server
+DETAILS_LIMIT = 1000
 
 def convert_objectid_to_str(docs):
     """Convert ObjectId to string for display and Arrow compatibility"""
@@ -36,27 +49,23 @@ def convert_objectid_to_str(docs):
         return docs
     return docs
 
-def safe_dataframe_conversion(docs):
-    """Safely convert documents to DataFrame with proper type handling"""
-    if not docs:
-        return pd.DataFrame()
-    
-    # Convert ObjectIds first
-    clean_docs = convert_objectid_to_str(docs.copy() if isinstance(docs, list) else [docs])
-    
-    # Create DataFrame with explicit type conversion
-    df = pd.DataFrame(clean_docs)
-    
-    # Handle problematic columns
-    for col in df.columns:
-        # Convert any remaining ObjectId-like strings or objects
-        if df[col].dtype == 'object':
-            df[col] = df[col].astype(str)
-    
-    return df.fillna("")
+def nested_fields(collection_name):
+    """Object/array fields, shown as JSON text and never written back from the editor"""
+    return {field for field, kind in collection_schema(collection_name).items() if kind in NESTED}
+
+def search_query(collection_name, search_term):
+    """Case-insensitive match of the term in any text field, or the document id"""
+    if not search_term:
+        return {}
+    pattern = {"$regex": re.escape(search_term), "$options": "i"}
+    clauses = [{field: pattern} for field, kind in collection_schema(collection_name).items() if kind == "string"]
+    if bson.ObjectId.is_valid(search_term):
+        clauses.append({"_id": bson.ObjectId(search_term)})
+    return {"$or": clauses} if clauses else {"_id": None}
 
 def get_collections_with_relations():
     """Get all collections and detect potential parent-child relationships"""
+    db = get_db()
     collections = [c for c in db.list_collection_names() if c != "schemas"]
     relations = {}
     
@@ -97,8 +106,10 @@ def get_hierarchy_fields(docs):
 
 def create_hierarchy_view(collection_name, parent_field="parent_id"):
     """Create a hierarchical view with drag-and-drop functionality"""
-    docs = list(db[collection_name].find({}))
-    docs = convert_objectid_to_str(docs)
+    db = get_db()
+    docs = convert_objectid_to_str(list(db[collection_name].find({}).limit(DETAILS_LIMIT)))
+    if len(docs) == DETAILS_LIMIT:
+        st.caption(f"Hierarquia dos primeiros {DETAILS_LIMIT:,} documentos da coleção.")
     
     # Find root nodes (no parent field or parent field is null)
     roots = [doc for doc in docs if not doc.get(parent_field) or doc.get(parent_field) in [None, "", "None"]]
@@ -180,6 +191,7 @@ def create_hierarchy_view(collection_name, parent_field="parent_id"):
 
 def move_item_to_parent(collection_name, item_id, new_parent_id, parent_field):
     """Move an item to a new parent"""
+    db = get_db()
     try:
         update_data = {parent_field: new_parent_id}
         if new_parent_id is None:
@@ -189,6 +201,8 @@ def move_item_to_parent(collection_name, item_id, new_parent_id, parent_field):
             {"_id": bson.ObjectId(item_id)},
             {"$set": update_data}
         )
+        refresh(collection_name, [bson.ObjectId(item_id)], update_data)
+        invalidate(collection_name)
         
         if result.modified_count > 0:
             st.success("✅ Item movido com sucesso!")
@@ -231,6 +245,7 @@ def edit_item_inline(collection_name, doc):
 
 def save_inline_edit(collection_name, doc_id, edited_data):
     """Save inline edits"""
+    db = get_db()
     try:
         # Clean empty values
         clean_data = {k: v for k, v in edited_data.items() 
@@ -240,6 +255,8 @@ def save_inline_edit(collection_name, doc_id, edited_data):
             {"_id": bson.ObjectId(doc_id)},
             {"$set": clean_data}
         )
+        refresh(collection_name, [bson.ObjectId(doc_id)], clean_data)
+        invalidate(collection_name)
         
         if result.modified_count > 0:
             st.success("✅ Dados atualizados!")
@@ -295,6 +312,7 @@ def calculate_max_depth(docs, parent_field):
 
 def get_reference_options(collection_name, field_name, relations):
     """Get options for reference fields"""
+    db = get_db()
     if field_name in relations.get(collection_name, {}):
         ref_collection = relations[collection_name][field_name]
         docs = list(db[ref_collection].find({}))
@@ -308,7 +326,7 @@ def get_reference_options(collection_name, field_name, relations):
         return options, labels, docs
     return [], [], []
 
-def advanced_crud_interface(collection_name, docs, relations):
+def advanced_crud_interface(collection_name, relations):
     """Advanced CRUD interface with better table management"""
     st.markdown("### 📝 Interface CRUD")
     
@@ -324,16 +342,11 @@ def advanced_crud_interface(collection_name, docs, relations):
     with col3:
         items_per_page = st.selectbox("Itens por página:", [10, 25, 50, 100], index=1)
     
-    # Filter documents
-    filtered_docs = docs
-    if search_term:
-        filtered_docs = []
-        for doc in docs:
-            if any(search_term.lower() in str(v).lower() for v in doc.values()):
-                filtered_docs.append(doc)
+    # Filter documents on the server, only the current page is fetched
+    query = search_query(collection_name, search_term)
+    total_items = get_db()[collection_name].count_documents(query)
     
     # Pagination
-    total_items = len(filtered_docs)
     total_pages = (total_items - 1) // items_per_page + 1 if total_items > 0 else 1
     
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -346,21 +359,25 @@ def advanced_crud_interface(collection_name, docs, relations):
     
     # Get current page items
     start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    current_docs = filtered_docs[start_idx:end_idx]
     
+    if total_items:
+        df = find_frame(collection_name, query, sort=[("_id", 1)], skip=start_idx, limit=items_per_page)
+        current_docs = df[["_id"]].to_dict("records")
+        nested = nested_fields(collection_name)
     
-    # Original editable table
-    st.markdown(f"#### ✏️ Tabela Editável ({len(current_docs)} de {total_items} documentos)")
-    
-    if current_docs:
-        # Convert to safe DataFrame
-        df = safe_dataframe_conversion(current_docs)
+        # Original editable table
+        st.markdown(f"#### ✏️ Tabela Editável ({len(current_docs)} de {total_items} documentos)")
         
         # Configure column types
         column_config = {}
         for col in df.columns:
-            if col.endswith('_id') and col != '_id':
+            if col in nested:
+                column_config[col] = st.column_config.TextColumn(
+                    col,
+                    help="Campo aninhado (somente leitura)",
+                    disabled=True
+                )
+            elif col.endswith('_id') and col != '_id':
                 column_config[col] = st.column_config.TextColumn(
                     col,
                     help=f"Campo de referência: {col}",
@@ -410,10 +427,19 @@ def advanced_crud_interface(collection_name, docs, relations):
         with col4:
             # Export options
             with st.popover("📤 Exportar Dados"):
-                export_format = st.selectbox("Formato:", ["JSON", "CSV", "Excel"])
+                export_format = st.selectbox("Formato:", list(FORMATS))
+                scope = st.radio("Documentos:", ["Resultado da busca", "Coleção inteira"],
+                                 disabled=not search_term)
                 
-                if st.button("Baixar"):
-                    export_data(df, export_format, collection_name)
+                if st.button("Exportar"):
+                    st.session_state[f"export_{collection_name}"] = export_collection(
+                        collection_name, export_format,
+                        query=query if scope == "Resultado da busca" else None,
+                        progress=progress_bar("Exportando...")
+                    )
+                if st.session_state.get(f"export_{collection_name}"):
+                    offer_download(st.session_state[f"export_{collection_name}"], "📥 Baixar",
+                                   key=f"export_download_{collection_name}")
         
         # Row selection for deletion
         if len(edited_df) > 0:
@@ -445,24 +471,27 @@ def advanced_crud_interface(collection_name, docs, relations):
 
 def save_all_changes(collection_name, edited_df, original_docs, start_idx):
     """Save all changes from the edited DataFrame"""
+    db = get_db()
     update_count = 0
     insert_count = 0
     error_count = 0
+    changed_ids, changed_fields = [], set()
     
     try:
         collection = db[collection_name]
+        nested = nested_fields(collection_name)
         
         for idx, row in edited_df.iterrows():
             try:
                 if idx >= len(original_docs):  # New row
                     new_doc = row.to_dict()
                     new_doc = {k: v for k, v in new_doc.items() 
-                              if pd.notna(v) and v != "" and v != "nan"}
+                              if k not in nested and pd.notna(v) and v != "" and v != "nan"}
                     
                     if new_doc:
                         # Convert string IDs back to ObjectId where needed
                         new_doc = prepare_doc_for_save(new_doc)
-                        collection.insert_one(new_doc)
+                        collection.insert_one(with_ancestry(collection_name, new_doc))
                         insert_count += 1
                 
                 else:  # Existing row
@@ -470,7 +499,7 @@ def save_all_changes(collection_name, edited_df, original_docs, start_idx):
                     if doc_id and doc_id != "":
                         new_doc = row.to_dict()
                         new_doc.pop("_id", None)
-                        new_doc = {k: v for k, v in new_doc.items() if pd.notna(v)}
+                        new_doc = {k: v for k, v in new_doc.items() if k not in nested and pd.notna(v)}
                         
                         # Convert string IDs back to ObjectId where needed
                         new_doc = prepare_doc_for_save(new_doc)
@@ -482,11 +511,15 @@ def save_all_changes(collection_name, edited_df, original_docs, start_idx):
                         
                         if result.modified_count > 0:
                             update_count += 1
+                            changed_ids.append(bson.ObjectId(doc_id))
+                            changed_fields.update(new_doc)
             
             except Exception as e:
                 error_count += 1
                 st.error(f"Erro na linha {idx + 1}: {e}")
         
+        refresh(collection_name, changed_ids, changed_fields)
+        invalidate(collection_name)
         # Show results
         if update_count > 0 or insert_count > 0:
             st.success(f"✅ Processamento concluído! Atualizados: {update_count}, Inseridos: {insert_count}")
@@ -522,6 +555,7 @@ def prepare_doc_for_save(doc):
 
 def apply_bulk_operation(collection_name, field, value, docs):
     """Apply bulk operation to multiple documents"""
+    db = get_db()
     try:
         doc_ids = [bson.ObjectId(doc["_id"]) for doc in docs]
         
@@ -538,6 +572,8 @@ def apply_bulk_operation(collection_name, field, value, docs):
             {"_id": {"$in": doc_ids}},
             {"$set": {field: update_value}}
         )
+        refresh(collection_name, doc_ids, [field])
+        invalidate(collection_name)
         
         st.success(f"✅ {result.modified_count} documentos atualizados!")
         st.rerun()
@@ -547,6 +583,7 @@ def apply_bulk_operation(collection_name, field, value, docs):
 
 def delete_selected_rows(collection_name, df, rows_to_delete):
     """Delete selected rows"""
+    db = get_db()
     delete_count = 0
     error_count = 0
     
@@ -564,6 +601,7 @@ def delete_selected_rows(collection_name, df, rows_to_delete):
                 error_count += 1
                 st.error(f"Erro ao deletar linha {idx + 1}: {e}")
     
+    invalidate(collection_name)
     if delete_count > 0:
         st.success(f"✅ {delete_count} documento(s) deletado(s)!")
         if error_count > 0:
@@ -572,35 +610,9 @@ def delete_selected_rows(collection_name, df, rows_to_delete):
     else:
         st.error("❌ Nenhum documento foi deletado")
 
-def export_data(df, format_type, collection_name):
-    """Export data in different formats"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{collection_name}_{timestamp}"
-    
-    if format_type == "JSON":
-        json_data = df.to_json(orient='records', indent=2)
-        st.download_button(
-            label="📥 Baixar JSON",
-            data=json_data,
-            file_name=f"{filename}.json",
-            mime="application/json"
-        )
-    
-    elif format_type == "CSV":
-        csv_data = df.to_csv(index=False)
-        st.download_button(
-            label="📥 Baixar CSV",
-            data=csv_data,
-            file_name=f"{filename}.csv",
-            mime="text/csv"
-        )
-    
-    elif format_type == "Excel":
-        # Note: This would require openpyxl or xlsxwriter
-        st.info("Funcionalidade Excel será implementada (requer biblioteca adicional)")
-
 def get_related_documents(doc_id, collection_name, all_collections):
     """Find all documents that reference this document"""
+    db = get_db()
     related = {}
     
     for coll_name in all_collections:
@@ -621,6 +633,7 @@ def get_related_documents(doc_id, collection_name, all_collections):
     return related
 
 def app(lang, filters):
+    db = get_db()
     st.markdown("""
         <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
                     padding: 2rem; border-radius: 15px; margin-bottom: 2rem;'>
@@ -677,7 +690,7 @@ def app(lang, filters):
     tab1, tab2, tab3, tab4 = st.tabs(["📝 CRUD Pro", "🌳 Hierarquia", "🔗 Relações", "📊 Detalhes"])
 
     with tab1:
-        advanced_crud_interface(collection_name, docs, relations)
+        advanced_crud_interface(collection_name, relations)
         
         # Enhanced Add new document form
         st.markdown("---")
@@ -694,6 +707,10 @@ def app(lang, filters):
             
             # Smart form generation
             create_smart_insertion_form(collection_name, sample_fields, relations)
+        
+        st.markdown("### 📥 Importação em Massa")
+        with st.expander("Importar arquivo (CSV, JSON, NDJSON)"):
+            create_bulk_import_form(collection_name, relations)
 
     with tab2:
         st.markdown("### 🌳 Gestão Hierárquica Avançada")
@@ -797,6 +814,67 @@ def create_smart_insertion_form(collection_name, sample_fields, relations):
             if st.form_submit_button("🔄 Limpar Formulário"):
                 st.rerun()
 
+def create_bulk_import_form(collection_name, relations):
+    """Streaming import of CSV / JSON / NDJSON files, with a dry-run first"""
+    uploaded = st.file_uploader(
+        "Arquivo (CSV, JSON ou NDJSON):", type=["csv", "json", "ndjson", "jsonl"],
+        key=f"bulk_import_file_{collection_name}",
+        help="Campos *_id aceitam o ObjectId ou o nome/código do documento referenciado"
+    )
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        mode = st.radio("Modo:", ["insert", "upsert"], horizontal=True,
+                        format_func={"insert": "Inserir", "upsert": "Upsert"}.get,
+                        key=f"bulk_import_mode_{collection_name}")
+    with col2:
+        key = st.text_input("Campo chave (upsert):", value=UPSERT_KEYS.get(collection_name, "name"),
+                            disabled=mode != "upsert", key=f"bulk_import_key_{collection_name}")
+    with col3:
+        chunk_size = st.number_input("Linhas por bloco:", min_value=100, max_value=50_000,
+                                     value=CHUNK_SIZE, step=500, key=f"bulk_import_chunk_{collection_name}")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        dry_run = st.button("🔍 Simular (dry-run)", disabled=uploaded is None, use_container_width=True)
+    with col2:
+        run = st.button("📥 Importar", type="primary", disabled=uploaded is None, use_container_width=True)
+    
+    if not (dry_run or run):
+        return
+    
+    uploaded.seek(0)
+    progress = st.progress(0.0, text="Lendo arquivo...")
+    
+    def on_chunk(stats):
+        progress.progress(min(uploaded.tell() / max(uploaded.size, 1), 1.0),
+                          text=f"Bloco {stats['bloco']}: {stats['linhas/s'] or 0:,} linhas/s")
+    
+    try:
+        report = import_file(
+            uploaded, collection_name, mode=mode, key=key,
+            dry_run=dry_run, chunk_size=int(chunk_size), references=relations.get(collection_name),
+            on_chunk=on_chunk
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        st.error(f"❌ Arquivo inválido: {e}")
+        return
+    progress.progress(1.0, text=f"Concluído em {report['seconds']:.1f} s")
+    
+    st.markdown("#### 🔍 Simulação (nada foi gravado)" if report["dry_run"] else "#### 📥 Resultado da importação")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Linhas", f"{report['rows']:,}")
+    col2.metric("A inserir" if report["dry_run"] else "Inseridos", f"{report['inserted']:,}")
+    col3.metric("A atualizar" if report["dry_run"] else "Atualizados", f"{report['updated']:,}")
+    col4.metric("Erros", f"{report['failed']:,}")
+    
+    if report["errors"]:
+        st.markdown(f"**Erros** (primeiros {len(report['errors'])}):")
+        st.dataframe(pd.DataFrame(report["errors"]), use_container_width=True, hide_index=True)
+    if report["chunks"]:
+        st.markdown("**Desempenho por bloco:**")
+        st.dataframe(pd.DataFrame(report["chunks"]), use_container_width=True, hide_index=True)
+
 def create_smart_field_input(field, field_type, collection_name, relations, key_suffix=""):
     """Create smart field input based on field type and relations"""
     key = f"{field}{key_suffix}"
@@ -842,6 +920,7 @@ def create_smart_field_input(field, field_type, collection_name, relations, key_
 
 def insert_smart_document(collection_name, new_doc, validate):
     """Insert document with smart validation"""
+    db = get_db()
     try:
         # Clean empty fields
         clean_doc = {k: v for k, v in new_doc.items() 
@@ -864,7 +943,8 @@ def insert_smart_document(collection_name, new_doc, validate):
         prepared_doc = prepare_doc_for_save(clean_doc)
         
         # Insert document
-        result = db[collection_name].insert_one(prepared_doc)
+        result = db[collection_name].insert_one(with_ancestry(collection_name, prepared_doc))
+        invalidate(collection_name)
         st.success(f"✅ Documento inserido com sucesso! ID: {result.inserted_id}")
         
         # Show inserted document preview
@@ -878,6 +958,7 @@ def insert_smart_document(collection_name, new_doc, validate):
 
 def validate_document(doc, collection_name):
     """Validate document before insertion"""
+    db = get_db()
     errors = []
     
     # Check for required fields based on existing documents
@@ -953,6 +1034,7 @@ def create_hierarchy_field_manager(collection_name):
 
 def create_hierarchy_field(collection_name, field_name, default_value):
     """Create a new hierarchy field"""
+    db = get_db()
     try:
         update_value = None if default_value in [None, "null"] else default_value
         
@@ -960,6 +1042,7 @@ def create_hierarchy_field(collection_name, field_name, default_value):
             {},
             {"$set": {field_name: update_value}}
         )
+        invalidate(collection_name)
         
         st.success(f"✅ Campo '{field_name}' criado! {result.modified_count} documentos atualizados.")
         st.rerun()
@@ -969,6 +1052,7 @@ def create_hierarchy_field(collection_name, field_name, default_value):
 
 def create_hierarchy_tools(collection_name, field_name):
     """Tools for managing hierarchy"""
+    db = get_db()
     st.markdown(f"#### 🔧 Ferramentas para '{field_name}'")
     
     col1, col2 = st.columns(2)
@@ -981,6 +1065,7 @@ def create_hierarchy_tools(collection_name, field_name):
                     {},
                     {"$set": {field_name: None}}
                 )
+                invalidate(collection_name)
                 st.success(f"✅ Campo resetado! {result.modified_count} documentos atualizados.")
                 st.rerun()
             except Exception as e:
@@ -994,6 +1079,7 @@ def create_hierarchy_tools(collection_name, field_name):
                     {},
                     {"$unset": {field_name: ""}}
                 )
+                invalidate(collection_name)
                 st.success(f"✅ Campo removido! {result.modified_count} documentos atualizados.")
                 st.rerun()
             except Exception as e:
@@ -1001,12 +1087,19 @@ def create_hierarchy_tools(collection_name, field_name):
 
 def create_relations_manager(collection_name, relations, collections):
     """Advanced relations manager"""
+    db = get_db()
     st.markdown("### 🔗 Gerenciador de Relações Avançado")
     
     # Current relations
     if relations[collection_name]:
         st.markdown(f"#### Relações Ativas em '{collection_name}':")
         
+        # um count_documents por relação, todos em paralelo
+        counts = gather("relations", **{
+            field: (lambda f=field: db[collection_name].count_documents({f: {"$nin": [None, ""]}}))
+            for field in relations[collection_name]
+        })
+        
         for field, target_collection in relations[collection_name].items():
             col1, col2, col3 = st.columns([2, 1, 1])
             
@@ -1014,8 +1107,7 @@ def create_relations_manager(collection_name, relations, collections):
                 st.markdown(f"**{field}** → `{target_collection}`")
                 
                 # Show statistics
-                docs_with_relation = list(db[collection_name].find({field: {"$ne": None, "$ne": ""}}))
-                st.caption(f"{len(docs_with_relation)} documentos com esta relação")
+                st.caption(f"{counts[field]} documentos com esta relação")
             
             with col2:
                 if st.button(f"📊 Analisar", key=f"analyze_{field}"):
@@ -1056,35 +1148,40 @@ def create_relations_manager(collection_name, relations, collections):
 
 def analyze_relation(collection_name, field, target_collection):
     """Analyze relation statistics"""
+    db = get_db()
     with st.expander(f"📊 Análise: {field} → {target_collection}", expanded=True):
-        # Get relation data
-        docs_with_relation = list(db[collection_name].find({field: {"$ne": None, "$ne": ""}}))
-        docs_without_relation = list(db[collection_name].find({field: {"$in": [None, ""]}}))
+        # Get relation data (contagens e valores distintos em paralelo)
+        with_relation = {field: {"$nin": [None, ""]}}
+        reads = gather(
+            "relation_analysis",
+            with_count=lambda: db[collection_name].count_documents(with_relation),
+            without_count=lambda: db[collection_name].count_documents({field: {"$in": [None, ""]}}),
+            refs=lambda: db[collection_name].distinct(field, with_relation),
+        )
         
         # Statistics
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Com Relação", len(docs_with_relation))
+            st.metric("Com Relação", reads["with_count"])
         
         with col2:
-            st.metric("Sem Relação", len(docs_without_relation))
+            st.metric("Sem Relação", reads["without_count"])
         
         with col3:
-            total_docs = len(docs_with_relation) + len(docs_without_relation)
-            coverage = (len(docs_with_relation) / total_docs * 100) if total_docs > 0 else 0
+            total_docs = reads["with_count"] + reads["without_count"]
+            coverage = (reads["with_count"] / total_docs * 100) if total_docs > 0 else 0
             st.metric("Cobertura", f"{coverage:.1f}%")
         
         with col4:
-            # Check for broken references
-            broken_refs = 0
-            for doc in docs_with_relation:
-                try:
-                    ref_exists = db[target_collection].find_one({"_id": bson.ObjectId(doc[field])})
-                    if not ref_exists:
-                        broken_refs += 1
-                except:
-                    broken_refs += 1
+            # Check for broken references: one $in over the distinct values
+            valid_ids = {}
+            for ref in reads["refs"]:
+                if bson.ObjectId.is_valid(ref):
+                    valid_ids[bson.ObjectId(ref)] = ref
+            existing = {d["_id"] for d in db[target_collection].find({"_id": {"$in": list(valid_ids)}}, {"_id": 1})}
+            broken = [ref for ref in reads["refs"] if not (bson.ObjectId.is_valid(ref) and bson.ObjectId(ref) in existing)]
+            broken_refs = db[collection_name].count_documents({field: {"$in": broken}}) if broken else 0
             
             st.metric("Refs. Quebradas", broken_refs, delta_color="inverse")
         
@@ -1097,6 +1194,7 @@ def analyze_relation(collection_name, field, target_collection):
 
 def repair_broken_references(collection_name, field, target_collection):
     """Repair broken references"""
+    db = get_db()
     try:
         docs_with_relation = list(db[collection_name].find({field: {"$ne": None, "$ne": ""}}))
         repaired_count = 0
@@ -1119,6 +1217,7 @@ def repair_broken_references(collection_name, field, target_collection):
                 )
                 repaired_count += 1
         
+        invalidate(collection_name)
         st.success(f"✅ {repaired_count} referências quebradas reparadas!")
         st.rerun()
         
@@ -1127,6 +1226,7 @@ def repair_broken_references(collection_name, field, target_collection):
 
 def manage_relation(collection_name, field, target_collection):
     """Manage specific relation"""
+    db = get_db()
     with st.expander(f"🔧 Gerenciar: {field} → {target_collection}", expanded=True):
         
         tab1, tab2, tab3 = st.tabs(["📝 Editar", "📊 Estatísticas", "🗑️ Remover"])
@@ -1179,6 +1279,7 @@ def manage_relation(collection_name, field, target_collection):
 
 def apply_bulk_relation_change(collection_name, field, source_docs, new_target_id):
     """Apply bulk relation change"""
+    db = get_db()
     try:
         doc_ids = [bson.ObjectId(doc["_id"]) for doc in source_docs]
         
@@ -1186,6 +1287,8 @@ def apply_bulk_relation_change(collection_name, field, source_docs, new_target_i
             {"_id": {"$in": doc_ids}},
             {"$set": {field: new_target_id}}
         )
+        refresh(collection_name, doc_ids, [field])
+        invalidate(collection_name)
         
         st.success(f"✅ {result.modified_count} documentos atualizados!")
         st.rerun()
@@ -1195,6 +1298,7 @@ def apply_bulk_relation_change(collection_name, field, source_docs, new_target_i
 
 def show_relation_statistics(collection_name, field, target_collection):
     """Show detailed relation statistics"""
+    db = get_db()
     st.markdown("**Estatísticas Detalhadas:**")
     
     # Get relation distribution
@@ -1234,11 +1338,13 @@ def show_relation_statistics(collection_name, field, target_collection):
 
 def remove_relation_field(collection_name, field):
     """Remove relation field completely"""
+    db = get_db()
     try:
         result = db[collection_name].update_many(
             {},
             {"$unset": {field: ""}}
         )
+        invalidate(collection_name)
         
         st.success(f"✅ Campo '{field}' removido de {result.modified_count} documentos!")
         st.rerun()
@@ -1248,12 +1354,14 @@ def remove_relation_field(collection_name, field):
 
 def create_new_relation(collection_name, field_name, target_collection):
     """Create a new relation field"""
+    db = get_db()
     try:
         # Add field to all documents with null value
         result = db[collection_name].update_many(
             {},
             {"$set": {field_name: None}}
         )
+        invalidate(collection_name)
         
         st.success(f"✅ Relação '{field_name}' → '{target_collection}' criada! {result.modified_count} documentos atualizados.")
         st.rerun()
@@ -1478,6 +1586,7 @@ def create_field_editor(key, value, key_suffix=""):
 
 def save_document_changes(collection_name, doc_id, edited_data):
     """Save changes to document"""
+    db = get_db()
     try:
         # Clean and prepare data
         clean_data = {k: v for k, v in edited_data.items() 
@@ -1494,6 +1603,8 @@ def save_document_changes(collection_name, doc_id, edited_data):
             {"_id": bson.ObjectId(doc_id)},
             {"$set": prepared_data}
         )
+        refresh(collection_name, [bson.ObjectId(doc_id)], prepared_data)
+        invalidate(collection_name)
         
         if result.modified_count > 0:
             st.success("✅ Documento atualizado com sucesso!")
@@ -1506,6 +1617,7 @@ def save_document_changes(collection_name, doc_id, edited_data):
 
 def show_related_data(doc, collection_name, relations):
     """Show data from related collections"""
+    db = get_db()
     if collection_name not in relations or not relations[collection_name]:
         st.info("Nenhuma relação encontrada.")
         return
@@ -1581,6 +1693,7 @@ def show_reverse_relations(doc_id, collection_name, collections):
 
 def update_reference_popup(collection_name, doc_id, field, target_collection):
     """Popup for updating reference"""
+    db = get_db()
     with st.popover(f"🔄 Atualizar {field}", use_container_width=True):
         # Get available options
         target_docs = list(db[target_collection].find({}))
@@ -1604,6 +1717,8 @@ def update_reference_popup(collection_name, doc_id, field, target_collection):
                     {"_id": bson.ObjectId(doc_id)},
                     {"$set": {field: new_ref}}
                 )
+                refresh(collection_name, [bson.ObjectId(doc_id)], [field])
+                invalidate(collection_name)
                 
                 if result.modified_count > 0:
                     st.success("✅ Referência atualizada!")
@@ -1616,11 +1731,13 @@ def update_reference_popup(collection_name, doc_id, field, target_collection):
 
 def repair_single_reference(collection_name, doc_id, field):
     """Repair a single broken reference"""
+    db = get_db()
     try:
         result = db[collection_name].update_one(
             {"_id": bson.ObjectId(doc_id)},
             {"$set": {field: None}}
         )
+        invalidate(collection_name)
         
         if result.modified_count > 0:
             st.success("✅ Referência quebrada removida!")
@@ -1647,6 +1764,7 @@ def export_single_document(doc, collection_name):
 
 def delete_single_document(collection_name, doc_id):
     """Delete single document with confirmation"""
+    db = get_db()
     with st.popover("⚠️ Confirmar Exclusão", use_container_width=True):
         st.warning(f"Tem certeza que deseja deletar o documento `{doc_id}`?")
         st.caption("Esta ação não pode ser desfeita.")
@@ -1657,6 +1775,7 @@ def delete_single_document(collection_name, doc_id):
             if st.button("🗑️ Sim, Deletar", type="secondary", use_container_width=True):
                 try:
                     result = db[collection_name].delete_one({"_id": bson.ObjectId(doc_id)})
+                    invalidate(collection_name)
                     
                     if result.deleted_count > 0:
                         st.success("✅ Documento deletado!")
@@ -1673,57 +1792,55 @@ def delete_single_document(collection_name, doc_id):
 
 # Additional utility functions for enhanced functionality
 
-def create_data_visualization_tab(collection_name, docs):
-    """Create data visualization tab"""
-    if not docs:
-        st.info("Nenhum dado disponível para visualização.")
-        return
-    
+def create_data_visualization_tab(collection_name):
+    """Create data visualization tab (aggregated on the server)"""
     st.markdown("### 📈 Visualizações de Dados")
     
-    # Convert to DataFrame for analysis
-    df = safe_dataframe_conversion(docs)
-    
-    if df.empty:
-        st.warning("Não foi possível criar visualizações com os dados disponíveis.")
+    estimated = get_db()[collection_name].estimated_document_count()
+    if not estimated:
+        st.info("Nenhum dado disponível para visualização.")
         return
     
-    # Chart type selector
-    chart_type = st.selectbox(
-        "Tipo de visualização:",
-        ["Distribuição de Campos", "Gráfico de Barras", "Série Temporal", "Estatísticas"]
-    )
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        # Chart type selector
+        chart_type = st.selectbox(
+            "Tipo de visualização:",
+            ["Distribuição de Campos", "Gráfico de Barras", "Série Temporal", "Estatísticas"]
+        )
+    with col2:
+        sample = st.toggle(
+            f"Amostra ({SAMPLE_SIZE:,} docs)",
+            value=estimated > SAMPLE_SIZE,
+            help="Analisa uma amostra aleatória ($sample) em vez da coleção inteira"
+        )
     
-    if chart_type == "Distribuição de Campos":
-        create_field_distribution_chart(df)
-    elif chart_type == "Gráfico de Barras":
-        create_bar_chart(df)
-    elif chart_type == "Série Temporal":
-        create_time_series_chart(df)
-    elif chart_type == "Estatísticas":
-        create_statistics_view(df)
-
-def create_field_distribution_chart(df):
+    try:
+        total, profile = field_profile(collection_name, sample)
+        if profile.empty:
+            st.warning("Não foi possível criar visualizações com os dados disponíveis.")
+            return
+        st.caption(f"{total:,} documentos analisados" + (" (amostra)" if sample else ""))
+        
+        if chart_type == "Distribuição de Campos":
+            create_field_distribution_chart(profile)
+        elif chart_type == "Gráfico de Barras":
+            create_bar_chart(collection_name, profile, sample)
+        elif chart_type == "Série Temporal":
+            create_time_series_chart(collection_name, profile, sample)
+        elif chart_type == "Estatísticas":
+            create_statistics_view(collection_name, profile, total, sample)
+    except ANALYTICS_UNSUPPORTED as e:
+        st.warning(f"Este servidor MongoDB não suporta a agregação necessária: {e}")
+
+def create_field_distribution_chart(profile):
     """Create field distribution visualization"""
-    # Field completeness
-    completeness_data = []
-    for col in df.columns:
-        non_null_count = df[col].notna().sum()
-        completeness_data.append({
-            "Campo": col,
-            "Preenchido": non_null_count,
-            "Vazio": len(df) - non_null_count,
-            "Percentual": (non_null_count / len(df)) * 100
-        })
-    
-    completeness_df = pd.DataFrame(completeness_data)
-    
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### 📊 Completude dos Campos")
         fig = px.bar(
-            completeness_df,
+            profile,
             x="Campo",
             y="Percentual",
             title="Percentual de Campos Preenchidos",
@@ -1735,14 +1852,14 @@ def create_field_distribution_chart(df):
     with col2:
         st.markdown("#### 📋 Tabela de Completude")
         st.dataframe(
-            completeness_df[["Campo", "Preenchido", "Vazio", "Percentual"]],
+            profile[["Campo", "Tipo", "Preenchido", "Vazio", "Percentual"]],
             use_container_width=True
         )
 
-def create_bar_chart(df):
+def create_bar_chart(collection_name, profile, sample):
     """Create customizable bar chart"""
-    numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
-    categorical_columns = df.select_dtypes(include=['object', 'string']).columns.tolist()
+    numeric_columns = fields_of_type(profile, NUMERIC_TYPES)
+    categorical_columns = fields_of_type(profile, CATEGORICAL_TYPES)
     
     if not categorical_columns:
         st.warning("Nenhum campo categórico encontrado para criar gráfico de barras.")
@@ -1760,99 +1877,57 @@ def create_bar_chart(df):
             y_axis = None
     
     if x_axis:
+        chart_data = value_counts(collection_name, x_axis, sample, y_axis)
         if y_axis:
-            # Aggregate numeric data
-            chart_data = df.groupby(x_axis)[y_axis].sum().reset_index()
             fig = px.bar(chart_data, x=x_axis, y=y_axis, title=f"{y_axis} por {x_axis}")
         else:
-            # Count occurrences
-            chart_data = df[x_axis].value_counts().reset_index()
-            chart_data.columns = [x_axis, 'Count']
             fig = px.bar(chart_data, x=x_axis, y='Count', title=f"Distribuição de {x_axis}")
         
         st.plotly_chart(fig, use_container_width=True)
 
-def create_time_series_chart(df):
+def create_time_series_chart(collection_name, profile, sample):
     """Create time series visualization"""
-    date_columns = []
-    
-    # Try to identify date columns
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            # Try to parse as date
-            try:
-                pd.to_datetime(df[col].head(), errors='raise')
-                date_columns.append(col)
-            except:
-                pass
+    date_columns = fields_of_type(profile, {"date"})
     
     if not date_columns:
-        st.info("Nenhum campo de data encontrado. Tentando detectar campos que podem ser datas...")
-        
-        # Look for fields with date-like names
-        potential_date_fields = [col for col in df.columns 
-                               if any(word in col.lower() for word in ['date', 'time', 'created', 'updated', 'data'])]
-        
-        if potential_date_fields:
-            st.write("Campos que podem conter datas:", potential_date_fields)
-            selected_date_field = st.selectbox("Selecionar campo de data:", potential_date_fields)
-            
-            if selected_date_field:
-                try:
-                    df[selected_date_field] = pd.to_datetime(df[selected_date_field])
-                    
-                    # Create time series chart
-                    daily_counts = df.groupby(df[selected_date_field].dt.date).size().reset_index()
-                    daily_counts.columns = ['Data', 'Contagem']
-                    
-                    fig = px.line(daily_counts, x='Data', y='Contagem', 
-                                title=f"Série Temporal - {selected_date_field}")
-                    st.plotly_chart(fig, use_container_width=True)
-                
-                except Exception as e:
-                    st.error(f"Erro ao processar campo de data: {e}")
-        else:
-            st.info("Nenhum campo de data detectado.")
-    else:
+        st.info("Nenhum campo de data detectado.")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
         selected_date_field = st.selectbox("Campo de data:", date_columns)
-        
-        if selected_date_field:
-            df[selected_date_field] = pd.to_datetime(df[selected_date_field])
-            
-            # Create time series chart
-            daily_counts = df.groupby(df[selected_date_field].dt.date).size().reset_index()
-            daily_counts.columns = ['Data', 'Contagem']
-            
-            fig = px.line(daily_counts, x='Data', y='Contagem', 
-                        title=f"Série Temporal - {selected_date_field}")
-            st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        unit = st.selectbox("Agrupar por:", DATE_UNITS, index=1)
+    
+    if selected_date_field:
+        counts = time_series(collection_name, selected_date_field, unit, sample)
+        fig = px.line(counts, x='Data', y='Contagem', 
+                    title=f"Série Temporal - {selected_date_field}")
+        st.plotly_chart(fig, use_container_width=True)
 
-def create_statistics_view(df):
+def create_statistics_view(collection_name, profile, total, sample):
     """Create comprehensive statistics view"""
     st.markdown("#### 📊 Estatísticas Gerais")
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total de Registros", len(df))
+        st.metric("Total de Registros", f"{total:,}")
     
     with col2:
-        st.metric("Total de Campos", len(df.columns))
+        st.metric("Total de Campos", len(profile))
     
     with col3:
         # Calculate data density
-        total_cells = len(df) * len(df.columns)
-        filled_cells = df.notna().sum().sum()
-        density = (filled_cells / total_cells) * 100
+        density = profile["Preenchido"].sum() / (total * len(profile)) * 100 if total else 0
         st.metric("Densidade dos Dados", f"{density:.1f}%")
     
     with col4:
-        # Memory usage
-        memory_usage = df.memory_usage(deep=True).sum()
-        st.metric("Uso de Memória", f"{memory_usage / 1024:.1f} KB")
+        avg_size = average_size(collection_name)
+        st.metric("Tamanho Médio", f"{avg_size:,.0f} bytes" if avg_size is not None else "N/A")
     
     # Detailed statistics for numeric columns
-    numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+    numeric_columns = fields_of_type(profile, NUMERIC_TYPES)
     
     if numeric_columns:
         st.markdown("#### 📈 Estatísticas Numéricas")
@@ -1860,16 +1935,21 @@ def create_statistics_view(df):
         selected_numeric = st.multiselect("Selecionar campos numéricos:", numeric_columns, default=numeric_columns[:3])
         
         if selected_numeric:
-            stats_df = df[selected_numeric].describe()
+            stats_df = numeric_summary(collection_name, tuple(selected_numeric), sample)
             st.dataframe(stats_df, use_container_width=True)
             
             # Distribution plots
             for col in selected_numeric:
-                fig = px.histogram(df, x=col, title=f"Distribuição de {col}")
+                low, high = pd.to_numeric(stats_df[col][["min", "max"]], errors="coerce")
+                if pd.isna(low) or pd.isna(high):
+                    continue
+                buckets = histogram(collection_name, col, sample, float(low), float(high))
+                buckets["Faixa"] = [f"{lo:.4g} – {hi:.4g}" for lo, hi in zip(buckets["min"], buckets["max"])]
+                fig = px.bar(buckets, x="Faixa", y="count", title=f"Distribuição de {col}")
                 st.plotly_chart(fig, use_container_width=True)
     
     # Categorical data analysis
-    categorical_columns = df.select_dtypes(include=['object', 'string']).columns.tolist()
+    categorical_columns = fields_of_type(profile, CATEGORICAL_TYPES)
     
     if categorical_columns:
         st.markdown("#### 📋 Análise Categórica")
@@ -1877,24 +1957,26 @@ def create_statistics_view(df):
         selected_categorical = st.selectbox("Campo categórico:", categorical_columns)
         
         if selected_categorical:
-            value_counts = df[selected_categorical].value_counts()
+            top = value_counts(collection_name, selected_categorical, sample, limit=10)
             
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown(f"**Top 10 valores em {selected_categorical}:**")
-                st.dataframe(value_counts.head(10), use_container_width=True)
+                st.dataframe(top, use_container_width=True, hide_index=True)
             
             with col2:
                 fig = px.pie(
-                    values=value_counts.head(10).values,
-                    names=value_counts.head(10).index,
+                    top,
+                    values="Count",
+                    names=selected_categorical,
                     title=f"Distribuição de {selected_categorical}"
                 )
                 st.plotly_chart(fig, use_container_width=True)
 
 # Main app function enhancement
 def app(lang, filters):
+    db = get_db()
     st.markdown("""
         <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
                     padding: 2rem; border-radius: 15px; margin-bottom: 2rem;'>
@@ -1931,13 +2013,12 @@ def app(lang, filters):
         return
 
     collection = db[collection_name]
-    docs = list(collection.find({}))
-    docs = convert_objectid_to_str(docs)
+    docs = convert_objectid_to_str(list(collection.find({}).limit(DETAILS_LIMIT)))
 
     # Show collection info
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total de Documentos", len(docs))
+        st.metric("Total de Documentos", f"{collection.estimated_document_count():,}")
     with col2:
         if collection_name in relations and relations[collection_name]:
             st.metric("Relações", len(relations[collection_name]))
@@ -1947,18 +2028,18 @@ def app(lang, filters):
         hierarchy_fields = get_hierarchy_fields(docs)
         st.metric("Campos Hierárquicos", len(hierarchy_fields))
     with col4:
-        # Calculate average document size
-        if docs:
-            avg_size = sum(len(json.dumps(doc)) for doc in docs) / len(docs)
-            st.metric("Tamanho Médio", f"{avg_size:.0f} chars")
-        else:
-            st.metric("Tamanho Médio", "0 chars")
+        # Average BSON size, from the server
+        try:
+            avg_size = average_size(collection_name)
+        except ANALYTICS_UNSUPPORTED:
+            avg_size = None
+        st.metric("Tamanho Médio", f"{avg_size:,.0f} bytes" if avg_size is not None else "N/A")
 
     # Enhanced tabs
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 CRUD Pro", "🌳 Hierarquia", "🔗 Relações", "📊 Detalhes", "📈 Visualizações"])
 
     with tab1:
-        advanced_crud_interface(collection_name, docs, relations)
+        advanced_crud_interface(collection_name, relations)
         
         # Enhanced Add new document form
         st.markdown("---")
@@ -1975,6 +2056,10 @@ def app(lang, filters):
             
             # Smart form generation
             create_smart_insertion_form(collection_name, sample_fields, relations)
+        
+        st.markdown("### 📥 Importação em Massa")
+        with st.expander("Importar arquivo (CSV, JSON, NDJSON)"):
+            create_bulk_import_form(collection_name, relations)
 
     with tab2:
         st.markdown("### 🌳 Gestão Hierárquica Avançada")
@@ -1994,7 +2079,8 @@ def app(lang, filters):
             )
             
             # Check if this field has hierarchical structure
-            has_hierarchy = any(doc.get(selected_hierarchy_field) for doc in docs)
+            has_hierarchy = collection.count_documents(
+                {selected_hierarchy_field: {"$nin": [None, "", 0, False]}}, limit=1) > 0
             
             if has_hierarchy:
                 create_hierarchy_view(collection_name, selected_hierarchy_field)
@@ -2006,8 +2092,10 @@ def app(lang, filters):
         create_relations_manager(collection_name, relations, collections)
 
     with tab4:
+        if len(docs) == DETAILS_LIMIT:
+            st.caption(f"Explorando os primeiros {DETAILS_LIMIT:,} documentos da coleção.")
         create_details_explorer(collection_name, docs, relations, collections)
     
     with tab5:
-        create_data_visualization_tab(collection_name, docs)
+        create_data_visualization_tab(collection_name)
 
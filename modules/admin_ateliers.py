@@ -1,14 +1,12 @@
 import streamlit as st
 from utils.mongo import get_db
+from utils.storage import get_storage
+from utils.repository import invalidate
 from bson import ObjectId
-import os
 from PIL import Image
 import io
 
-# Pasta para guardar as imagens carregadas
-# Mude para "uploads" se essa for a sua pasta raiz de uploads
-IMG_UPLOAD_DIR = "uploads" 
-os.makedirs(IMG_UPLOAD_DIR, exist_ok=True)
+# Imagens carregadas ficam no bucket "uploads" (disco local ou GridFS)
 
 def app(t):
     st.title(t("manage_ateliers", "Gerir Ateliers"))
@@ -48,9 +46,9 @@ def app(t):
 
         # Exibir imagem existente, se houver
         if current_atelier and current_atelier.get("image_path"):
-            image_full_path = os.path.join(IMG_UPLOAD_DIR, os.path.basename(current_atelier["image_path"]))
-            if os.path.exists(image_full_path):
-                st.image(image_full_path, caption=t("current_image", "Imagem Atual"), width=150)
+            uploads = get_storage("uploads")
+            if uploads.exists(current_atelier["image_path"]):
+                st.image(uploads.read_bytes(current_atelier["image_path"]), caption=t("current_image", "Imagem Atual"), width=150)
             else:
                 st.warning(t("image_not_found_on_disk", "Imagem referenciada não encontrada no disco."))
         elif current_atelier and current_atelier.get("image_base64"): # Se estiver a guardar base64
@@ -81,18 +79,16 @@ def app(t):
                 file_extension = uploaded_file.name.split(".")[-1]
                 # Usar o nome do atelier para o nome do ficheiro para facilitar a associação
                 image_filename = f"{name.replace(' ', '_').lower()}.{file_extension}"
-                image_path_on_disk = os.path.join(IMG_UPLOAD_DIR, image_filename)
+                get_storage("uploads").write(image_filename, uploaded_file)
                 
-                with open(image_path_on_disk, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                atelier_data["image_path"] = image_path_on_disk # Guardar o caminho no DB
+                atelier_data["image_path"] = image_filename # Guardar o caminho no DB
                 st.success(t("image_uploaded", f"Imagem '{uploaded_file.name}' carregada com sucesso!"))
             
             # Lógica para salvar/atualizar
             if current_atelier:
                 # Atualizar atelier existente
                 ateliers_collection.update_one({"_id": current_atelier["_id"]}, {"$set": atelier_data})
+                invalidate("ateliers")
                 st.success(t("atelier_updated", f"Atelier '{name}' atualizado com sucesso!"))
             else:
                 # Adicionar novo atelier
@@ -101,6 +97,7 @@ def app(t):
                     st.stop()
                 else:
                     ateliers_collection.insert_one(atelier_data)
+                    invalidate("ateliers")
                     st.success(t("atelier_added", f"Atelier '{name}' adicionado com sucesso!"))
             
             st.rerun() # Recarregar a página para atualizar a lista e o formulário
@@ -109,8 +106,8 @@ def app(t):
             if st.checkbox(t("confirm_delete", f"Tem certeza que quer apagar o atelier '{current_atelier['name']}'? Todos os postos de trabalho associados a este atelier precisarão de ser reatribuídos ou apagados."), key="confirm_delete_atelier_checkbox"):
                 
                 # Opcional: Remover a imagem do disco
-                if current_atelier.get("image_path") and os.path.exists(current_atelier["image_path"]):
-                    os.remove(current_atelier["image_path"])
+                if current_atelier.get("image_path") and get_storage("uploads").exists(current_atelier["image_path"]):
+                    get_storage("uploads").delete(current_atelier["image_path"])
                     st.info(t("image_removed", "Imagem do atelier removida do disco."))
                 
                 # NOTA: CONSIDERE O QUE FAZER COM OS POSTOS DE TRABALHO CUJO atelier_id SE REFERE A ESTE ATELIER
@@ -120,6 +117,7 @@ def app(t):
                 # Por agora, vou apenas avisar e deixar que o admin_workstations.py lide com isso.
                 
                 ateliers_collection.delete_one({"_id": current_atelier["_id"]})
+                invalidate("ateliers")
                 st.success(t("atelier_deleted", f"Atelier '{current_atelier['name']}' apagado com sucesso!"))
                 st.rerun()
 
@@ -138,9 +136,9 @@ def app(t):
             
             # Exibir imagem na lista
             if atelier.get("image_path"):
-                image_full_path_list = os.path.join(IMG_UPLOAD_DIR, os.path.basename(atelier["image_path"]))
-                if os.path.exists(image_full_path_list):
-                    st.image(image_full_path_list, caption=atelier.get("name", ""), width=100)
+                uploads = get_storage("uploads")
+                if uploads.exists(atelier["image_path"]):
+                    st.image(uploads.read_bytes(atelier["image_path"]), caption=atelier.get("name", ""), width=100)
                 else:
                     st.warning(t("image_not_found_list", "Imagem não encontrada."))
             elif atelier.get("image_base64"):
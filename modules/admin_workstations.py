@@ -1,13 +1,12 @@
 import streamlit as st
 from utils.mongo import get_db
+from utils.storage import get_storage
+from utils.repository import invalidate
 from bson import ObjectId
-import os
 from PIL import Image
 import io
 
-# Pasta para guardar as imagens carregadas
-IMG_UPLOAD_DIR = "uploads" 
-os.makedirs(IMG_UPLOAD_DIR, exist_ok=True)
+# Imagens carregadas ficam no bucket "uploads" (disco local ou GridFS)
 
 def app(t):
     st.title(t("manage_workstations", "Gerir Postos de Trabalho"))
@@ -72,9 +71,9 @@ def app(t):
 
         # Exibir imagem existente, se houver
         if current_workstation and current_workstation.get("image_path"):
-            image_full_path = os.path.join(IMG_UPLOAD_DIR, os.path.basename(current_workstation["image_path"]))
-            if os.path.exists(image_full_path):
-                st.image(image_full_path, caption=t("current_image", "Imagem Atual"), width=150)
+            uploads = get_storage("uploads")
+            if uploads.exists(current_workstation["image_path"]):
+                st.image(uploads.read_bytes(current_workstation["image_path"]), caption=t("current_image", "Imagem Atual"), width=150)
             else:
                 st.warning(t("image_not_found_on_disk", "Imagem referenciada não encontrada no disco."))
         elif current_workstation and current_workstation.get("image_base64"):
@@ -108,17 +107,15 @@ def app(t):
             if uploaded_file is not None:
                 file_extension = uploaded_file.name.split(".")[-1]
                 image_filename = f"{name.replace(' ', '_').lower()}_ws.{file_extension}" # Adicionado _ws para evitar colisões
-                image_path_on_disk = os.path.join(IMG_UPLOAD_DIR, image_filename)
+                get_storage("uploads").write(image_filename, uploaded_file)
                 
-                with open(image_path_on_disk, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                workstation_data["image_path"] = image_path_on_disk
+                workstation_data["image_path"] = image_filename
                 st.success(t("image_uploaded", f"Imagem '{uploaded_file.name}' carregada com sucesso!"))
             
             # Lógica para salvar/atualizar
             if current_workstation:
                 workstations_collection.update_one({"_id": current_workstation["_id"]}, {"$set": workstation_data})
+                invalidate("workstations")
                 st.success(t("workstation_updated", f"Posto de Trabalho '{name}' atualizado com sucesso!"))
             else:
                 if workstations_collection.find_one({"name": name}):
@@ -126,6 +123,7 @@ def app(t):
                     st.stop()
                 else:
                     workstations_collection.insert_one(workstation_data)
+                    invalidate("workstations")
                     st.success(t("workstation_added", f"Posto de Trabalho '{name}' adicionado com sucesso!"))
             
             st.rerun()
@@ -134,11 +132,12 @@ def app(t):
             if st.checkbox(t("confirm_delete", f"Tem certeza que quer apagar o posto de trabalho '{current_workstation['name']}'?"), key="confirm_delete_workstation_checkbox"):
                 
                 # Opcional: Remover a imagem do disco
-                if current_workstation.get("image_path") and os.path.exists(current_workstation["image_path"]):
-                    os.remove(current_workstation["image_path"])
+                if current_workstation.get("image_path") and get_storage("uploads").exists(current_workstation["image_path"]):
+                    get_storage("uploads").delete(current_workstation["image_path"])
                     st.info(t("image_removed", "Imagem do posto de trabalho removida do disco."))
                 
                 workstations_collection.delete_one({"_id": current_workstation["_id"]})
+                invalidate("workstations")
                 st.success(t("workstation_deleted", f"Posto de Trabalho '{current_workstation['name']}' apagado com sucesso!"))
                 st.rerun()
 
@@ -167,9 +166,9 @@ def app(t):
 
             # Exibir imagem na lista
             if ws.get("image_path"):
-                image_full_path_list = os.path.join(IMG_UPLOAD_DIR, os.path.basename(ws["image_path"]))
-                if os.path.exists(image_full_path_list):
-                    st.image(image_full_path_list, caption=ws.get("name", ""), width=100)
+                uploads = get_storage("uploads")
+                if uploads.exists(ws["image_path"]):
+                    st.image(uploads.read_bytes(ws["image_path"]), caption=ws.get("name", ""), width=100)
                 else:
                     st.warning(t("image_not_found_list", "Imagem não encontrada."))
             elif ws.get("image_base64"):
@@ -5,72 +5,288 @@ from PIL import Image, ImageDraw
 from pathlib import Path
 from bson import ObjectId
 import json
+import math
+import pandas as pd
 from streamlit_drawable_canvas import st_canvas
 from utils.mongo import get_db
-
-# Initialize MongoDB connection
-db = get_db()
-
-# Ensure static folders exist
-BASE     = Path(__file__).resolve().parent.parent / "static"
-IMG_DIR  = BASE / "images"
-JSON_DIR = BASE / "annotations"
-IMG_DIR.mkdir(parents=True, exist_ok=True)
-JSON_DIR.mkdir(parents=True, exist_ok=True)
+from utils.storage import get_storage
+from utils.repository import CHAR_PAGE_SIZE, characteristic_page, process_tree, invalidate
+from utils.ancestry import with_ancestry
+from utils.fragments import rerun_fragment
 
 # Sizes for thumbnails and full‐size previews
 THUMBNAIL_WIDTH = 64
 PREVIEW_WIDTH   = 480
 
-def draw_annotation_overlay(img_path: Path, annot_path: Path) -> Image.Image:
+# The drawing canvas works on a copy of the uploaded image no larger than
+# this; shapes are stored as fractions of the image size (ANNOTATION_VERSION)
+# so they can be drawn on the original or any preview size.
+CANVAS_MAX_WIDTH  = 800
+CANVAS_MAX_HEIGHT = 600
+ANNOTATION_VERSION = 2
+STROKE = {"outline": "green", "width": 3}
+DIGITS = 4  # 1/10000 of the image side is finer than any screen pixel
+
+
+def _points(obj) -> list:
+    """Absolute canvas points of a line or free-drawn path"""
+    if obj.get("type") == "line":
+        # fabric lines are centered on left/top, x1..y2 relative to that center
+        cx, cy = obj["left"], obj["top"]
+        return [(cx + obj["x1"], cy + obj["y1"]), (cx + obj["x2"], cy + obj["y2"])]
+    return [(cmd[-2], cmd[-1]) for cmd in obj.get("path", []) if len(cmd) >= 3]
+
+
+def _frac(value, side) -> float:
+    return round(value / side, DIGITS)
+
+
+def normalize_annotation(canvas_json: dict, width: int, height: int, original_size: tuple) -> dict:
+    """
+    Canvas JSON (shapes in pixels of a width × height working copy) →
+    {"version", "image": original size, "shapes"} with every coordinate as a
+    fraction of the image width / height.
     """
-    Load base image and overlay shapes from a Streamlit-Drawable-Canvas JSON file.
+    shapes = []
+    for obj in canvas_json.get("objects", []):
+        t = obj.get("type")
+        sx, sy = obj.get("scaleX", 1), obj.get("scaleY", 1)
+        if t == "rect":
+            shapes.append({"type": "rect", "x": _frac(obj["left"], width), "y": _frac(obj["top"], height),
+                           "w": _frac(obj["width"] * sx, width), "h": _frac(obj["height"] * sy, height)})
+        elif t == "circle":
+            r = obj.get("radius", 10) * sx
+            cx, cy = obj["left"], obj["top"]
+            if obj.get("originX") == "left":
+                # the circle tool anchors the left edge at the first click, rotated by `angle`
+                a = math.radians(obj.get("angle", 0))
+                cx, cy = cx + r * math.cos(a), cy + r * math.sin(a)
+            shapes.append({"type": "circle", "x": _frac(cx, width), "y": _frac(cy, height), "r": _frac(r, width)})
+        elif t in ("line", "path"):
+            pts = [[_frac(x, width), _frac(y, height)] for x, y in _points(obj)]
+            if len(pts) >= 2:
+                shapes.append({"type": "line", "points": pts})
+    return {"version": ANNOTATION_VERSION,
+            "image": {"width": original_size[0], "height": original_size[1]},
+            "shapes": shapes}
+
+
+def draw_annotation_overlay(img_file, annot_text: str, max_width: int = None) -> Image.Image:
     """
-    base = Image.open(img_path).convert("RGBA")
+    Load base image (path or file-like), downscaled to max_width if given, and
+    overlay the annotation shapes, rescaled to the size drawn. Normalised
+    annotations (version 2) and legacy Streamlit-Drawable-Canvas JSON in
+    pixels of the original image are both supported.
+    """
+    base = Image.open(img_file)
+    original_width = base.width
+    if max_width and base.width > max_width:
+        base.thumbnail((max_width, base.height))
+    base = base.convert("RGBA")
     overlay = Image.new("RGBA", base.size, (255, 255, 255, 0))
     draw = ImageDraw.Draw(overlay)
+    W, H = base.size
 
     try:
-        data = json.loads(annot_path.read_text(encoding="utf-8"))
-        for obj in data.get("objects", []):
-            t = obj.get("type")
-            if t == "rect":
-                x, y = obj["left"], obj["top"]
-                w, h = obj["width"], obj["height"]
-                draw.rectangle([x, y, x + w, y + h], outline="green", width=3)
-            elif t == "circle":
-                cx, cy = obj["left"], obj["top"]
-                r = obj.get("radius", 10)
-                draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline="green", width=3)
-            elif t == "line":
-                pts = obj.get("points", [])
-                if len(pts) >= 2:
-                    draw.line(pts, fill="green", width=3)
+        data = json.loads(annot_text)
+        if data.get("version") == ANNOTATION_VERSION:
+            for shape in data.get("shapes", []):
+                t = shape.get("type")
+                if t == "rect":
+                    x, y = shape["x"] * W, shape["y"] * H
+                    draw.rectangle([x, y, x + shape["w"] * W, y + shape["h"] * H], **STROKE)
+                elif t == "circle":
+                    cx, cy, r = shape["x"] * W, shape["y"] * H, shape["r"] * W
+                    draw.ellipse([cx - r, cy - r, cx + r, cy + r], **STROKE)
+                elif t == "line":
+                    draw.line([(x * W, y * H) for x, y in shape["points"]], fill="green", width=3)
+        else:
+            k = W / original_width  # legacy shapes are in pixels of the original
+            for obj in data.get("objects", []):
+                t = obj.get("type")
+                if t == "rect":
+                    x, y = obj["left"] * k, obj["top"] * k
+                    w, h = obj["width"] * k, obj["height"] * k
+                    draw.rectangle([x, y, x + w, y + h], **STROKE)
+                elif t == "circle":
+                    cx, cy = obj["left"] * k, obj["top"] * k
+                    r = obj.get("radius", 10) * k
+                    draw.ellipse([cx - r, cy - r, cx + r, cy + r], **STROKE)
+                elif t == "line":
+                    pts = obj.get("points", [])
+                    if len(pts) >= 2:
+                        draw.line([p * k for p in pts], fill="green", width=3)
     except Exception:
         # If JSON invalid or missing fields, just return base image
         pass
 
     return Image.alpha_composite(base, overlay)
 
+
+def _working_copy(image_file) -> tuple:
+    """(downscaled RGBA copy, original size) of an upload, kept per file in session_state"""
+    cached = st.session_state.get("char_canvas_image")
+    if cached and cached[0] == image_file.file_id:
+        return cached[1], cached[2]
+    img = Image.open(image_file)
+    size = img.size
+    img.thumbnail((CANVAS_MAX_WIDTH, CANVAS_MAX_HEIGHT))
+    img = img.convert("RGBA")
+    st.session_state["char_canvas_image"] = (image_file.file_id, img, size)
+    return img, size
+
+
+@st.fragment
+def _characteristic_list(lang, op_id):
+    """
+    Characteristics of one operation as a single grid, read a page at a time
+    on the server. Selected rows are enabled / disabled / deleted with one
+    update_many / delete_many; edit and preview act on a single selected row.
+    """
+    db = get_db()
+    st.subheader(lang("existing_characteristics", "Existing Characteristics"))
+
+    page_key = f"char_page_{op_id}"
+    total, chars = characteristic_page(op_id, st.session_state.get(page_key, 1) - 1)
+    pages = max(1, -(-total // CHAR_PAGE_SIZE))
+    if st.session_state.get(page_key, 1) > pages:  # the last page emptied by a delete
+        st.session_state[page_key] = pages
+        total, chars = characteristic_page(op_id, pages - 1)
+    if not chars:
+        st.info(lang("no_characteristics", "No characteristics for this operation."))
+        return
+
+    df = pd.DataFrame({
+        lang("designation", "Designation"): [c.get("designation", "") for c in chars],
+        lang("unit", "Unit"):               [c.get("unit", "") for c in chars],
+        lang("nominal", "Nominal"):         [c.get("nominal") for c in chars],
+        lang("tol_min", "Tolerance Min"):   [c.get("tol_min") for c in chars],
+        lang("tol_max", "Tolerance Max"):   [c.get("tol_max") for c in chars],
+        lang("active", "Active"):           [c.get("active") is not False for c in chars],
+        lang("annotation", "Annotation"):   [bool(c.get("annotation_path")) for c in chars],
+    })
+    # a new key after each batch action clears the selection
+    grid_key = f"char_grid_{op_id}_{st.session_state.get('char_grid_version', 0)}"
+    event = st.dataframe(
+        df,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        column_config={
+            col: st.column_config.NumberColumn(format="%.3f")
+            for col in (lang("nominal", "Nominal"), lang("tol_min", "Tolerance Min"), lang("tol_max", "Tolerance Max"))
+        },
+        key=grid_key,
+    )
+    if pages > 1:
+        st.number_input(
+            lang("page", "Page") + f" (/{pages}, {total})",
+            min_value=1, max_value=pages, key=page_key
+        )
+
+    selected = [chars[i] for i in event.selection.rows if i < len(chars)]
+    ids = [c["_id"] for c in selected]
+    st.caption(lang("selected_rows", "Selected") + f": {len(selected)}")
+
+    def batch_done():
+        st.session_state["char_grid_version"] = st.session_state.get("char_grid_version", 0) + 1
+        st.session_state.pop("view_char", None)
+        invalidate("characteristics")
+        rerun_fragment()
+
+    btns = st.columns(5)
+    # ✏️ Edit (the form is outside this fragment: rerun the page)
+    if btns[0].button("✏️ " + lang("edit", "Edit"), disabled=len(selected) != 1, use_container_width=True):
+        st.session_state["edit_char"] = selected[0]
+        st.rerun()
+    # 👁️ Preview annotation
+    if btns[1].button("👁️ " + lang("preview", "Preview"), disabled=len(selected) != 1, use_container_width=True):
+        st.session_state["view_char"] = selected[0]
+    # ✅ Enable / 🚫 Disable / 🗑️ Delete the selection
+    if btns[2].button("✅ " + lang("enable", "Enable"), disabled=not ids, use_container_width=True):
+        db.characteristics.update_many({"_id": {"$in": ids}}, {"$set": {"active": True}})
+        batch_done()
+    if btns[3].button("🚫 " + lang("disable", "Disable"), disabled=not ids, use_container_width=True):
+        db.characteristics.update_many({"_id": {"$in": ids}}, {"$set": {"active": False}})
+        batch_done()
+    with btns[4].popover("🗑️ " + lang("delete", "Delete"), disabled=not ids, use_container_width=True):
+        st.warning(lang("confirm_delete_chars", "Delete the selected characteristics?") + f" ({len(ids)})")
+        if st.button(lang("confirm_delete", "🗑️ Yes, delete"), type="primary", key="char_delete_confirm"):
+            db.characteristics.delete_many({"_id": {"$in": ids}})
+            batch_done()
+
+    st.markdown("---")
+
+    # Full‐width preview below list (if requested)
+    if "view_char" in st.session_state:
+        c = st.session_state["view_char"]
+        img_fn  = c.get("image_path")
+        ann_fn  = c.get("annotation_path")
+        images      = get_storage("images")
+        annotations = get_storage("annotations")
+
+        if images.exists(img_fn) and annotations.exists(ann_fn):
+            over = draw_annotation_overlay(
+                images.open(img_fn),
+                annotations.read_text(ann_fn),
+                max_width=PREVIEW_WIDTH
+            )
+            st.image(
+                over,
+                caption=lang("annotation_preview", "Annotation Preview"),
+                width=PREVIEW_WIDTH
+            )
+        else:
+            st.error(lang("annotation_error", "Image or annotation file not found."))
+
+        if st.button(lang("close_preview", "Close Preview")):
+            del st.session_state["view_char"]
+            rerun_fragment()
+
+@st.fragment
+def _annotation_canvas(lang):
+    """Base image upload and drawing canvas; the result is stashed for the form"""
+    image_file = st.file_uploader(
+        lang("char_image", "Upload Base Image"),
+        type=["png", "jpg", "jpeg"],
+        key="char_image_uploader"
+    )
+    if image_file:
+        # the canvas (background and JSON sent on every stroke) uses a downscaled copy
+        pil_img, original_size = _working_copy(image_file)
+        mode = st.selectbox(
+            lang("drawing_mode", "Drawing Mode"),
+            ["rect", "circle", "line", "freedraw"],
+            key="char_draw_mode"
+        )
+        canvas_result = st_canvas(
+            background_image=pil_img,
+            update_streamlit=True,
+            height=pil_img.height,
+            width=pil_img.width,
+            drawing_mode=mode,
+            stroke_width=3,
+            stroke_color="#00FF00",
+            fill_color="rgba(0,255,0,0.3)",
+            key="char_canvas"
+        )
+        if canvas_result.json_data and canvas_result.json_data.get("objects"):
+            st.session_state["char_annotation"] = normalize_annotation(
+                canvas_result.json_data, pil_img.width, pil_img.height, original_size
+            )
+            st.session_state["char_image_bytes"] = image_file.getvalue()
+            st.session_state["char_image_ext"]   = Path(image_file.name).suffix
+
 def app(lang, filters):
     """
     Characteristics management page.
     Uses three‐level scope: product → route → operation.
-    Lists existing characteristics with action buttons,
+    Lists existing characteristics in a paged grid with batch actions,
     shows full‐size annotation preview on demand,
     and provides an expander form for add/edit.
     """
-    # 1) Global CSS to shrink icon buttons
-    st.markdown("""
-    <style>
-      .stButton>button {
-        padding: 2px 6px !important;
-        font-size: 12px !important;
-        line-height: 1 !important;
-      }
-    </style>
-    """, unsafe_allow_html=True)
-
+    db = get_db()
     st.header(lang("characteristics", "Characteristics"))
 
     # 2) Scope by product → route → operation
@@ -79,15 +295,16 @@ def app(lang, filters):
         st.info(lang("please_select_product", "Please select a product to continue."))
         return
 
-    routes = list(db.routes.find({"product_id": product_id}))
+    # the whole route → operation → characteristic tree is one cached read per
+    # product, so switching route or operation does not query the database
+    routes = process_tree(product_id)
     if not routes:
         st.info(lang("no_routes", "No routes for this product."))
         return
-    route_map = {r["name"]: r["_id"] for r in routes}
+    route_map = {r["name"]: r for r in routes}
     selected_route = st.selectbox(lang("select_route", "Select Route"), list(route_map.keys()))
-    route_id = route_map[selected_route]
 
-    ops = list(db.operations.find({"route_id": route_id}))
+    ops = route_map[selected_route]["operations"]
     if not ops:
         st.info(lang("no_operations", "No operations for this route."))
         return
@@ -97,68 +314,9 @@ def app(lang, filters):
 
     st.markdown("---")
 
-    # 3) List existing characteristics with action icons
-    chars = list(db.characteristics.find({"operation_id": op_id}))
-    st.subheader(lang("existing_characteristics", "Existing Characteristics"))
-
-    for c in chars:
-        # columns: designation, unit, nominal, tol_min, tol_max, actions
-        cols = st.columns([2, 1, 1, 1, 1, 0.5])
-        cols[0].write(c.get("designation", ""))
-        cols[1].write(c.get("unit", ""))
-        cols[2].write(f"{c.get('nominal', 0):.3f}")
-        cols[3].write(f"{c.get('tol_min', 0):.3f}")
-        cols[4].write(f"{c.get('tol_max', 0):.3f}")
-
-        action_col = cols[5]
-        btns = action_col.columns(5, gap="small")
-
-        # ✏️ Edit
-        if btns[0].button("✏️", key=f"edit_{c['_id']}"):
-            st.session_state["edit_char"] = c
-            st.rerun()
-
-        # 🗑️ Delete
-        if btns[1].button("🗑️", key=f"del_{c['_id']}"):
-            db.characteristics.delete_one({"_id": c["_id"]})
-            st.rerun()
-
-        # 🚫 Disable / ✅ Enable
-        if c.get("active", True):
-            if btns[2].button("🚫", key=f"dis_{c['_id']}"):
-                db.characteristics.update_one({"_id": c["_id"]}, {"$set": {"active": False}})
-                st.rerun()
-        else:
-            if btns[2].button("✅", key=f"en_{c['_id']}"):
-                db.characteristics.update_one({"_id": c["_id"]}, {"$set": {"active": True}})
-                st.rerun()
-
-        # 👁️ Preview annotation
-        if btns[3].button("👁️", key=f"view_{c['_id']}"):
-            st.session_state["view_char"] = c
-
-    st.markdown("---")
-
-    # 4) Full‐width preview below list (if requested)
-    if "view_char" in st.session_state:
-        c = st.session_state["view_char"]
-        img_fn  = c.get("image_path")
-        ann_fn  = c.get("annotation_path")
-        img_p   = IMG_DIR / img_fn   if img_fn else None
-        ann_p   = JSON_DIR / ann_fn  if ann_fn else None
-
-        if img_p and img_p.exists() and ann_p and ann_p.exists():
-            over = draw_annotation_overlay(img_p, ann_p)
-            st.image(
-                over,
-                caption=lang("annotation_preview", "Annotation Preview"),
-                width=PREVIEW_WIDTH
-            )
-        else:
-            st.error(lang("annotation_error", "Image or annotation file not found."))
-
-        if st.button(lang("close_preview", "Close Preview")):
-            del st.session_state["view_char"]
+    # 3)–4) Grid with row selection, batch actions and preview: a fragment, so
+    #        these rerun only the list (edit re-runs the page, the form shows it)
+    _characteristic_list(lang, op_id)
 
     st.markdown("---")
 
@@ -172,34 +330,8 @@ def app(lang, filters):
     )
 
     with st.expander(exp_label, expanded=is_edit):
-        # A) Upload + annotate
-        image_file = st.file_uploader(
-            lang("char_image", "Upload Base Image"),
-            type=["png", "jpg", "jpeg"],
-            key="char_image_uploader"
-        )
-        if image_file:
-            pil_img = Image.open(image_file).convert("RGBA")
-            mode = st.selectbox(
-                lang("drawing_mode", "Drawing Mode"),
-                ["rect", "circle", "line", "freedraw"],
-                key="char_draw_mode"
-            )
-            canvas_result = st_canvas(
-                background_image=pil_img,
-                update_streamlit=True,
-                height=pil_img.height,
-                width=pil_img.width,
-                drawing_mode=mode,
-                stroke_width=3,
-                stroke_color="#00FF00",
-                fill_color="rgba(0,255,0,0.3)",
-                key="char_canvas"
-            )
-            if canvas_result.json_data and canvas_result.json_data.get("objects"):
-                st.session_state["char_annotation"] = canvas_result.json_data
-                st.session_state["char_image_bytes"] = image_file.getvalue()
-                st.session_state["char_image_ext"]   = Path(image_file.name).suffix
+        # A) Upload + annotate (every stroke reruns only the canvas fragment)
+        _annotation_canvas(lang)
 
         # B) Metadata form
         defaults = edit_doc or {}
@@ -233,7 +365,7 @@ def app(lang, filters):
                 if not desig.strip():
                     st.error(lang("fill_designation", "Please fill in the Designation."))
                 else:
-                    doc = {
+                    doc = with_ancestry("characteristics", {
                         "operation_id": op_id,
                         "designation":  desig.strip(),
                         "unit":         unit.strip(),
@@ -241,7 +373,7 @@ def app(lang, filters):
                         "tol_min":      tol_min,
                         "tol_max":      tol_max,
                         "active":       True
-                    }
+                    })
                     # retrieve stashed data
                     img_b = st.session_state.pop("char_image_bytes", None)
                     img_e = st.session_state.pop("char_image_ext",   None)
@@ -249,11 +381,11 @@ def app(lang, filters):
 
                     if img_b and img_e and anno:
                         fn_img = f"{desig.strip()}_{ObjectId()}{img_e}"
-                        (IMG_DIR / fn_img).write_bytes(img_b)
+                        get_storage("images").write(fn_img, img_b)
                         doc["image_path"] = fn_img
 
                         fn_json = f"{desig.strip()}_{ObjectId()}.json"
-                        (JSON_DIR / fn_json).write_text(json.dumps(anno), encoding="utf-8")
+                        get_storage("annotations").write(fn_json, json.dumps(anno))
                         doc["annotation_path"] = fn_json
 
                     if is_edit:
@@ -266,4 +398,5 @@ def app(lang, filters):
                     else:
                         db.characteristics.insert_one(doc)
                         st.success(lang("char_created", "Characteristic created!"))
+                    invalidate("characteristics")
                     st.rerun()
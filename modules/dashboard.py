@@ -1,5 +1,10 @@
 import streamlit as st
-from utils.mongo import get_db
+from utils.kpis import get_dashboard_kpis
+from utils.repository import list_ateliers, list_workstations, list_routes, list_products
+from utils.rollups import get_monthly_production
+from utils.alerts import alerts_fragment, count_alerts, list_alerts
+from utils.parallel import gather
+from utils.export import FORMATS, export_frame, offer_download, progress_bar
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -18,16 +23,8 @@ def create_metric_card(title, value, delta=None, delta_color="normal"):
     else:
         st.metric(label=title, value=value)
 
-def create_status_chart(data, status_field="status"):
-    """Create a donut chart for status distribution"""
-    if not data:
-        return None
-    
-    status_counts = {}
-    for item in data:
-        status = item.get(status_field, "Unknown")
-        status_counts[status] = status_counts.get(status, 0) + 1
-    
+def create_status_chart(status_counts):
+    """Create a donut chart for status distribution ({status: count})"""
     if status_counts:
         fig = px.pie(
             values=list(status_counts.values()),
@@ -73,6 +70,91 @@ def create_capacity_chart(data):
         return fig
     return None
 
+@st.fragment
+def _detailed_views(t, entities, loaders):
+    """Entity table, search and export: its widgets rerun only this section"""
+    st.markdown("### 📋 Detailed Data Views")
+
+    # Entity selector
+    entity_options = list(entities.keys())
+    selected_entity = st.selectbox(
+        "Select entity to view:",
+        entity_options,
+        key="entity_selector"
+    )
+
+    if selected_entity:
+        st.subheader(f"📊 {selected_entity} Details")
+
+        items = loaders[entities[selected_entity]]()
+        if items:
+            # Create DataFrame based on entity type
+            if t("ateliers", "Ateliers") in selected_entity:
+                df = pd.DataFrame([{
+                    t("name", "Name"): item.get("name", ""),
+                    t("zone", "Zone"): item.get("zone", ""),
+                    t("capacity", "Capacity"): item.get("capacity", 0),
+                    t("status", "Status"): item.get("status", t("active", "Active"))
+                } for item in items])
+
+            elif t("workstations", "Workstations") in selected_entity:
+                df = pd.DataFrame([{
+                    t("name", "Name"): item.get("name", ""),
+                    t("atelier", "Atelier"): item.get("atelier", ""),
+                    t("status", "Status"): item.get("status", t("active", "Active")),
+                    "Efficiency": f"{np.random.randint(80, 99)}%"
+                } for item in items])
+
+            elif t("routes", "Routes") in selected_entity:
+                df = pd.DataFrame([{
+                    t("name", "Name"): item.get("name", ""),
+                    t("product", "Product"): item.get("product_id", ""),
+                    t("operations", "Operations"): np.random.randint(3, 12),
+                    "Duration": f"{np.random.randint(30, 180)} min"
+                } for item in items])
+
+            elif t("products", "Products") in selected_entity:
+                df = pd.DataFrame([{
+                    t("name", "Name"): item.get("name", ""),
+                    t("code", "Code"): item.get("code", ""),
+                    t("status", "Status"): item.get("status", t("active", "Active")),
+                    "Units Produced": np.random.randint(100, 1000)
+                } for item in items])
+
+            # Display data with search and filter
+            search_term = st.text_input("🔍 Search:", placeholder="Type to search...")
+
+            if search_term:
+                mask = df.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)
+                df = df[mask]
+
+            st.dataframe(
+                df,
+                use_container_width=True,
+                hide_index=True
+            )
+
+            # Export functionality (written to a file in batches, real .xlsx for Excel)
+            col1, col2, col3 = st.columns([1, 1, 4])
+            export_name = f"{selected_entity.lower().replace(' ', '_')}_export"
+
+            with col1:
+                export_format = st.selectbox("Format", list(FORMATS), key="entity_export_format",
+                                             label_visibility="collapsed")
+
+            with col2:
+                if st.button("📤 Export", use_container_width=True):
+                    st.session_state.entity_export = export_frame(
+                        df, export_format, export_name, progress_bar("Exporting...")
+                    )
+
+            with col3:
+                if st.session_state.get("entity_export"):
+                    offer_download(st.session_state.entity_export, "📥 Download", key="entity_export_download")
+
+        else:
+            st.warning(f"No data available for {selected_entity}")
+
 def app(lang, filters):
     t = lang
     
@@ -89,24 +171,38 @@ def app(lang, filters):
         </div>
     """, unsafe_allow_html=True)
 
-    # Get data from database
-    db = get_db()
-    data = {
-        t("ateliers", "Ateliers"): list(db.ateliers.find()),
-        t("workstations", "Workstations"): list(db.workstations.find()),
-        t("routes", "Routes"): list(db.routes.find()),
-        t("products", "Products"): list(db.products.find())
+    # KPIs (single aggregation), production trend, alerts and the entity list
+    # shown in "Detailed Views" are independent cached reads: one concurrent batch
+    entities = {
+        t("ateliers", "Ateliers"): "ateliers",
+        t("workstations", "Workstations"): "workstations",
+        t("routes", "Routes"): "routes",
+        t("products", "Products"): "products"
+    }
+    loaders = {
+        "ateliers": list_ateliers,
+        "workstations": list_workstations,
+        "routes": list_routes,
+        "products": list_products
     }
+    selected_loader = loaders[entities.get(st.session_state.get("entity_selector"), "ateliers")]
+    reads = gather(
+        "dashboard",
+        kpis=get_dashboard_kpis,
+        monthly=lambda: get_monthly_production(months=12),
+        alerts=lambda: list_alerts("active", 10),
+        alert_count=count_alerts,
+        entity=selected_loader,
+    )
+    kpis = reads["kpis"]
 
     # KPI Section
     st.markdown("## 📊 Key Performance Indicators")
     
     kpi_cols = st.columns(4)
     kpi_data = [
-        (t("ateliers", "Ateliers"), len(data[t("ateliers", "Ateliers")]), "+2"),
-        (t("workstations", "Workstations"), len(data[t("workstations", "Workstations")]), "+5"),
-        (t("routes", "Routes"), len(data[t("routes", "Routes")]), "+1"),
-        (t("products", "Products"), len(data[t("products", "Products")]), "+3")
+        (label, kpis["counts"][coll], None)
+        for label, coll in entities.items()
     ]
     
     for i, (label, value, delta) in enumerate(kpi_data):
@@ -134,7 +230,7 @@ def app(lang, filters):
             
             # Create a sample factory layout visualization
             layout_data = []
-            for atelier in data[t("ateliers", "Ateliers")]:
+            for atelier in kpis["ateliers"]:
                 layout_data.append({
                     'x': np.random.randint(0, 10),
                     'y': np.random.randint(0, 8),
@@ -166,19 +262,15 @@ def app(lang, filters):
             st.markdown("#### 📊 Status Distribution")
             
             # Status charts for different entities
-            workstation_chart = create_status_chart(data[t("workstations", "Workstations")])
+            workstation_chart = create_status_chart(kpis["workstation_status"])
             if workstation_chart:
                 st.plotly_chart(workstation_chart, use_container_width=True)
             
             # Quick stats
             st.markdown("#### 🎯 Quick Stats")
-            total_capacity = sum(item.get('capacity', 0) for item in data[t("ateliers", "Ateliers")])
-            active_workstations = len([w for w in data[t("workstations", "Workstations")] 
-                                    if w.get('status') in ['Active', 'Ativo']])
-            
             st.info(f"""
-                **Total Capacity:** {total_capacity:,}  
-                **Active Workstations:** {active_workstations}  
+                **Total Capacity:** {kpis["total_capacity"]:,}  
+                **Active Workstations:** {kpis["active_workstations"]}  
                 **Efficiency:** 87.3%  
                 **Uptime:** 94.2%
             """)
@@ -190,28 +282,31 @@ def app(lang, filters):
         
         with col1:
             # Capacity analysis
-            capacity_chart = create_capacity_chart(data[t("ateliers", "Ateliers")])
+            capacity_chart = create_capacity_chart(kpis["ateliers"])
             if capacity_chart:
                 st.plotly_chart(capacity_chart, use_container_width=True)
         
         with col2:
-            # Production trends (simulated data)
+            # Production trends (measured parts per month, from daily rollups)
             st.markdown("#### 📊 Production Trends")
-            dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='M')
-            production = np.random.randint(800, 1200, len(dates))
-            
-            df_trends = pd.DataFrame({
-                'Month': dates,
-                'Production': production
-            })
+            monthly = reads["monthly"]
             
-            fig_trends = px.line(
-                df_trends, x='Month', y='Production',
-                title="Monthly Production Trends",
-                markers=True
-            )
-            fig_trends.update_layout(height=400)
-            st.plotly_chart(fig_trends, use_container_width=True)
+            if monthly:
+                df_trends = pd.DataFrame(monthly).rename(columns={
+                    'month': 'Month',
+                    'count': 'Production',
+                    'oos_count': 'Out of Spec'
+                })
+                
+                fig_trends = px.line(
+                    df_trends, x='Month', y=['Production', 'Out of Spec'],
+                    title="Monthly Production Trends",
+                    markers=True
+                )
+                fig_trends.update_layout(height=400)
+                st.plotly_chart(fig_trends, use_container_width=True)
+            else:
+                st.info(t("no_measurements", "No measurements found."))
         
         # Performance metrics
         st.markdown("#### 🎯 Performance Metrics")
@@ -220,7 +315,11 @@ def app(lang, filters):
         with perf_cols[0]:
             st.metric("Overall Equipment Effectiveness", "87.3%", "2.1%")
         with perf_cols[1]:
-            st.metric("Quality Rate", "96.8%", "0.5%")
+            quality_rate = kpis["quality_rate"]
+            st.metric(
+                "Quality Rate",
+                f"{quality_rate:.1f}%" if quality_rate is not None else "N/A"
+            )
         with perf_cols[2]:
             st.metric("Availability", "94.2%", "-1.2%")
 
@@ -230,19 +329,7 @@ def app(lang, filters):
         # Real-time alerts
         st.markdown("#### 🚨 Active Alerts")
         
-        alerts = [
-            {"type": "warning", "message": "Workstation WS-003 requires maintenance in 2 days", "time": "2 hours ago"},
-            {"type": "info", "message": "New batch started in Atelier A-01", "time": "30 minutes ago"},
-            {"type": "success", "message": "Route optimization completed successfully", "time": "1 hour ago"}
-        ]
-        
-        for alert in alerts:
-            if alert["type"] == "warning":
-                st.warning(f"⚠️ {alert['message']} ({alert['time']})")
-            elif alert["type"] == "info":
-                st.info(f"ℹ️ {alert['message']} ({alert['time']})")
-            else:
-                st.success(f"✅ {alert['message']} ({alert['time']})")
+        alerts_fragment(t)
         
         # Operations summary
         st.markdown("#### 📋 Today's Operations")
@@ -255,95 +342,10 @@ def app(lang, filters):
         with ops_cols[2]:
             st.metric("Pending", "5", "2")
         with ops_cols[3]:
-            st.metric("Quality Issues", "1", "-2")
+            st.metric("Quality Issues", reads["alert_count"])
 
     with tab4:
-        st.markdown("### 📋 Detailed Data Views")
-        
-        # Entity selector
-        entity_options = list(data.keys())
-        selected_entity = st.selectbox(
-            "Select entity to view:",
-            entity_options,
-            key="entity_selector"
-        )
-        
-        if selected_entity:
-            st.subheader(f"📊 {selected_entity} Details")
-            
-            items = data[selected_entity]
-            if items:
-                # Create DataFrame based on entity type
-                if t("ateliers", "Ateliers") in selected_entity:
-                    df = pd.DataFrame([{
-                        t("name", "Name"): item.get("name", ""),
-                        t("zone", "Zone"): item.get("zone", ""),
-                        t("capacity", "Capacity"): item.get("capacity", 0),
-                        t("status", "Status"): item.get("status", t("active", "Active"))
-                    } for item in items])
-                
-                elif t("workstations", "Workstations") in selected_entity:
-                    df = pd.DataFrame([{
-                        t("name", "Name"): item.get("name", ""),
-                        t("atelier", "Atelier"): item.get("atelier", ""),
-                        t("status", "Status"): item.get("status", t("active", "Active")),
-                        "Efficiency": f"{np.random.randint(80, 99)}%"
-                    } for item in items])
-                
-                elif t("routes", "Routes") in selected_entity:
-                    df = pd.DataFrame([{
-                        t("name", "Name"): item.get("name", ""),
-                        t("product", "Product"): item.get("product_id", ""),
-                        t("operations", "Operations"): np.random.randint(3, 12),
-                        "Duration": f"{np.random.randint(30, 180)} min"
-                    } for item in items])
-                
-                elif t("products", "Products") in selected_entity:
-                    df = pd.DataFrame([{
-                        t("name", "Name"): item.get("name", ""),
-                        t("code", "Code"): item.get("code", ""),
-                        t("status", "Status"): item.get("status", t("active", "Active")),
-                        "Units Produced": np.random.randint(100, 1000)
-                    } for item in items])
-                
-                # Display data with search and filter
-                search_term = st.text_input("🔍 Search:", placeholder="Type to search...")
-                
-                if search_term:
-                    mask = df.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)
-                    df = df[mask]
-                
-                st.dataframe(
-                    df,
-                    use_container_width=True,
-                    hide_index=True
-                )
-                
-                # Export functionality
-                col1, col2, col3 = st.columns([1, 1, 4])
-                
-                with col1:
-                    if st.download_button(
-                        f"📥 Export CSV",
-                        df.to_csv(index=False).encode('utf-8'),
-                        f"{selected_entity.lower().replace(' ', '_')}_export.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    ):
-                        st.success("Download started!")
-                
-                with col2:
-                    if st.download_button(
-                        f"📊 Export Excel",
-                        df.to_csv(index=False).encode('utf-8'),  # In real scenario, use df.to_excel()
-                        f"{selected_entity.lower().replace(' ', '_')}_export.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    ):
-                        st.success("Excel export started!")
-            
-            else:
-                st.warning(f"No data available for {selected_entity}")
+        _detailed_views(t, entities, loaders)
 
     # Active filters section
     if filters:
@@ -4,6 +4,8 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 from datetime import datetime, timedelta
+from utils.alerts import count_alerts, render_alerts
+from utils.export import FORMATS, export_frame, offer_download, progress_bar
 
 def create_metric_card(title, value, delta=None, delta_color="normal"):
     """Create a styled metric card"""
@@ -165,19 +167,7 @@ def render_operations_tab(data, filters, t):
     st.markdown("### 🔧 Operations Management")
 
     st.markdown("#### 🚨 Active Alerts")
-    alerts = [
-        {"type": "warning", "message": "Workstation WS-003 requires maintenance in 2 days", "time": "2 hours ago"},
-        {"type": "info", "message": "New batch started in Atelier A-01", "time": "30 minutes ago"},
-        {"type": "success", "message": "Route optimization completed successfully", "time": "1 hour ago"}
-    ]
-
-    for alert in alerts:
-        if alert["type"] == "warning":
-            st.warning(f"⚠️ {alert['message']} ({alert['time']})")
-        elif alert["type"] == "info":
-            st.info(f"ℹ️ {alert['message']} ({alert['time']})")
-        else:
-            st.success(f"✅ {alert['message']} ({alert['time']})")
+    render_alerts(t)
 
     st.markdown("#### 📋 Today's Operations")
     ops_cols = st.columns(4)
@@ -188,7 +178,7 @@ def render_operations_tab(data, filters, t):
     with ops_cols[2]:
         create_metric_card("Pending", "5", "2")
     with ops_cols[3]:
-        create_metric_card("Quality Issues", "1", "-2")
+        create_metric_card("Quality Issues", count_alerts())
 
 def render_details_tab(data, filters, t):
     st.markdown("### 📋 Detailed Data Views")
@@ -252,26 +242,22 @@ def render_details_tab(data, filters, t):
                 )
 
                 col1, col2, col3 = st.columns([1, 1, 4])
+                export_name = f"{selected_entity.lower().replace(' ', '_')}_export"
 
                 with col1:
-                    if st.download_button(
-                        t("export_csv", "📥 Export CSV"),
-                        df.to_csv(index=False).encode('utf-8'),
-                        f"{selected_entity.lower().replace(' ', '_')}_export.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    ):
-                        st.success(t("download_started", "Download started!"))
+                    export_format = st.selectbox(t("format", "Format"), list(FORMATS), key="entity_export_format",
+                                                 label_visibility="collapsed")
 
                 with col2:
-                    if st.download_button(
-                        t("export_excel", "📊 Export Excel"),
-                        df.to_csv(index=False).encode('utf-8'),  # Change to df.to_excel() if openpyxl is installed
-                        f"{selected_entity.lower().replace(' ', '_')}_export.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    ):
-                        st.success(t("excel_export_started", "Excel export started!"))
+                    if st.button(t("export", "📤 Export"), use_container_width=True):
+                        st.session_state.entity_export = export_frame(
+                            df, export_format, export_name, progress_bar(t("exporting", "Exporting..."))
+                        )
+
+                with col3:
+                    if st.session_state.get("entity_export"):
+                        offer_download(st.session_state.entity_export, t("download", "📥 Download"),
+                                       key="entity_export_download")
             else:
                 st.warning(t("no_data_for_entity", f"No data available for {selected_entity}"))
         else:
@@ -1,5 +1,5 @@
 import streamlit as st
-from utils.mongo import get_db
+from utils.repository import list_families, count_families
 from modules.filters import get_global_filters
 
 def app(lang, filters):
@@ -7,11 +7,8 @@ def app(lang, filters):
     st.title(lang("families"))
     st.header(lang("families_management"))
 
-    # Get database
-    db = get_db()
-
-    # Get families
-    families = list(db.families.find({}))
+    # Get families (cached)
+    families = list_families()
     if not families:
         st.info(lang("no_families", "No families found."))
         return
@@ -19,10 +16,10 @@ def app(lang, filters):
     for family in families:
         st.markdown(f"**{family['name']}**: {family.get('description', lang('no_description', 'No description available.'))}")
 
-    data = len(families)
-    cols = st.columns(len(families))
-    for i in families:
-        with cols[i]:
+    total = count_families()
+    cols = st.columns(min(len(families), 4))
+    for i, family in enumerate(families):
+        with cols[i % len(cols)]:
             st.markdown(f"""
                 <div style='
                     border:1px solid #ccc;
@@ -34,12 +31,12 @@ def app(lang, filters):
                     box-shadow:2px 2px 6px rgba(0,0,0,0.1);
                     cursor:pointer;
                 '>
-                    <h3></h3>
+                    <h3>{family['name']}</h3>
                     <div style='font-size:24px;font-weight:bold;margin:10px;'>
-                        {len(families)}
+                        {total}
                     </div>
                 </div>
             """, unsafe_allow_html=True)
             
-            if st.button(lang("view_details", "View Details"), key=f"btn_{families['name']}", use_container_width=True):
-                st.session_state['selected_view'] = families['name']
+            if st.button(lang("view_details", "View Details"), key=f"btn_{family['_id']}", use_container_width=True):
+                st.session_state['selected_view'] = family['name']
@@ -1,9 +1,8 @@
 # modules/filters.py
 
 import streamlit as st
-from utils.mongo import get_db
-
-db = get_db()
+from utils.repository import list_ateliers, list_families, list_products
+from utils.parallel import gather
 
 def get_global_filters(lang):
     """
@@ -19,10 +18,19 @@ def get_global_filters(lang):
     ALL_FAM = lang("all_families",  "All Families")
     ALL_PR  = lang("all_products",  "All Products")
 
+    # — the three lists for the previous selection are read in one concurrent
+    #   batch; only a level whose parent selection changed is read again below
+    scope = st.session_state.get("filter_scope", {})
+    gather(
+        "filters",
+        ateliers=list_ateliers,
+        families=lambda: list_families(scope.get("atelier_id")),
+        products=lambda: list_products(scope.get("family_id"), atelier_id=scope.get("atelier_id")),
+    )
+
     # — 1) Atelier
     
-    collection_name = "ateliers"
-    atelier_docs = list(db[collection_name].find({}))
+    atelier_docs = list_ateliers()
     if not atelier_docs:
         st.warning(lang("no_ateliers", "No ateliers available."))
         return {"atelier_id": None, "family_id": None, "product_id": None}
@@ -46,11 +54,7 @@ def get_global_filters(lang):
     atelier_id = None if sel_atelier == ALL_AT else atelier_map.get(sel_atelier)
 
     # — 2) Family, filtered by atelier_id
-    if atelier_id:
-        fam_cursor = db.families.find({"atelier_id": atelier_id})
-    else:
-        fam_cursor = db.families.find({})
-    family_docs = list(fam_cursor)
+    family_docs = list_families(atelier_id)
     if not family_docs:
         st.warning(lang("no_families", "No families available."))
         return {"atelier_id": atelier_id, "family_id": None, "product_id": None}
@@ -66,12 +70,8 @@ def get_global_filters(lang):
         )
     family_id = None if sel_family == ALL_FAM else family_map.get(sel_family)
 
-    # — 3) Product, filtered by family_id
-    if family_id:
-        prod_cursor = db.products.find({"family_id": family_id})
-    else:
-        prod_cursor = db.products.find({})
-    product_docs = list(prod_cursor)
+    # — 3) Product, filtered by family_id (or atelier_id, kept on products)
+    product_docs = list_products(family_id, atelier_id=atelier_id)
     if not product_docs:
         st.warning(lang("no_products", "No products available."))
         return {
@@ -91,6 +91,7 @@ def get_global_filters(lang):
         )
     product_id = None if sel_product == ALL_PR else product_map.get(sel_product)
 
+    st.session_state["filter_scope"] = {"atelier_id": atelier_id, "family_id": family_id}
     return {
         "atelier_id": atelier_id,
         "family_id":  family_id,
@@ -1,51 +1,196 @@
+# modules/measurements.py
+
 import streamlit as st
-from utils.mongo import get_db
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from datetime import datetime, timedelta, timezone
+from utils.repository import process_tree
+from utils.measurement_store import insert_measurement, find_measurements, count_measurements, spec_limits
+from utils.rollups import get_characteristic_trend
+from utils.stream import get_stream
+
+# Time windows for the measurements table (None = whole history)
+WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d":  timedelta(days=7),
+    "30d": timedelta(days=30),
+    "1y":  timedelta(days=365),
+    "all": None
+}
+PAGE_SIZES = [50, 100, 250, 500]
+
+# Live chart: refresh period (s) and points shown
+LIVE_REFRESH = 2
+LIVE_POINTS = 200
+
+
+@st.fragment(run_every=LIVE_REFRESH)
+def live_chart(lang, char, stream):
+    """
+    Individuals chart fed by the measurement stream. The series is loaded once
+    into the session; each refresh appends only the points stored since then.
+    """
+    key = f"live_{char['_id']}"
+    state = st.session_state.get(key)
+    if state is None:
+        seq = stream.seq
+        points = find_measurements({"characteristic_id": char["_id"]}, limit=LIVE_POINTS)[::-1]
+        state = st.session_state[key] = {"seq": seq, "points": points}
+
+    new, state["seq"] = stream.since(char["_id"], state["seq"])
+    last = state["points"][-1]["timestamp"] if state["points"] else None
+    new = [p for p in new if last is None or p["timestamp"] > last]
+    if new:
+        state["points"] = (state["points"] + new)[-LIVE_POINTS:]
+
+    points = state["points"]
+    if not points:
+        st.info(lang("no_measurements", "No measurements found."))
+        return
+    fig = go.Figure(go.Scatter(
+        x=[p["timestamp"] for p in points],
+        y=[p["value"] for p in points],
+        mode="lines+markers",
+        marker_color=["red" if p.get("out_of_spec") else "steelblue" for p in points],
+        text=[p.get("serial_number", "") for p in points],
+        hovertemplate="%{text}<br>%{y:.3f}<extra></extra>"
+    ))
+    lsl, usl = spec_limits(char)
+    if lsl is not None:
+        fig.add_hline(y=lsl, line_dash="dash", line_color="red", annotation_text="LSL")
+        fig.add_hline(y=usl, line_dash="dash", line_color="red", annotation_text="USL")
+        fig.add_hline(y=char["nominal"], line_dash="dot", line_color="green", annotation_text="Nominal")
+    fig.update_layout(height=350, margin=dict(t=20, b=20), showlegend=False)
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"{len(points)} / {LIVE_POINTS} · +{len(new)}")
+
 
 def app(lang, filters):
+    """
+    Measurements page.
+    Scope: product (global filter) → route → operation → characteristic.
+    Readings are shown as a paged table over a time window.
+    """
     st.title(lang("measurements"))
-    st.sidebar.title(lang("measurements_management"))
 
-    # get db
-    db = get_db()
+    # 1) Scope by product → route → operation → characteristic
+    product_id = filters.get("product_id")
+    if not product_id:
+        st.info(lang("please_select_product", "Please select a product to continue."))
+        return
 
-    # get measurements
-    measurements = list(db.measurements.find({}))
-    if not measurements:
-        st.info(lang("no_measurements", "No measurements found."))
-        
+    routes = process_tree(product_id)
+    if not routes:
+        st.info(lang("no_routes", "No routes for this product."))
+        return
+    route_map = {r["name"]: r for r in routes}
 
-    # display measurements
-    for m in measurements:
-        st.markdown(f"**{m['name']}**: {m['value']} {m['unit']}")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_route = st.selectbox(lang("select_route", "Select Route"), list(route_map.keys()))
 
-    # add new measurement form, link to routes
-    st.sidebar.subheader(lang("add_measurement", "Add Measurement"))
-    # dropdown to select family or all
-    selected_family = st.selectbox(lang("select_family", "Select Family"), ["All"] + [f["name"] for f in db.families.find({})])
-    if selected_family != "All":
-        family_id = db.families.find_one({"name": selected_family})["_id"]
-    else:
-        family_id = None
-    # dropdown to select product or all
-    selected_product = st.selectbox(lang("select_product", "Select Product"), ["All"] + [p["name"] for p in db.products.find({"family_id": family_id})] if family_id else ["All"])
-    if selected_product != "All":
-        product_id = db.products.find_one({"name": selected_product})["family_id"]
-    else:
-        product_id = None
+    ops = route_map[selected_route]["operations"]
+    if not ops:
+        st.info(lang("no_operations", "No operations for this route."))
+        return
+    op_labels = [f"{o.get('step_number', '')} - {o['name']}" for o in ops]
+    with col2:
+        selected_op = st.selectbox(lang("select_operation", "Select Operation"), op_labels)
+    op = ops[op_labels.index(selected_op)]
+
+    chars = [c for c in op["characteristics"] if c.get("active") is not False]
+    if not chars:
+        st.info(lang("no_characteristics", "No characteristics for this operation."))
+        return
+    char_labels = [f"{c.get('designation', '')} ({c.get('unit', '')})" for c in chars]
+    with col3:
+        selected_char = st.selectbox(lang("select_characteristic", "Select Characteristic"), char_labels)
+    char = chars[char_labels.index(selected_char)]
 
-    with st.form("add_measurement"):
-        st.subheader(lang("add_measurement", "Add Measurement"))
-        name = st.text_input(lang("measurement_name", "Measurement Name"))
-        value = st.number_input(lang("measurement_value", "Value"), format="%.2f")
-        unit = st.text_input(lang("measurement_unit", "Unit"))
+    stream = get_stream()
 
+    # 2) Add new measurement (sidebar form)
+    st.sidebar.subheader(lang("add_measurement", "Add Measurement"))
+    with st.sidebar.form("add_measurement", clear_on_submit=True):
+        value = st.number_input(lang("measurement_value", "Value"), format="%.3f")
+        serial_number = st.text_input(lang("serial_number", "Serial Number"))
+        operator = st.text_input(
+            lang("operator", "Operator"),
+            value=st.session_state.get("user", {}).get("username", "")
+        )
         if st.form_submit_button(lang("add", "Add")):
-            if name and unit:
-                db.measurements.insert_one({
-                    "name": name,
-                    "value": value,
-                    "unit": unit
-                })
-                st.success(lang("measurement_added", "Measurement added successfully."))
+            if serial_number.strip():
+                doc = insert_measurement(char, value, serial_number.strip(), operator.strip())
+                if stream:
+                    stream.publish(char["_id"], doc)
+                if doc["out_of_spec"]:
+                    st.warning(lang("measurement_out_of_spec", "Measurement added (out of spec)."))
+                else:
+                    st.success(lang("measurement_added", "Measurement added successfully."))
             else:
-                st.error(lang("fill_all_fields", "Please fill all fields."))
\ No newline at end of file
+                st.error(lang("fill_all_fields", "Please fill all fields."))
+
+    st.markdown("---")
+
+    # 3) Windowed, paged table
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        window = st.radio(
+            lang("time_window", "Time window"),
+            list(WINDOWS.keys()),
+            index=1,
+            horizontal=True,
+            key="meas_window"
+        )
+    with col2:
+        page_size = st.selectbox(lang("page_size", "Rows per page"), PAGE_SIZES, key="meas_page_size")
+
+    start = datetime.now(timezone.utc) - WINDOWS[window] if WINDOWS[window] else None
+    meta_filter = {"characteristic_id": char["_id"]}
+    total = count_measurements(meta_filter, start)
+    pages = max(1, -(-total // page_size))
+
+    with col3:
+        page = st.number_input(
+            lang("page", "Page"),
+            min_value=1,
+            max_value=pages,
+            value=1,
+            key="meas_page"
+        )
+
+    if not total:
+        st.info(lang("no_measurements", "No measurements found."))
+    else:
+        rows = find_measurements(meta_filter, start, skip=(page - 1) * page_size, limit=page_size)
+        df = pd.DataFrame(rows)
+        st.dataframe(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            height=min(35 * (len(df) + 1), 600),
+            column_order=["timestamp", "value", "serial_number", "operator", "out_of_spec"],
+            column_config={
+                "timestamp": st.column_config.DatetimeColumn(lang("timestamp", "Timestamp")),
+                "value": st.column_config.NumberColumn(lang("measurement_value", "Value"), format="%.3f"),
+                "serial_number": lang("serial_number", "Serial Number"),
+                "operator": lang("operator", "Operator"),
+                "out_of_spec": st.column_config.CheckboxColumn(lang("out_of_spec", "Out of spec"))
+            }
+        )
+        first = (page - 1) * page_size + 1
+        st.caption(f"{first}–{first + len(df) - 1} / {total}")
+
+    # 4) Live chart (only when a measurement stream is configured)
+    if stream:
+        st.subheader(lang("live_measurements", "Live Measurements"))
+        live_chart(lang, char, stream)
+
+    # 5) Daily trend from the rollups
+    trend = get_characteristic_trend(char["_id"])
+    if trend:
+        st.subheader(lang("daily_trend", "Daily Trend"))
+        df_trend = pd.DataFrame(trend)
+        fig = px.line(df_trend, x="day", y="mean", markers=True, hover_data=["count", "oos_count", "cpk"])
+        st.plotly_chart(fig, use_container_width=True)
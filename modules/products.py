@@ -5,110 +5,97 @@ import pandas as pd
 from bson import ObjectId
 from pathlib import Path
 from utils.mongo import get_db
-
-# Initialize database and static folder
-db = get_db()
-IMG_DIR = Path(__file__).resolve().parent.parent / "static" / "images"
-IMG_DIR.mkdir(parents=True, exist_ok=True)
-
-def app(lang, filters):
-    """
-    Products management page, using global filters:
-      filters["atelier_id"], filters["family_id"], filters["product_id"]
-    """
-    st.title(lang("products", "Products"))
-    st.header(lang("products_management", "Manage Products"))
-
-    # --- 1) Build the Mongo query from filters ---
-    prod_id   = filters.get("product_id")
-    family_id = filters.get("family_id")
-
-    if prod_id:
-        query = {"_id": ObjectId(prod_id)}
-    elif family_id:
-        query = {"family_id": family_id}
-    else:
-        query = {}
-
-    # --- 2) Fetch products ---
-    prods = list(db.products.find(query))
-
-    # --- 3) Prepare family lookup for display & forms ---
-    all_fams = list(db.families.find({}))
-    fam_map  = {f["name"]: f["_id"] for f in all_fams}
-    fam_names = [lang("all_families", "All Families")] + list(fam_map.keys())
-
-    # --- 4) Editable products table ---
-    if not prods:
+from utils.storage import get_storage
+from utils.repository import list_families, invalidate
+from utils.frames import product_frame
+from utils.ancestry import refresh, with_ancestry
+from utils.parallel import gather
+from utils.fragments import rerun_fragment
+
+
+@st.fragment
+def _product_table(lang, scope, fam_map):
+    """Editable products table; editing and saving rerun only this section"""
+    db = get_db()
+    prods = product_frame(*scope)
+    if prods.empty:
         st.info(lang("no_products", "No products found."))
-    else:
-        records = []
-        for p in prods:
-            fam_id   = p.get("family_id")
-            fam_name = next((n for n,i in fam_map.items() if i == fam_id), "")
-            records.append({
-                "_id": str(p["_id"]),
-                lang("product_code","Code"):        p.get("code",""),
-                lang("product_name","Name"):       p.get("name",""),
-                lang("product_desc","Description"):p.get("description",""),
-                lang("family","Family"):           fam_name,
-                lang("product_image","Image"):     p.get("image_path","")
-            })
-        df = pd.DataFrame(records)
-
-        edited = st.data_editor(
-            df,
-            column_order=[
-                lang("product_code","Code"),
-                lang("product_name","Name"),
-                lang("product_desc","Description"),
-                lang("family","Family"),
-                lang("product_image","Image")
-            ],
-            hide_index=True,
-            use_container_width=True,
-            key="prod_editor"
-        )
-
-        if st.button(lang("save_changes", "💾 Save Changes")):
-            origs = df.to_dict("records")
-            edits = edited.to_dict("records")
-            updates = 0
-            field_map = {
-                lang("product_code","Code"):        "code",
-                lang("product_name","Name"):        "name",
-                lang("product_desc","Description"): "description",
-                lang("family","Family"):            "family_id",
-                lang("product_image","Image"):      "image_path"
-            }
-            for orig, new in zip(origs, edits):
-                delta = {}
-                for col_label, field in field_map.items():
-                    if orig[col_label] != new[col_label]:
-                        if field == "family_id":
-                            delta[field] = fam_map.get(new[col_label])
-                        else:
-                            delta[field] = new[col_label]
-                if delta:
-                    db.products.update_one(
-                        {"_id": ObjectId(orig["_id"])},
-                        {"$set": delta}
-                    )
-                    updates += 1
-            if updates:
-                st.success(lang("products_updated", f"{updates} products updated!"))
-                st.rerun()
-            else:
-                st.info(lang("no_changes", "No changes to save."))
-
-    # --- 5) Change Product Image (collapsed by default) ---
+        return
+
+    fam_by_id = {str(i): n for n, i in fam_map.items()}
+    df = pd.DataFrame({
+        "_id": prods["_id"],
+        lang("product_code","Code"):        prods["code"],
+        lang("product_name","Name"):        prods["name"],
+        lang("product_desc","Description"): prods["description"],
+        lang("family","Family"):            prods["family_id"].map(fam_by_id),
+        lang("product_image","Image"):      prods["image_path"]
+    }).fillna("")
+
+    edited = st.data_editor(
+        df,
+        column_order=[
+            lang("product_code","Code"),
+            lang("product_name","Name"),
+            lang("product_desc","Description"),
+            lang("family","Family"),
+            lang("product_image","Image")
+        ],
+        hide_index=True,
+        use_container_width=True,
+        key="prod_editor"
+    )
+
+    if st.button(lang("save_changes", "💾 Save Changes")):
+        origs = df.to_dict("records")
+        edits = edited.to_dict("records")
+        updates = 0
+        moved = []
+        field_map = {
+            lang("product_code","Code"):        "code",
+            lang("product_name","Name"):        "name",
+            lang("product_desc","Description"): "description",
+            lang("family","Family"):            "family_id",
+            lang("product_image","Image"):      "image_path"
+        }
+        for orig, new in zip(origs, edits):
+            delta = {}
+            for col_label, field in field_map.items():
+                if orig[col_label] != new[col_label]:
+                    if field == "family_id":
+                        delta[field] = fam_map.get(new[col_label])
+                    else:
+                        delta[field] = new[col_label]
+            if delta:
+                db.products.update_one(
+                    {"_id": ObjectId(orig["_id"])},
+                    {"$set": delta}
+                )
+                updates += 1
+                if "family_id" in delta:
+                    moved.append(ObjectId(orig["_id"]))
+        if updates:
+            # re-parented products pass their new family/atelier down
+            refresh("products", moved)
+            invalidate("products")
+            st.success(lang("products_updated", f"{updates} products updated!"))
+            rerun_fragment()
+        else:
+            st.info(lang("no_changes", "No changes to save."))
+
+
+@st.fragment
+def _product_image(lang, scope):
+    """Product image form; submitting it reruns only this section"""
+    db = get_db()
+    prods = product_frame(*scope)
     with st.expander(lang("change_image","🔄 Change Product Image"), expanded=False):
         with st.form("change_image_form", clear_on_submit=True):
-            if prods:
-                prod_map = {
-                    p["code"]: (str(p["_id"]), p.get("image_path",""))
-                    for p in prods
-                }
+            if not prods.empty:
+                prod_map = dict(zip(
+                    prods["code"],
+                    zip(prods["_id"], prods["image_path"].fillna(""))
+                ))
                 chosen_code = st.selectbox(
                     lang("select_product","Select Product"),
                     list(prod_map.keys()),
@@ -117,11 +104,9 @@ def app(lang, filters):
                 doc_id, curr_image = prod_map[chosen_code]
 
                 if curr_image:
-                    img_path = IMG_DIR / curr_image
-                    if img_path.exists():
-                        from PIL import Image
-                        img = Image.open(img_path)
-                        st.image(img, caption=lang("current_image","Current Image"))
+                    images = get_storage("images")
+                    if images.exists(curr_image):
+                        st.image(images.read_bytes(curr_image), caption=lang("current_image","Current Image"))
                     else:
                         st.warning(lang("image_not_found","Image file not found."))
 
@@ -135,16 +120,51 @@ def app(lang, filters):
                     if new_file:
                         ext = Path(new_file.name).suffix
                         new_name = f"{chosen_code}_{ObjectId()}{ext}"
-                        (IMG_DIR / new_name).write_bytes(new_file.getbuffer())
+                        get_storage("images").write(new_name, new_file)
                         db.products.update_one(
                             {"_id": ObjectId(doc_id)},
                             {"$set": {"image_path": new_name}}
                         )
+                        invalidate("products")
                         st.success(lang("image_updated","Image updated successfully!"))
-                        st.rerun()
+                        rerun_fragment()
                     else:
                         st.error(lang("select_image","Please choose a new image file."))
 
+
+def app(lang, filters):
+    """
+    Products management page, using global filters:
+      filters["atelier_id"], filters["family_id"], filters["product_id"]
+    """
+    db = get_db()
+    st.title(lang("products", "Products"))
+    st.header(lang("products_management", "Manage Products"))
+
+    # --- 1) Build the Mongo query from filters ---
+    prod_id   = filters.get("product_id")
+    family_id = filters.get("family_id")
+    atelier_id = filters.get("atelier_id")
+
+    # --- 2) Fetch products (cached, keyed by the filters) and all families
+    #        (for display & forms) in one concurrent batch ---
+    scope = (family_id, ObjectId(prod_id) if prod_id else None, atelier_id)
+    reads = gather(
+        "products",
+        prods=lambda: product_frame(*scope),
+        families=list_families,
+    )
+
+    # --- 3) Prepare family lookup for display & forms ---
+    all_fams = reads["families"]
+    fam_map  = {f["name"]: f["_id"] for f in all_fams}
+    fam_names = [lang("all_families", "All Families")] + list(fam_map.keys())
+
+    # --- 4) Editable products table, 5) Change Product Image: fragments over
+    #        the cached product frame (widgets there rerun only their section) ---
+    _product_table(lang, scope, fam_map)
+    _product_image(lang, scope)
+
     # --- 6) Add New Product (collapsed by default) ---
     with st.expander(lang("add_product","➕ Add New Product"), expanded=False):
         with st.form("add_prod_form", clear_on_submit=True):
@@ -186,7 +206,7 @@ def app(lang, filters):
                     if image_file:
                         ext = Path(image_file.name).suffix
                         img_fn = f"{code.strip()}_{ObjectId()}{ext}"
-                        (IMG_DIR / img_fn).write_bytes(image_file.getbuffer())
+                        get_storage("images").write(img_fn, image_file)
 
                     new_doc = {
                         "code": code.strip(),
@@ -197,7 +217,8 @@ def app(lang, filters):
                     if img_fn:
                         new_doc["image_path"] = img_fn
 
-                    db.products.insert_one(new_doc)
+                    db.products.insert_one(with_ancestry("products", new_doc))
+                    invalidate("products")
                     st.success(lang("product_created","Product created successfully!"))
                     st.rerun()
 
@@ -215,6 +236,7 @@ def app(lang, filters):
                 if submitted:
                     if family_name.strip():
                         db.families.insert_one({"name": family_name.strip()})
+                        invalidate("families")
                         st.success(lang("family_created","Family created successfully!"))
                         st.rerun()
                     else:
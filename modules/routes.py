@@ -5,36 +5,25 @@ import pandas as pd
 from bson import ObjectId
 from pathlib import Path
 from utils.mongo import get_db
+from utils.repository import invalidate, process_tree
+from utils.ancestry import with_ancestry
+from utils.fragments import rerun_fragment
 
-db = get_db()
 
-def app(lang, filters):
-    """
-    Routes & Operations management page.
-    Uses the global `filters["product_id"]` to scope everything.
-    """
-    st.title(lang("routes", "Routes & Operations"))
-
-    # 1) Ensure a product is selected in the global filters
-    product_id = filters.get("product_id")
-    if not product_id:
-        st.info(lang("please_select_product",
-                     "Please select a product in the global filters to continue."))
-        
-
-    # ————————————— Manage Routes —————————————
+@st.fragment
+def _routes_section(lang, product_id):
+    """Routes editor and new-route form; editing reruns only this section"""
+    db = get_db()
     st.subheader(lang("manage_routes", "Manage Routes"))
 
-    # 2) Load & edit existing routes for this product
-    if not product_id:
-        routes = list(db.routes.find({}))
-    else:
-        routes = list(db.routes.find({"product_id": product_id}))
+    # 2) Load & edit existing routes for this product (the product's whole
+    #    route → operation tree is one cached read; picking a route is free)
+    routes = process_tree(product_id)
     if routes:
-        df_routes = pd.DataFrame([{
-            "_id": str(r["_id"]),
-            lang("route_name","Route Name"): r["name"]
-        } for r in routes])
+        df_routes = pd.DataFrame({
+            "_id": [str(r["_id"]) for r in routes],
+            lang("route_name","Route Name"): [r.get("name") for r in routes]
+        }).fillna("")
 
         edited_routes = st.data_editor(
             df_routes,
@@ -56,8 +45,9 @@ def app(lang, filters):
                     )
                     updates += 1
             if updates:
+                invalidate("routes")
                 st.success(lang("routes_updated", f"{updates} routes updated!"))
-                st.rerun()
+                st.rerun()  # route names also feed the operations section
             else:
                 st.info(lang("no_changes","No changes to save."))
     else:
@@ -72,36 +62,40 @@ def app(lang, filters):
                 if not name.strip():
                     st.error(lang("fill_route_name","Please fill in the Route Name."))
                 else:
-                    db.routes.insert_one({
+                    db.routes.insert_one(with_ancestry("routes", {
                         "product_id": product_id,
                         "name": name.strip()
-                    })
+                    }))
+                    invalidate("routes")
                     st.success(lang("route_created","Route created successfully!"))
                     st.rerun()
 
-    st.markdown("---")
 
-    # ————————————— Manage Operations —————————————
+@st.fragment
+def _operations_section(lang, product_id):
+    """Route picker, operations editor and new-operation form"""
+    db = get_db()
     # 4) Must select one of the existing routes
+    routes = process_tree(product_id)
     if not routes:
         return
 
-    route_map = {r["name"]: r["_id"] for r in routes}
+    route_map = {r["name"]: r for r in routes}
     selected_route = st.selectbox(
         lang("select_route","Select Route"),
         list(route_map.keys()),
         key="select_route"
     )
-    route_id = route_map[selected_route]
+    route_id = route_map[selected_route]["_id"]
 
     st.subheader(lang("operations","Operations"))
-    ops = list(db.operations.find({"route_id": route_id}))
+    ops = route_map[selected_route]["operations"]
     if ops:
-        df_ops = pd.DataFrame([{
-            "_id": str(o["_id"]),
-            lang("step_number","Step"): o.get("step_number",0),
-            lang("operation_name","Operation Name"): o.get("name","")
-        } for o in ops])
+        df_ops = pd.DataFrame({
+            "_id": [str(o["_id"]) for o in ops],
+            lang("step_number","Step"): [o.get("step_number") for o in ops],
+            lang("operation_name","Operation Name"): [o.get("name") for o in ops]
+        }).fillna({lang("step_number","Step"): 0, lang("operation_name","Operation Name"): ""})
 
         edited_ops = st.data_editor(
             df_ops,
@@ -131,8 +125,9 @@ def app(lang, filters):
                     )
                     updates += 1
             if updates:
+                invalidate("operations")
                 st.success(lang("operations_updated", f"{updates} operations updated!"))
-                st.rerun()
+                rerun_fragment()
             else:
                 st.info(lang("no_changes","No changes to save."))
     else:
@@ -152,10 +147,36 @@ def app(lang, filters):
                 if not op_name.strip():
                     st.error(lang("fill_operation_name","Please fill in the Operation Name."))
                 else:
-                    db.operations.insert_one({
+                    db.operations.insert_one(with_ancestry("operations", {
                         "route_id":   route_id,
                         "name":       op_name.strip(),
                         "step_number": step
-                    })
+                    }))
+                    invalidate("operations")
                     st.success(lang("operation_created","Operation created successfully!"))
-                    st.rerun()
+                    rerun_fragment()
+
+
+def app(lang, filters):
+    """
+    Routes & Operations management page.
+    Uses the global `filters["product_id"]` to scope everything.
+    """
+    st.title(lang("routes", "Routes & Operations"))
+
+    # 1) Ensure a product is selected in the global filters
+    product_id = filters.get("product_id")
+    if not product_id:
+        st.info(lang("please_select_product",
+                     "Please select a product in the global filters to continue."))
+        return
+
+    # Each section is a fragment over the product's cached process tree:
+    # a widget or button in one reruns that section only
+    # ————————————— Manage Routes —————————————
+    _routes_section(lang, product_id)
+
+    st.markdown("---")
+
+    # ————————————— Manage Operations —————————————
+    _operations_section(lang, product_id)
@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 from utils.mongo import get_db
+from utils.frames import find_frame
 import bcrypt
 from bson.objectid import ObjectId
 
@@ -46,16 +46,14 @@ def app(lang):
 
     # Existing Users
     st.subheader(t("existing_users", "Existing Users"))
-    users_cursor = db.users.find({}, {"password": 0})
-    users_list = list(users_cursor)
+    df = find_frame("users", fields=["_id", "username", "role", "active", "preferred_language"])
 
-    if not users_list:
+    if df.empty:
         st.info(t("no_users", "No users found."))
         return
 
-    df = pd.DataFrame(users_list)
-    df["_id"] = df["_id"].astype(str)
-    df = df.rename(columns={"_id": "id"})
+    # login requires active == True, so a missing flag means inactive
+    df = df.rename(columns={"_id": "id"}).fillna({"active": False})
     edited = st.data_editor(df, num_rows="dynamic", use_container_width=True, 
                 column_order=["username","role", "active"])
 
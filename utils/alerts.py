@@ -0,0 +1,307 @@
+# utils/alerts.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import streamlit as st
+from bson import ObjectId
+from pymongo import DESCENDING, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.mongo import get_db
+from utils.repository import cached_read, invalidate, register_dependent
+from utils.fragments import rerun_fragment
+
+ALERTS_COLLECTION = "alerts"
+STATE_COLLECTION = "alert_state"
+BACKLOG_COLLECTION = "alert_backlog"
+
+# Control limits are frozen from the first BASELINE_POINTS readings of a
+# characteristic (centre = mean, sigma = average moving range / d2)
+BASELINE_POINTS = 25
+D2 = 1.128
+HISTORY = 8  # z-scores kept per characteristic (longest rule)
+
+# A rule firing again within DEDUP_WINDOW updates the open alert; at most
+# RATE_LIMIT new alerts per characteristic per RATE_WINDOW, the rest are counted
+DEDUP_WINDOW = timedelta(hours=1)
+RATE_WINDOW = timedelta(hours=1)
+RATE_LIMIT = 5
+
+# Several writers (stream, page inserts, other replicas) can evaluate the same
+# characteristic at once: a state is written only if its `rev` is unchanged
+# since it was read, otherwise its readings are replayed on the fresh state
+STATE_RETRIES = 5
+
+# Readings whose rule pass failed are kept in BACKLOG_COLLECTION and replayed
+# by the next evaluate(); a claim older than BACKLOG_CLAIM (crashed writer) lapses
+BACKLOG_CLAIM = timedelta(minutes=10)
+READING_FIELDS = ("value", "out_of_spec", "timestamp", "meta")
+
+# rule → (severity, description)
+RULES = {
+    "spec": ("critical", "Out of specification"),
+    "we1": ("critical", "1 point beyond 3σ"),
+    "we2": ("warning", "2 of 3 points beyond 2σ on one side"),
+    "we3": ("warning", "4 of 5 points beyond 1σ on one side"),
+    "we4": ("warning", "8 points in a row on one side of the centre line"),
+}
+
+
+def _utc(ts: datetime) -> datetime:
+    """Naive UTC, as datetimes come back from Mongo"""
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def new_state(characteristic_id) -> dict:
+    return {
+        "_id": characteristic_id,
+        "n": 0, "sum": 0.0, "mr_sum": 0.0, "last": None,
+        "center": None, "sigma": None,
+        "z": [], "open": {}, "recent": [], "suppressed": 0,
+    }
+
+
+def _beyond(z: list, count: int, of: int, limit: float) -> bool:
+    window = z[-of:]
+    return len(window) == of and (
+        sum(v > limit for v in window) >= count or sum(v < -limit for v in window) >= count
+    )
+
+
+def check_reading(state: dict, doc: dict) -> list:
+    """Fold one reading into the rolling state and return the rules it breaks"""
+    value = doc["value"]
+    fired = ["spec"] if doc.get("out_of_spec") else []
+
+    if state["last"] is not None:
+        state["mr_sum"] += abs(value - state["last"])
+    state["last"] = value
+    state["n"] += 1
+
+    if state["sigma"] is None:
+        # baseline phase: accumulate, freeze the limits at BASELINE_POINTS
+        state["sum"] += value
+        if state["n"] >= BASELINE_POINTS and state["mr_sum"] > 0:
+            state["center"] = state["sum"] / state["n"]
+            state["sigma"] = state["mr_sum"] / (state["n"] - 1) / D2
+        return fired
+
+    z = state["z"] = (state["z"] + [(value - state["center"]) / state["sigma"]])[-HISTORY:]
+    if abs(z[-1]) > 3:
+        fired.append("we1")
+    if _beyond(z, 2, 3, 2):
+        fired.append("we2")
+    if _beyond(z, 4, 5, 1):
+        fired.append("we3")
+    if len(z) == HISTORY and (all(v > 0 for v in z) or all(v < 0 for v in z)):
+        fired.append("we4")
+    return fired
+
+
+def _alert_ops(state: dict, doc: dict, rules: list, labels: dict) -> list:
+    """Alert writes for the rules a reading broke, after de-duplication and rate limiting"""
+    ops = []
+    ts = _utc(doc["timestamp"])
+    state["recent"] = [t for t in state["recent"] if ts - t < RATE_WINDOW]
+    for rule in rules:
+        opened = state["open"].get(rule)
+        if opened and ts - opened["last_seen"] <= DEDUP_WINDOW:
+            opened["last_seen"] = ts
+            ops.append(UpdateOne(
+                {"_id": opened["alert_id"], "status": "active"},
+                {"$set": {"last_seen": ts, "value": doc["value"]}, "$inc": {"count": 1}}
+            ))
+            continue
+        if len(state["recent"]) >= RATE_LIMIT:
+            state["suppressed"] += 1
+            continue
+
+        severity, description = RULES[rule]
+        alert_id = ObjectId()
+        state["open"][rule] = {"alert_id": alert_id, "last_seen": ts}
+        state["recent"].append(ts)
+        ops.append(InsertOne({
+            "_id": alert_id,
+            "characteristic_id": state["_id"],
+            "meta": doc["meta"],
+            "rule": rule,
+            "severity": severity,
+            "message": f"{labels.get(state['_id'], '?')}: {description} ({doc['value']:.3f})",
+            "value": doc["value"],
+            "timestamp": ts,
+            "last_seen": ts,
+            "count": 1,
+            "status": "active",
+            "created_at": datetime.now(timezone.utc),
+        }))
+    return ops
+
+
+def _forget_acknowledged(db, states: list):
+    """Drop open alerts that are no longer active, so a repeat raises a new alert"""
+    ids = [opened["alert_id"] for state in states for opened in state["open"].values()]
+    if not ids:
+        return
+    active = set(db[ALERTS_COLLECTION].distinct("_id", {"_id": {"$in": ids}, "status": "active"}))
+    for state in states:
+        state["open"] = {rule: o for rule, o in state["open"].items() if o["alert_id"] in active}
+
+
+def _save_states(db, states: list) -> set:
+    """Compare-and-swap the states on their `rev`; returns the ids that were written"""
+    ops = []
+    for state in states:
+        rev = state.get("rev")
+        state["rev"] = ObjectId()
+        ops.append(ReplaceOne({"_id": state["_id"], "rev": rev}, state, upsert=True))
+    try:
+        db[STATE_COLLECTION].bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # a new state another writer created first fails its upsert on _id
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    saved = {s["_id"]: s.get("rev") for s in db[STATE_COLLECTION].find(
+        {"_id": {"$in": [state["_id"] for state in states]}}, {"rev": 1})}
+    return {state["_id"] for state in states if saved.get(state["_id"]) == state["rev"]}
+
+
+def defer(docs: list):
+    """Keep stored readings whose rule pass failed; the next evaluate() replays them"""
+    if docs:
+        get_db()[BACKLOG_COLLECTION].bulk_write([
+            ReplaceOne({"_id": d["_id"]}, {f: d[f] for f in READING_FIELDS}, upsert=True) for d in docs
+        ], ordered=False)
+
+
+def _claim_backlog(db) -> tuple:
+    """(claim token, deferred readings claimed by this pass)"""
+    if db[BACKLOG_COLLECTION].find_one({}, {"_id": 1}) is None:
+        return None, []
+    token, now = ObjectId(), datetime.utcnow()
+    db[BACKLOG_COLLECTION].update_many(
+        {"$or": [{"claim": {"$exists": False}}, {"claimed_at": {"$lt": now - BACKLOG_CLAIM}}]},
+        {"$set": {"claim": token, "claimed_at": now}}
+    )
+    return token, list(db[BACKLOG_COLLECTION].find({"claim": token}))
+
+
+def evaluate(docs: list, done: set = None) -> int:
+    """
+    Run the spec and Western Electric rules over newly stored readings, and
+    over deferred ones (see defer). The ids of the characteristics whose
+    state was committed are added to `done`, so a caller can tell which
+    readings still need a pass when this raises.
+    """
+    db = get_db()
+    done = set() if done is None else done
+    token, backlog = _claim_backlog(db)
+    ids = {d.get("_id") for d in docs}
+    try:
+        return _evaluate(db, docs + [b for b in backlog if b["_id"] not in ids], done)
+    finally:
+        if backlog:
+            db[BACKLOG_COLLECTION].delete_many(
+                {"claim": token, "meta.characteristic_id": {"$in": list(done)}})
+            db[BACKLOG_COLLECTION].update_many({"claim": token}, {"$unset": {"claim": "", "claimed_at": ""}})
+
+
+def _evaluate(db, docs: list, done: set) -> int:
+    """
+    States are read and written once per batch; a characteristic whose state
+    changed meanwhile is replayed on the new state. Alerts are written only
+    for committed states. Returns the number of alert writes.
+    """
+    pending = defaultdict(list)
+    for doc in sorted(docs, key=lambda d: _utc(d["timestamp"])):
+        pending[doc["meta"]["characteristic_id"]].append(doc)
+    if not pending:
+        return 0
+
+    writes = 0
+    for _ in range(STATE_RETRIES):
+        states = {s["_id"]: s for s in db[STATE_COLLECTION].find({"_id": {"$in": list(pending)}})}
+        _forget_acknowledged(db, list(states.values()))
+        fired = []
+        for char_id, readings in pending.items():
+            state = states.setdefault(char_id, new_state(char_id))
+            for doc in readings:
+                rules = check_reading(state, doc)
+                if rules:
+                    fired.append((state, doc, rules))
+
+        ops = defaultdict(list)
+        if fired:
+            labels = {c["_id"]: c.get("designation", "") for c in db.characteristics.find(
+                {"_id": {"$in": list({state["_id"] for state, _, _ in fired})}}, {"designation": 1})}
+            for state, doc, rules in fired:
+                ops[state["_id"]] += _alert_ops(state, doc, rules, labels)
+
+        saved = _save_states(db, list(states.values()))
+        alert_ops = [op for char_id in saved for op in ops[char_id]]
+        if alert_ops:
+            db[ALERTS_COLLECTION].bulk_write(alert_ops, ordered=True)
+            invalidate(ALERTS_COLLECTION)
+            writes += len(alert_ops)
+        done.update(saved)
+        pending = {char_id: readings for char_id, readings in pending.items() if char_id not in saved}
+        if not pending:
+            return writes
+    raise RuntimeError(f"Alert state of {len(pending)} characteristics kept changing, readings not evaluated")
+
+
+@cached_read
+def list_alerts(status: str = "active", limit: int = 20) -> list:
+    return list(get_db()[ALERTS_COLLECTION].find({"status": status}).sort("last_seen", DESCENDING).limit(limit))
+
+
+@cached_read
+def count_alerts(status: str = "active") -> int:
+    return get_db()[ALERTS_COLLECTION].count_documents({"status": status})
+
+
+register_dependent(ALERTS_COLLECTION, list_alerts)
+register_dependent(ALERTS_COLLECTION, count_alerts)
+
+
+def acknowledge_alert(alert_id: ObjectId, username: str = ""):
+    get_db()[ALERTS_COLLECTION].update_one(
+        {"_id": alert_id},
+        {"$set": {"status": "acknowledged", "acknowledged_by": username,
+                  "acknowledged_at": datetime.now(timezone.utc)}}
+    )
+    invalidate(ALERTS_COLLECTION)
+
+
+def _ago(ts: datetime) -> str:
+    minutes = int((datetime.utcnow() - ts).total_seconds() // 60)
+    if minutes < 60:
+        return f"{max(minutes, 0)} min"
+    if minutes < 48 * 60:
+        return f"{minutes // 60} h"
+    return f"{minutes // 1440} d"
+
+
+def render_alerts(t, limit: int = 10):
+    """Active alerts, newest first, with an acknowledge button each"""
+    alerts = list_alerts("active", limit)
+    if not alerts:
+        st.success(f"✅ {t('no_active_alerts', 'No active alerts')}")
+        return
+    for alert in alerts:
+        col1, col2 = st.columns([12, 1])
+        count = f" ×{alert['count']}" if alert.get("count", 1) > 1 else ""
+        text = f"{alert['message']}{count} ({_ago(alert['last_seen'])})"
+        with col1:
+            if alert["severity"] == "critical":
+                st.error(f"🚨 {text}")
+            else:
+                st.warning(f"⚠️ {text}")
+        with col2:
+            if st.button("✓", key=f"ack_{alert['_id']}", help=t("acknowledge", "Acknowledge")):
+                acknowledge_alert(alert["_id"], st.session_state.get("user", {}).get("username", ""))
+                rerun_fragment()
+
+
+@st.fragment
+def alerts_fragment(t, limit: int = 10):
+    """render_alerts as a fragment: acknowledging reruns only the alert list"""
+    render_alerts(t, limit)
@@ -0,0 +1,144 @@
+# utils/analytics.py
+
+import pandas as pd
+import streamlit as st
+from pymongo.errors import OperationFailure
+from utils.mongo import get_db
+
+# Server-side aggregations behind the admin "Visualizações" tab.
+# With sample=True every pipeline starts from a $sample of SAMPLE_SIZE
+# documents, which keeps exploratory views on huge collections to seconds.
+SAMPLE_SIZE = 10_000
+ANALYTICS_TTL = 60
+TOP_VALUES = 50
+
+NUMERIC_TYPES = {"double", "int", "long", "decimal"}
+CATEGORICAL_TYPES = {"string", "bool", "objectId"}
+DATE_UNITS = ["hour", "day", "week", "month", "year"]
+
+# errors raised by servers (or mongomock) lacking an operator
+UNSUPPORTED = (OperationFailure, NotImplementedError)
+
+
+def _source(sample: bool) -> list:
+    return [{"$sample": {"size": SAMPLE_SIZE}}] if sample else []
+
+
+def _aggregate(collection_name: str, sample: bool, stages: list) -> list:
+    return list(get_db()[collection_name].aggregate(_source(sample) + stages, allowDiskUse=True))
+
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def field_profile(collection_name: str, sample: bool) -> tuple:
+    """
+    (documents analysed, DataFrame with one row per field: filled, empty,
+    percent filled and dominant BSON type), from one $facet pass.
+    """
+    result = _aggregate(collection_name, sample, [{"$facet": {
+        "total": [{"$count": "n"}],
+        "fields": [
+            {"$project": {"kv": {"$objectToArray": "$$ROOT"}}},
+            {"$unwind": "$kv"},
+            {"$group": {"_id": {"field": "$kv.k", "type": {"$type": "$kv.v"}}, "n": {"$sum": 1}}},
+        ],
+    }}])[0]
+    total = result["total"][0]["n"] if result["total"] else 0
+    if not result["fields"]:
+        return total, pd.DataFrame(columns=["Campo", "Tipo", "Preenchido", "Vazio", "Percentual"])
+
+    types = pd.DataFrame([{**r["_id"], "n": r["n"]} for r in result["fields"]])
+    filled = types[types["type"] != "null"].groupby("field")["n"].sum()
+    dominant = types.sort_values("n").groupby("field")["type"].last()
+    profile = pd.DataFrame({"Tipo": dominant, "Preenchido": filled}).fillna({"Preenchido": 0})
+    profile["Preenchido"] = profile["Preenchido"].astype(int)
+    profile["Vazio"] = total - profile["Preenchido"]
+    profile["Percentual"] = profile["Preenchido"] / total * 100 if total else 0.0
+    return total, profile.rename_axis("Campo").reset_index()
+
+
+def fields_of_type(profile: pd.DataFrame, kinds: set) -> list:
+    return profile.loc[profile["Tipo"].isin(kinds), "Campo"].tolist()
+
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def value_counts(collection_name: str, field: str, sample: bool,
+                 sum_field: str = None, limit: int = TOP_VALUES) -> pd.DataFrame:
+    """Documents (or the sum of `sum_field`) per value of `field`, largest first"""
+    value = {"$sum": f"${sum_field}"} if sum_field else {"$sum": 1}
+    rows = _aggregate(collection_name, sample, [
+        {"$group": {"_id": f"${field}", "value": value}},
+        {"$sort": {"value": -1}},
+        {"$limit": limit},
+    ])
+    return pd.DataFrame({field: [str(r["_id"]) for r in rows], sum_field or "Count": [r["value"] for r in rows]})
+
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def time_series(collection_name: str, field: str, unit: str, sample: bool) -> pd.DataFrame:
+    """Documents per `unit` of a date field ($dateTrunc)"""
+    rows = _aggregate(collection_name, sample, [
+        {"$match": {field: {"$type": "date"}}},
+        {"$group": {"_id": {"$dateTrunc": {"date": f"${field}", "unit": unit}}, "n": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ])
+    return pd.DataFrame({"Data": [r["_id"] for r in rows], "Contagem": [r["n"] for r in rows]})
+
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def numeric_summary(collection_name: str, fields: tuple, sample: bool) -> pd.DataFrame:
+    """count / mean / std / min / max per numeric field, in one $group"""
+    group = {"_id": None}
+    for i, field in enumerate(fields):
+        is_number = {"$cond": [{"$isNumber": f"${field}"}, 1, 0]}
+        group.update({f"count{i}": {"$sum": is_number}, f"mean{i}": {"$avg": f"${field}"},
+                      f"std{i}": {"$stdDevSamp": f"${field}"},
+                      f"min{i}": {"$min": f"${field}"}, f"max{i}": {"$max": f"${field}"}})
+    rows = _aggregate(collection_name, sample, [{"$group": group}])
+    stats = rows[0] if rows else {}
+    return pd.DataFrame({
+        field: {stat: stats.get(f"{stat}{i}") for stat in ("count", "mean", "std", "min", "max")}
+        for i, field in enumerate(fields)
+    })
+
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def histogram(collection_name: str, field: str, sample: bool, low: float, high: float,
+              buckets: int = 20) -> pd.DataFrame:
+    """
+    Equal-width buckets of a numeric field between low and high ($bucket);
+    values outside the range (another sample) fall in the edge buckets
+    """
+    width = (high - low) / buckets if high > low else 0
+    if not width:
+        buckets = 1
+    edges = [low + i * width for i in range(buckets)]
+    rows = _aggregate(collection_name, sample, [
+        {"$match": {field: {"$type": "number"}}},
+        {"$bucket": {
+            "groupBy": {"$min": [{"$max": [f"${field}", low]}, high]},
+            "boundaries": edges + [float("inf")],
+        }},
+    ])
+    counts = {r["_id"]: r["count"] for r in rows}
+    return pd.DataFrame({
+        "min": edges,
+        "max": edges[1:] + [high],
+        "count": [counts.get(edge, 0) for edge in edges],
+    })
+
+
+@st.cache_data(ttl=ANALYTICS_TTL, show_spinner=False)
+def average_size(collection_name: str):
+    """Average BSON document size in bytes (collStats, else $bsonSize over a sample)"""
+    db = get_db()
+    try:
+        return db.command({"collStats": collection_name}).get("avgObjSize")
+    except UNSUPPORTED:
+        pass
+    try:
+        rows = _aggregate(collection_name, True, [
+            {"$group": {"_id": None, "size": {"$avg": {"$bsonSize": "$$ROOT"}}}}
+        ])
+    except UNSUPPORTED:
+        return None
+    return rows[0]["size"] if rows else 0
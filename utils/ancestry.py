@@ -0,0 +1,93 @@
+# utils/ancestry.py
+
+from collections import defaultdict
+from pymongo import UpdateMany
+from utils.mongo import ANCESTRY, ID_FIELDS, get_db
+from utils.repository import invalidate
+
+# Write side of the ANCESTRY fields (see utils/mongo.py): new documents copy
+# them from their parent, and when a document is re-parented (or edited in
+# the admin) its new ancestry is pushed down to every descendant with one
+# update_many per collection, matched on the ancestry field itself.
+META_COLLECTIONS = ("measurements", "alerts")
+
+
+def _parent_collection(collection: str) -> str:
+    parent_field = ANCESTRY[collection][0]
+    return next(c for c, f in ID_FIELDS.items() if f == parent_field)
+
+
+def descendants(collection: str) -> list:
+    """Collections whose documents carry this collection's id"""
+    field = ID_FIELDS.get(collection)
+    return [c for c, fields in ANCESTRY.items() if field in fields]
+
+
+def fill(collection: str, docs: list) -> list:
+    """Set the ancestry fields of documents from their parents (one query for all)"""
+    if collection not in ANCESTRY or collection == "families":
+        return docs
+    parent_field = ANCESTRY[collection][0]
+    inherited = ANCESTRY[_parent_collection(collection)]
+    parent_ids = {d[parent_field] for d in docs if d.get(parent_field)}
+    parents = {
+        p["_id"]: p for p in get_db()[_parent_collection(collection)].find(
+            {"_id": {"$in": list(parent_ids)}}, {f: 1 for f in inherited})
+    } if parent_ids else {}
+    for doc in docs:
+        parent = parents.get(doc.get(parent_field), {})
+        doc.update({f: parent.get(f) for f in inherited})
+    return docs
+
+
+def with_ancestry(collection: str, doc: dict) -> dict:
+    return fill(collection, [doc])[0]
+
+
+def push_down(collection: str, docs: list):
+    """Copy the ancestry of `docs` to their descendants (and to meta of their measurements)"""
+    if collection not in ANCESTRY or not docs:
+        return
+    field = ID_FIELDS[collection]
+    groups = defaultdict(list)
+    for doc in docs:
+        groups[tuple(doc.get(f) for f in ANCESTRY[collection])].append(doc["_id"])
+
+    db = get_db()
+    children = descendants(collection)
+    for values, ids in groups.items():
+        ancestry = dict(zip(ANCESTRY[collection], values))
+        for child in children:
+            db[child].update_many({field: {"$in": ids}}, {"$set": ancestry})
+        meta = {f"meta.{f}": v for f, v in ancestry.items() if f != "atelier_id"}
+        if meta:
+            for coll in META_COLLECTIONS:
+                db[coll].update_many({f"meta.{field}": {"$in": ids}}, {"$set": meta})
+    invalidate(*children)
+
+
+def refresh(collection: str, ids: list, fields=None):
+    """
+    Recompute the ancestry of documents after their parent field (or, for
+    families, atelier_id) may have changed, and push it down. Documents
+    sharing a parent are updated with one update_many. With `fields` (the
+    fields that were written) nothing is done unless one of them is an
+    ancestry field.
+    """
+    if collection not in ANCESTRY or not ids:
+        return
+    if fields is not None and not set(fields) & set(ANCESTRY[collection]):
+        return
+    db = get_db()
+    docs = list(db[collection].find({"_id": {"$in": list(ids)}}, {f: 1 for f in ANCESTRY[collection]}))
+    if docs and collection != "families":
+        fill(collection, docs)
+        groups = defaultdict(list)
+        for doc in docs:
+            groups[tuple(doc.get(f) for f in ANCESTRY[collection])].append(doc["_id"])
+        db[collection].bulk_write([
+            UpdateMany({"_id": {"$in": group_ids}}, {"$set": dict(zip(ANCESTRY[collection], values))})
+            for values, group_ids in groups.items()
+        ], ordered=False)
+    push_down(collection, docs)
+    invalidate(collection)
@@ -4,10 +4,10 @@ import streamlit as st
 import bcrypt
 import json
 from streamlit_cookies_manager import EncryptedCookieManager
-from utils.mongo import get_db
+from utils.mongo import get_db, get_setting
 
 # Pull this secret from .streamlit/secrets.toml
-cookie_secret = st.secrets["COOKIE_PASSWORD"]
+cookie_secret = get_setting("COOKIE_PASSWORD")
 
 # Initialize cookie manager
 cookies = EncryptedCookieManager(prefix="spacial_", password=cookie_secret)
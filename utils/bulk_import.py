@@ -0,0 +1,342 @@
+# utils/bulk_import.py
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from bson import ObjectId, json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.mongo import ANCESTRY, get_db
+from utils.frames import collection_schema
+from utils.repository import invalidate
+from utils.ancestry import fill, refresh
+
+# ERP extracts are read CHUNK_SIZE records at a time, resolved and written
+# with one unordered insert_many / bulk_write per chunk. A reference field
+# may hold an ObjectId or the name/code of the referenced document; the
+# lookups are preloaded once per import into an in-memory map.
+CHUNK_SIZE = 2000
+READ_SIZE = 1 << 20  # bytes per read when streaming a JSON array
+MAX_ERRORS = 200     # row errors kept in the report
+
+# reference field → (collection, fields a value may be looked up by)
+REFERENCES = {
+    "atelier_id": ("ateliers", ["name"]),
+    "workstation_id": ("workstations", ["name"]),
+    "family_id": ("families", ["name"]),
+    "product_id": ("products", ["code", "name"]),
+    "route_id": ("routes", ["name"]),
+    "operation_id": ("operations", ["name"]),
+    "characteristic_id": ("characteristics", ["designation", "name"]),
+    "user_id": ("users", ["username"]),
+}
+# natural key offered for upserts
+UPSERT_KEYS = {"products": "code", "users": "username", "characteristics": "designation"}
+
+FILE_FORMATS = {".csv": "CSV", ".json": "JSON", ".ndjson": "NDJSON", ".jsonl": "NDJSON"}
+TRUE_VALUES = {"true", "1", "yes", "y", "sim", "oui", "x"}
+
+AMBIGUOUS = object()
+
+
+class RowError(ValueError):
+    pass
+
+
+# -- readers: text stream → one dict per record --------------------------------
+
+def _read_csv(stream):
+    header = stream.readline()
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    columns = [c.strip() for c in next(csv.reader([header], dialect), [])]
+    for row in csv.reader(stream, dialect):
+        # empty cells are left out rather than stored as ""
+        yield {col: value for col, value in zip(columns, row) if value != ""}
+
+
+def _read_ndjson(stream):
+    for line in stream:
+        if line.strip():
+            yield json_util.loads(line)
+
+
+def _read_json(stream):
+    """Elements of a top-level JSON array (or a single object), decoded incrementally"""
+    decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+    buffer, pos, eof = stream.read(READ_SIZE).lstrip(), 0, False
+    if buffer.startswith("{"):
+        yield decoder.decode(buffer + stream.read())
+        return
+    if not buffer.startswith("["):
+        raise ValueError("JSON file must contain an array of documents")
+    pos = 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            doc, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = stream.read(READ_SIZE)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield doc
+        pos = end
+        if pos > READ_SIZE:
+            buffer, pos = buffer[pos:], 0
+
+
+READERS = {"CSV": _read_csv, "NDJSON": _read_ndjson, "JSON": _read_json}
+
+
+def file_format(name: str) -> str:
+    return FILE_FORMATS.get(Path(name).suffix.lower(), "CSV")
+
+
+# -- references ------------------------------------------------------------------
+
+def reference_targets(fields, references: dict = None) -> dict:
+    """Reference field → (collection, lookup fields) for the `*_id` fields of an import"""
+    collections = set(get_db().list_collection_names())
+    targets = {}
+    for field in fields:
+        if not field.endswith("_id") or field == "_id":
+            continue
+        if references and field in references:
+            target = references[field]
+            targets[field] = (target, REFERENCES.get(field, (target, ["name"]))[1])
+        elif field in REFERENCES:
+            targets[field] = REFERENCES[field]
+        elif field[:-3] in collections or f"{field[:-3]}s" in collections:
+            target = field[:-3] if field[:-3] in collections else f"{field[:-3]}s"
+            targets[field] = (target, ["name"])
+    return targets
+
+
+def load_lookup(collection_name: str, keys: list) -> dict:
+    """str(_id) / name / code → _id for a whole collection, in one projected find"""
+    lookup = {}
+    projection = {key: 1 for key in keys}
+    for doc in get_db()[collection_name].find({}, projection):
+        lookup[str(doc["_id"])] = doc["_id"]
+        for key in keys:
+            value = doc.get(key)
+            if value not in (None, ""):
+                value = str(value).strip().casefold()
+                lookup[value] = AMBIGUOUS if lookup.get(value, doc["_id"]) != doc["_id"] else doc["_id"]
+    return lookup
+
+
+def resolve(value, lookup: dict, field: str):
+    text = str(value).strip()
+    target = lookup.get(text)
+    if target is None:
+        target = lookup.get(text.casefold())
+    if target is AMBIGUOUS:
+        raise RowError(f"{field}: '{text}' corresponde a vários documentos, use o _id")
+    if target is None:
+        raise RowError(f"{field}: '{text}' não encontrado")
+    return target
+
+
+# -- conversion --------------------------------------------------------------------
+
+def convert(value, kind: str):
+    """Text from a CSV cell → the field's BSON type (other values are kept)"""
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if kind == "double":
+        if "," in value and "." not in value:
+            value = value.replace(",", ".")  # decimal comma
+        return float(value)
+    if kind in ("long", "int"):
+        return int(float(value))
+    if kind == "bool":
+        return value.casefold() in TRUE_VALUES
+    if kind == "date":
+        return datetime.fromisoformat(value)
+    if kind == "objectId":
+        return ObjectId(value)
+    return value
+
+
+def prepare(record: dict, schema: dict, targets: dict, lookups: dict) -> dict:
+    doc = {}
+    for field, value in record.items():
+        if field in targets and value not in (None, ""):
+            doc[field] = resolve(value, lookups[targets[field][0]], field)
+            continue
+        try:
+            doc[field] = convert(value, schema.get(field, "string"))
+        except (ValueError, TypeError):
+            raise RowError(f"{field}: '{value}' não é do tipo {schema.get(field)}")
+    return doc
+
+
+# -- import ------------------------------------------------------------------------
+
+def _chunks(records, size: int):
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+def _remember(lookup: dict, keys: list, docs: list):
+    """Add documents of the file itself to a lookup (rows referencing earlier rows)"""
+    for doc in docs:
+        if "_id" not in doc:
+            continue
+        lookup[str(doc["_id"])] = doc["_id"]
+        for k in keys:
+            if doc.get(k) not in (None, ""):
+                lookup.setdefault(str(doc[k]).strip().casefold(), doc["_id"])
+
+
+def import_file(file, collection_name: str, fmt: str = None, mode: str = "insert", key: str = None,
+                dry_run: bool = True, chunk_size: int = CHUNK_SIZE, references: dict = None,
+                on_chunk=None) -> dict:
+    """
+    Stream a CSV / JSON / NDJSON file into a collection.
+
+    mode "insert" adds every valid row (insert_many, unordered), "upsert"
+    updates the document with the same `key` value or inserts it. With
+    dry_run nothing is written: rows are parsed and resolved, and upserts
+    count how many keys already exist. on_chunk(stats) is called after every
+    chunk; the returned report has totals, row errors and per-chunk timings.
+    """
+    if mode == "upsert" and not key:
+        raise ValueError("upsert needs a key field")
+    fmt = fmt or file_format(getattr(file, "name", ""))
+    schema = collection_schema(collection_name)
+    collection = get_db()[collection_name]
+
+    # binary uploads are decoded as UTF-8 (BOM allowed); detached at the end so the upload stays open
+    stream = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        report = _import_stream(READERS[fmt](stream), collection, collection_name, schema, mode, key,
+                                dry_run, chunk_size, references, on_chunk)
+    finally:
+        if stream is not file:
+            stream.detach()
+    if not dry_run and (report["inserted"] or report["updated"]):
+        invalidate(collection_name)
+    return report
+
+
+def _import_stream(records, collection, collection_name, schema, mode, key,
+                   dry_run, chunk_size, references, on_chunk) -> dict:
+    report = {"rows": 0, "valid": 0, "inserted": 0, "updated": 0, "failed": 0,
+              "errors": [], "chunks": [], "dry_run": dry_run}
+    targets, lookups, seen = {}, {}, set()
+    row_number = 0
+    started = time.perf_counter()
+
+    for number, chunk in enumerate(_chunks(records, chunk_size), 1):
+        t0 = time.perf_counter()
+        # reference maps are loaded once, when a reference field first shows up
+        fields = {f for record in chunk for f in record} - seen
+        if fields:
+            seen |= fields
+            targets.update(reference_targets(fields, references))
+            for target, keys in targets.values():
+                if target not in lookups:
+                    lookups[target] = load_lookup(target, keys)
+
+        docs, rows = [], []
+        for record in chunk:
+            row_number += 1
+            try:
+                doc = prepare(record, schema, targets, lookups)
+                if mode == "upsert" and doc.get(key) in (None, ""):
+                    raise RowError(f"{key}: chave de upsert vazia")
+                docs.append(doc)
+                rows.append(row_number)
+            except RowError as e:
+                report["failed"] += 1
+                if len(report["errors"]) < MAX_ERRORS:
+                    report["errors"].append({"linha": row_number, "erro": str(e)})
+        report["rows"] += len(chunk)
+        report["valid"] += len(docs)
+
+        # ancestry ids (product_id, family_id, ...) come from each row's parent
+        if collection_name in ANCESTRY and docs:
+            parent_field = ANCESTRY[collection_name][0]
+            fill(collection_name, [d for d in docs if parent_field in d])
+
+        inserted = updated = failed = 0
+        if docs and mode == "upsert":
+            if dry_run:
+                updated = collection.count_documents({key: {"$in": [d[key] for d in docs]}})
+                inserted = len(docs) - updated
+            else:
+                inserted, updated, failed = _write_upserts(collection, docs, key, report, rows)
+                if updated and collection_name in ANCESTRY:
+                    # updated documents may have moved: pass their ancestry down
+                    fields = {f for d in docs for f in d}
+                    if fields & set(ANCESTRY[collection_name]):
+                        ids = [d["_id"] for d in collection.find({key: {"$in": [d[key] for d in docs]}}, {"_id": 1})]
+                        refresh(collection_name, ids, fields)
+        elif docs:
+            for doc in docs:
+                doc.setdefault("_id", ObjectId())
+            inserted, failed = (len(docs), 0) if dry_run else _write_inserts(collection, docs, report, rows)
+
+        if collection_name in lookups and docs:
+            keys = next(k for t, k in targets.values() if t == collection_name)
+            if mode == "upsert" and not dry_run:
+                docs = list(collection.find({key: {"$in": [d[key] for d in docs]}}, {k: 1 for k in keys}))
+            elif mode == "upsert":
+                docs = [{**doc, "_id": ObjectId()} for doc in docs]  # placeholder ids
+            _remember(lookups[collection_name], keys, docs)
+
+        report["inserted"] += inserted
+        report["updated"] += updated
+        report["failed"] += failed
+        seconds = time.perf_counter() - t0
+        stats = {"bloco": number, "linhas": len(chunk), "inseridos": inserted, "atualizados": updated,
+                 "erros": len(chunk) - len(rows) + failed, "segundos": round(seconds, 3),
+                 "linhas/s": round(len(chunk) / seconds) if seconds else None}
+        report["chunks"].append(stats)
+        if on_chunk:
+            on_chunk(stats)
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def _log_write_errors(error: BulkWriteError, report: dict, rows: list):
+    for err in error.details.get("writeErrors", []):
+        if len(report["errors"]) < MAX_ERRORS:
+            report["errors"].append({"linha": rows[err["index"]], "erro": err.get("errmsg", "")[:200]})
+
+
+def _write_inserts(collection, docs: list, report: dict, rows: list) -> tuple:
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids), 0
+    except BulkWriteError as e:
+        _log_write_errors(e, report, rows)
+        return e.details.get("nInserted", 0), len(e.details.get("writeErrors", []))
+
+
+def _write_upserts(collection, docs: list, key: str, report: dict, rows: list) -> tuple:
+    ops = [UpdateOne({key: doc[key]}, {"$set": {f: v for f, v in doc.items() if f != "_id"}}, upsert=True)
+           for doc in docs]
+    try:
+        result = collection.bulk_write(ops, ordered=False)
+        return result.upserted_count, result.matched_count, 0
+    except BulkWriteError as e:
+        _log_write_errors(e, report, rows)
+        details = e.details
+        return details.get("nUpserted", 0), details.get("nMatched", 0), len(details.get("writeErrors", []))
@@ -0,0 +1,276 @@
+# utils/export.py
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import streamlit as st
+from bson import json_util
+from utils.mongo import get_db, get_setting
+from utils.frames import BATCH_SIZE, _as_text, iter_tables
+
+try:
+    import xlsxwriter
+except ImportError:  # optional: Excel is left out of FORMATS
+    xlsxwriter = None
+
+# Exports are written one batch at a time to a file under EXPORT_DIR, so
+# memory stays at one batch whatever the size of the collection. Files up to
+# DOWNLOAD_LIMIT_MB are offered as a download, larger ones stay on the server
+# (Streamlit sends a download in a single websocket message).
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "NDJSON": (".ndjson", "application/x-ndjson"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+if xlsxwriter is None:
+    del FORMATS["Excel"]
+
+EXCEL_ROWS = 1_048_575  # data rows per sheet, below the header
+DOWNLOAD_LIMIT_MB = 200
+KEEP_HOURS = 24
+
+
+class Export(NamedTuple):
+    """A finished export file; `skipped` values did not fit their column type and were left empty"""
+    path: Path
+    skipped: int = 0
+
+
+def export_dir() -> Path:
+    path = Path(get_setting("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "spacial_exports")))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _new_path(name: str, fmt: str) -> Path:
+    """Fresh export file, removing exports older than KEEP_HOURS"""
+    folder = export_dir()
+    cutoff = time.time() - KEEP_HOURS * 3600
+    for old in folder.iterdir():
+        if old.is_file() and old.stat().st_mtime < cutoff:
+            old.unlink(missing_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    fd, path = tempfile.mkstemp(prefix=f"{name}_{stamp}_", suffix=FORMATS[fmt][0], dir=folder)
+    os.close(fd)
+    return Path(path)
+
+
+# -- writers: write(table) per batch, close() once ------------------------------
+
+class CsvWriter:
+    def __init__(self, path: Path):
+        self.file = path.open("wb")
+        self.header = True
+
+    def write(self, table: pa.Table):
+        pa_csv.write_csv(table, self.file, pa_csv.WriteOptions(include_header=self.header))
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class NdjsonWriter:
+    def __init__(self, path: Path):
+        self.file = path.open("w", encoding="utf-8")
+
+    def write(self, table: pa.Table):
+        self.file.writelines(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in table.to_pylist())
+
+    def close(self):
+        self.file.close()
+
+
+CAST_ERRORS = (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError)
+
+
+class ParquetWriter:
+    """
+    The first batch fixes the file schema; later batches are cast to it (a
+    column that came back as text is cast value by value, and only the
+    values that do not fit are written as null and counted in `skipped`)
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.writer = None
+        self.skipped = 0
+
+    def _cast_values(self, column, typ):
+        values = []
+        for value in column:
+            try:
+                values.append(value.cast(typ).as_py())
+            except CAST_ERRORS:
+                values.append(None)
+                self.skipped += value.is_valid
+        return pa.array(values, typ)
+
+    def _conform(self, table: pa.Table) -> pa.Table:
+        columns = []
+        for field in self.writer.schema:
+            column = table[field.name] if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+            if column.type != field.type:
+                try:
+                    column = pc.cast(column, field.type)
+                except CAST_ERRORS:
+                    column = self._cast_values(column, field.type)
+            columns.append(column)
+        return pa.table(columns, schema=self.writer.schema)
+
+    def write(self, table: pa.Table):
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(self._conform(table))
+
+    def close(self):
+        if self.writer is None:
+            pq.write_table(pa.table({}), self.path)
+        else:
+            self.writer.close()
+
+
+class ExcelWriter:
+    """xlsxwriter in constant-memory mode: rows are flushed as they are written"""
+
+    def __init__(self, path: Path):
+        self.book = xlsxwriter.Workbook(str(path), {
+            "constant_memory": True, "nan_inf_to_errors": True, "remove_timezone": True,
+            "strings_to_formulas": False, "strings_to_urls": False,
+        })
+        self.date_format = self.book.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        self.sheet = None
+        self.row = 0
+
+    def _new_sheet(self, table: pa.Table):
+        self.sheet = self.book.add_worksheet()
+        self.sheet.write_row(0, 0, table.column_names)
+        for col, typ in enumerate(table.schema.types):
+            if pa.types.is_timestamp(typ) or pa.types.is_date(typ):
+                self.sheet.set_column(col, col, 19, self.date_format)
+        self.row = 1
+
+    @staticmethod
+    def _cell_values(column) -> list:
+        typ = column.type
+        if (pa.types.is_integer(typ) or pa.types.is_floating(typ) or pa.types.is_boolean(typ)
+                or pa.types.is_string(typ) or pa.types.is_timestamp(typ) or pa.types.is_date(typ)):
+            return column.to_pylist()
+        return _as_text(column.to_pylist()).to_pylist()
+
+    def write(self, table: pa.Table):
+        if self.sheet is None:
+            self._new_sheet(table)
+        columns = [self._cell_values(column) for column in table.columns]
+        for values in zip(*columns):
+            if self.row > EXCEL_ROWS:
+                self._new_sheet(table)
+            self.sheet.write_row(self.row, 0, values)
+            self.row += 1
+
+    def close(self):
+        if self.sheet is None:
+            self.book.add_worksheet()
+        self.book.close()
+
+
+WRITERS = {"CSV": CsvWriter, "NDJSON": NdjsonWriter, "Parquet": ParquetWriter, "Excel": ExcelWriter}
+
+
+def write_tables(tables, fmt: str, name: str, total: int = None, progress=None) -> Export:
+    """Stream Arrow tables into a new export file; progress(rows done, total) after each batch"""
+    path = _new_path(name, fmt)
+    writer = WRITERS[fmt](path)
+    done = 0
+    try:
+        for table in tables:
+            writer.write(table)
+            done += table.num_rows
+            if progress:
+                progress(done, total)
+        writer.close()
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    return Export(path, getattr(writer, "skipped", 0))
+
+
+def export_collection(collection_name: str, fmt: str, query: dict = None,
+                      sort: list = None, progress=None) -> Export:
+    """
+    Export a collection (or the documents matching `query`) straight from the
+    cursor. NDJSON keeps the documents as extended JSON, the other formats
+    use the flat column layout of the admin editor.
+    """
+    collection = get_db()[collection_name]
+    total = collection.count_documents(query) if query else collection.estimated_document_count()
+    sort = sort or [("_id", 1)]
+    if fmt != "NDJSON":
+        return write_tables(iter_tables(collection_name, query, sort=sort), fmt, collection_name, total, progress)
+
+    path = _new_path(collection_name, fmt)
+    try:
+        with path.open("w", encoding="utf-8") as f:
+            cursor = collection.find(query or {}).sort(sort).batch_size(BATCH_SIZE)
+            for done, doc in enumerate(cursor, 1):
+                f.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n")
+                if progress and done % BATCH_SIZE == 0:
+                    progress(done, total)
+        if progress:
+            progress(total, total)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    return Export(path)
+
+
+def frame_tables(df, batch_size: int = BATCH_SIZE):
+    """A DataFrame as Arrow tables of `batch_size` rows (mixed object columns as text)"""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = [c for c in df.columns if df[c].dtype == object]
+        table = pa.Table.from_pandas(df.astype({c: str for c in mixed}), preserve_index=False)
+    for start in range(0, table.num_rows, batch_size):
+        yield table.slice(start, batch_size)
+
+
+def export_frame(df, fmt: str, name: str, progress=None) -> Export:
+    return write_tables(frame_tables(df), fmt, name, len(df), progress)
+
+
+# -- Streamlit helpers -----------------------------------------------------------
+
+def progress_bar(text: str):
+    """st.progress as a progress(rows done, total) callback"""
+    bar = st.progress(0.0, text=text)
+
+    def update(done: int, total: int = None):
+        bar.progress(min(done / total, 1.0) if total else 1.0,
+                     text=f"{text} {done:,}/{total:,}" if total else f"{text} {done:,}")
+    return update
+
+
+def offer_download(export: Export, label: str, key: str):
+    """Download button for a finished export, or its server path when too large to send"""
+    path = Path(export.path)
+    if not path.exists():
+        return
+    if export.skipped:
+        st.warning(f"⚠️ {export.skipped:,} values did not fit their column type and were left empty")
+    size = path.stat().st_size
+    if size > DOWNLOAD_LIMIT_MB * 2**20:
+        st.info(f"📁 {path} ({size / 2**20:,.0f} MB)")
+        return
+    mime = next((m for ext, m in FORMATS.values() if ext == path.suffix), "application/octet-stream")
+    with path.open("rb") as f:
+        st.download_button(label, f, file_name=path.name, mime=mime, key=key)
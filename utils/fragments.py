@@ -0,0 +1,14 @@
+# utils/fragments.py
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Heavy page sections are @st.fragment functions: their widgets rerun only the
+# section. st.rerun(scope="fragment") is refused when the fragment is being
+# drawn by a full run of the script, hence this helper after a write.
+
+
+def rerun_fragment():
+    """Rerun the calling fragment (during a fragment rerun) or else the whole app"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    st.rerun(scope="fragment" if ctx and ctx.fragment_ids_this_run else "app")
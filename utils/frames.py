@@ -0,0 +1,227 @@
+# utils/frames.py
+
+from itertools import islice
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from bson import ObjectId, json_util
+from utils.mongo import get_db
+from utils.repository import cached_read, product_query, register_dependent
+
+try:
+    from pymongoarrow.api import Schema, aggregate_arrow_all
+except ImportError:  # optional: the batch decoder below does the same, slower
+    aggregate_arrow_all = None
+
+BATCH_SIZE = 5000
+SAMPLE_SIZE = 200
+
+# Schema catalogue: collection → field → BSON type (named as `$type` does).
+# Fields found by sampling are appended, the catalogue wins on conflicts.
+SCHEMAS = {
+    "users": {"_id": "objectId", "username": "string", "role": "string",
+              "active": "bool", "preferred_language": "string"},
+    "families": {"_id": "objectId", "name": "string"},
+    "ateliers": {"_id": "objectId", "name": "string"},
+    "workstations": {"_id": "objectId", "name": "string", "atelier_id": "objectId"},
+    "products": {"_id": "objectId", "code": "string", "name": "string", "description": "string",
+                 "family_id": "objectId", "image_path": "string"},
+    "routes": {"_id": "objectId", "name": "string", "product_id": "objectId",
+               "workstation_id": "objectId"},
+    "operations": {"_id": "objectId", "route_id": "objectId", "step_number": "long", "name": "string",
+                   "description": "string", "image_path": "string", "annotation_path": "string"},
+    "characteristics": {"_id": "objectId", "operation_id": "objectId", "name": "string",
+                        "designation": "string", "unit": "string", "nominal": "double",
+                        "tol_min": "double", "tol_max": "double", "active": "bool",
+                        "image_path": "string", "annotation_path": "string"},
+}
+
+ARROW_TYPES = {
+    "objectId": pa.string(), "string": pa.string(), "decimal": pa.string(),
+    "double": pa.float64(), "int": pa.int64(), "long": pa.int64(),
+    "bool": pa.bool_(), "date": pa.timestamp("ms"),
+    "object": pa.string(), "array": pa.string(),
+}
+SERVER_STRINGS = {"objectId", "decimal"}  # converted with $toString in the pipeline
+NESTED = {"object", "array"}              # shown as extended JSON text
+
+
+def bson_type(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    name = type(value).__name__
+    return {"ObjectId": "objectId", "datetime": "date", "Decimal128": "decimal"}.get(name, "string")
+
+
+def infer_schema(docs) -> dict:
+    """Field → BSON type over sample documents (mixed types fall back to text)"""
+    seen = {}
+    for doc in docs:
+        for field, value in doc.items():
+            seen.setdefault(field, set()).add(bson_type(value))
+    schema = {}
+    for field, types in seen.items():
+        types.discard("null")
+        if len(types) == 1:
+            schema[field] = types.pop()
+        elif types and types <= {"long", "double"}:
+            schema[field] = "double"
+        else:
+            schema[field] = "object" if types & NESTED else "string"
+    return schema
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def collection_schema(collection_name: str) -> dict:
+    """Catalogue schema plus fields found in a $sample of the collection"""
+    sample = get_db()[collection_name].aggregate([{"$sample": {"size": SAMPLE_SIZE}}])
+    schema = {"_id": "objectId", **SCHEMAS.get(collection_name, {})}
+    for field, kind in infer_schema(sample).items():
+        schema.setdefault(field, kind)
+    return schema
+
+
+def _projection(schema: dict) -> dict:
+    projection = {"_id": 0}
+    for field, kind in schema.items():
+        projection[field] = {"$toString": f"${field}"} if kind in SERVER_STRINGS else 1
+    return projection
+
+
+def _as_text(values) -> pa.Array:
+    return pa.array([
+        None if v is None else v if isinstance(v, str)
+        else json_util.dumps(v) if isinstance(v, (dict, list)) else str(v)
+        for v in values
+    ], pa.string())
+
+
+def _batch_table(batch: list, arrow_schema: pa.Schema, text: set) -> pa.Table:
+    """
+    One cursor batch → Arrow table. `text` fields (nested values, client-side
+    ObjectIds) are converted column by column, as are types the schema missed.
+    """
+    table = None
+    scalars = pa.schema([field for field in arrow_schema if field.name not in text])
+    if len(scalars):
+        try:
+            table = pa.Table.from_pylist(batch, schema=scalars)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    if table is not None and not text:
+        return table
+
+    columns = []
+    for field in arrow_schema:
+        if table is not None and field.name not in text:
+            columns.append(table[field.name])
+            continue
+        values = [doc.get(field.name) for doc in batch]
+        try:
+            columns.append(_as_text(values) if field.name in text else pa.array(values, field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns.append(_as_text(values))
+    return pa.table(columns, names=arrow_schema.names)
+
+
+def _concat(tables: list, arrow_schema: pa.Schema) -> pa.Table:
+    """Concatenate batches, casting columns that some batch had to keep as text"""
+    if not tables:
+        return arrow_schema.empty_table()
+    text = {name for t in tables for name, typ in zip(t.column_names, t.schema.types)
+            if typ == pa.string() and arrow_schema.field(name).type != pa.string()}
+    if text:
+        target = pa.schema([pa.field(f.name, pa.string()) if f.name in text else f for f in arrow_schema])
+        tables = [t.cast(target) for t in tables]
+    return pa.concat_tables(tables)
+
+
+def _plan(collection_name: str, query: dict, fields: list, sort: list,
+          skip: int, limit: int, schema: dict) -> tuple:
+    """(schema, Arrow schema, aggregation pipeline) behind a frame read"""
+    schema = schema or collection_schema(collection_name)
+    if fields:
+        schema = {f: schema.get(f, "string") for f in fields}
+    arrow_schema = pa.schema([(f, ARROW_TYPES.get(kind, pa.string())) for f, kind in schema.items()])
+
+    pipeline = [{"$match": query or {}}]
+    if sort:
+        pipeline.append({"$sort": dict(sort)})
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": _projection(schema)})
+    return schema, arrow_schema, pipeline
+
+
+def iter_tables(collection_name: str, query: dict = None, fields: list = None, sort: list = None,
+                skip: int = 0, limit: int = 0, schema: dict = None, batch_size: int = BATCH_SIZE):
+    """
+    Yield the result of a query as Arrow tables of at most `batch_size` rows,
+    one cursor batch at a time (memory stays at one batch). A field may come
+    back as text in some batches when its values do not fit the schema.
+    """
+    schema, arrow_schema, pipeline = _plan(collection_name, query, fields, sort, skip, limit, schema)
+    cursor = get_db()[collection_name].aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+    nested = {f for f, kind in schema.items() if kind in NESTED}
+    while batch := list(islice(cursor, batch_size)):
+        yield _batch_table(batch, arrow_schema, nested)
+
+
+def find_frame(collection_name: str, query: dict = None, fields: list = None, sort: list = None,
+               skip: int = 0, limit: int = 0, schema: dict = None,
+               batch_size: int = BATCH_SIZE) -> pd.DataFrame:
+    """
+    Query a collection straight into an Arrow-backed DataFrame.
+
+    ObjectIds (and decimals) are turned into strings by the server, the
+    cursor is decoded into Arrow one batch at a time and the columns keep
+    their types (missing values are <NA>). Uses pymongoarrow when it is
+    installed and the schema has no nested fields.
+    """
+    schema, arrow_schema, pipeline = _plan(collection_name, query, fields, sort, skip, limit, schema)
+    if aggregate_arrow_all and not any(kind in NESTED for kind in schema.values()):
+        table = aggregate_arrow_all(get_db()[collection_name], pipeline,
+                                    schema=Schema(dict(zip(arrow_schema.names, arrow_schema.types))))
+    else:
+        tables = list(iter_tables(collection_name, query, fields, sort, skip, limit, schema, batch_size))
+        table = _concat(tables, arrow_schema)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def docs_frame(docs: list, schema: dict = None) -> pd.DataFrame:
+    """Arrow-backed DataFrame from documents already in memory"""
+    if not docs:
+        return pd.DataFrame()
+    schema = dict(schema or {})
+    for field, kind in infer_schema(docs[:SAMPLE_SIZE]).items():
+        schema.setdefault(field, kind)
+    arrow_schema = pa.schema([(f, ARROW_TYPES.get(kind, pa.string())) for f, kind in schema.items()])
+    text = {f for f, kind in schema.items() if kind in NESTED | SERVER_STRINGS}
+    tables = [_batch_table(docs[i:i + BATCH_SIZE], arrow_schema, text)
+              for i in range(0, len(docs), BATCH_SIZE)]
+    return _concat(tables, arrow_schema).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+# Cached editor tables (cleared with the repository's list_* reads)
+
+@cached_read
+def product_frame(family_id: Optional[ObjectId] = None,
+                  product_id: Optional[ObjectId] = None,
+                  atelier_id: Optional[ObjectId] = None) -> pd.DataFrame:
+    return find_frame("products", product_query(family_id, product_id, atelier_id), sort=[("code", 1)])
+
+
+register_dependent("products", product_frame)
@@ -0,0 +1,101 @@
+# utils/kpis.py
+
+import streamlit as st
+from utils.mongo import get_db
+
+# Seconds a computed KPI snapshot stays valid
+KPI_TTL = 60
+
+# Statuses counted as "active" (EN / PT)
+ACTIVE_STATUSES = ["Active", "Ativo"]
+
+
+def _kpi_pipeline():
+    """
+    One aggregation, started on `ateliers`, that pulls pre-grouped summaries
+    of the other collections with $unionWith and shapes them with $facet.
+    Only small summary documents ever leave the server.
+    """
+    return [
+        # Ateliers are few and feed the layout/capacity charts
+        {"$project": {"_id": 0, "_c": "atelier", "name": 1, "capacity": 1, "status": 1}},
+        {"$unionWith": {"coll": "workstations", "pipeline": [
+            {"$group": {"_id": {"$ifNull": ["$status", "Unknown"]}, "n": {"$sum": 1}}},
+            {"$project": {"_id": 0, "_c": "workstation_status", "status": "$_id", "n": 1}},
+        ]}},
+        {"$unionWith": {"coll": "routes", "pipeline": [
+            {"$count": "n"},
+            {"$set": {"_c": "routes"}},
+        ]}},
+        {"$unionWith": {"coll": "products", "pipeline": [
+            {"$count": "n"},
+            {"$set": {"_c": "products"}},
+        ]}},
+        # Quality comes from the materialized daily rollups, not raw measurements
+        {"$unionWith": {"coll": "daily_rollups", "pipeline": [
+            {"$group": {
+                "_id": None,
+                "total": {"$sum": "$count"},
+                "out_of_spec": {"$sum": "$oos_count"},
+            }},
+            {"$project": {"_id": 0, "_c": "measurements", "total": 1, "out_of_spec": 1}},
+        ]}},
+        {"$facet": {
+            "ateliers": [
+                {"$match": {"_c": "atelier"}},
+                {"$project": {"_c": 0}},
+            ],
+            "atelier_totals": [
+                {"$match": {"_c": "atelier"}},
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "capacity": {"$sum": {"$ifNull": ["$capacity", 0]}},
+                }},
+            ],
+            "workstation_status": [
+                {"$match": {"_c": "workstation_status"}},
+                {"$project": {"_c": 0}},
+            ],
+            "counts": [
+                {"$match": {"_c": {"$in": ["routes", "products"]}}},
+            ],
+            "measurements": [
+                {"$match": {"_c": "measurements"}},
+            ],
+        }},
+    ]
+
+
+@st.cache_data(ttl=KPI_TTL, show_spinner=False)
+def get_dashboard_kpis() -> dict:
+    """
+    Compute every dashboard KPI in a single round trip.
+    Returns a plain dict (cached for KPI_TTL seconds).
+    """
+    db = get_db()
+    result = next(db.ateliers.aggregate(_kpi_pipeline()), {})
+
+    atelier_totals = (result.get("atelier_totals") or [{}])[0]
+    counts = {c["_c"]: c.get("n", 0) for c in result.get("counts", [])}
+    status_counts = {s["status"]: s["n"] for s in result.get("workstation_status", [])}
+    measurements = (result.get("measurements") or [{}])[0]
+
+    total_meas = measurements.get("total", 0)
+    out_of_spec = measurements.get("out_of_spec", 0)
+    quality_rate = (1 - out_of_spec / total_meas) * 100 if total_meas else None
+
+    return {
+        "ateliers": result.get("ateliers", []),
+        "counts": {
+            "ateliers": atelier_totals.get("count", 0),
+            "workstations": sum(status_counts.values()),
+            "routes": counts.get("routes", 0),
+            "products": counts.get("products", 0),
+        },
+        "total_capacity": atelier_totals.get("capacity", 0),
+        "workstation_status": status_counts,
+        "active_workstations": sum(n for s, n in status_counts.items() if s in ACTIVE_STATUSES),
+        "measurements": {"total": total_meas, "out_of_spec": out_of_spec},
+        "quality_rate": quality_rate,
+    }
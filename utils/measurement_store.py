@@ -0,0 +1,184 @@
+# utils/measurement_store.py
+
+from datetime import datetime, timezone
+from pymongo.errors import BulkWriteError
+from utils.mongo import get_db
+from utils.rollups import ROLLUP_COLLECTION, rollup_update
+from utils.repository import invalidate
+from utils.alerts import defer as defer_alerts, evaluate as evaluate_alerts
+
+# Fields returned by windowed queries (no need to ship `meta` to the page)
+MEASUREMENT_PROJECTION = {
+    "_id": 0,
+    "timestamp": 1,
+    "value": 1,
+    "serial_number": 1,
+    "operator": 1,
+    "out_of_spec": 1,
+}
+
+
+def spec_limits(characteristic: dict):
+    """Return (lsl, usl) from nominal and tolerances, or (None, None)"""
+    nominal = characteristic.get("nominal")
+    if nominal is None:
+        return None, None
+    return (
+        nominal + (characteristic.get("tol_min") or 0.0),
+        nominal + (characteristic.get("tol_max") or 0.0)
+    )
+
+
+def build_meta(characteristic: dict, workstation_id=None) -> dict:
+    """
+    Resolve the ids a measurement belongs to, starting from its characteristic
+    (its ancestry fields; the hierarchy is only walked for documents without them)
+    """
+    db = get_db()
+    meta = {
+        "characteristic_id": characteristic["_id"],
+        "operation_id": characteristic.get("operation_id"),
+        "route_id": characteristic.get("route_id"),
+        "product_id": characteristic.get("product_id"),
+        "family_id": characteristic.get("family_id"),
+        "workstation_id": workstation_id,
+        "atelier_id": None,
+    }
+
+    if meta["route_id"] is None and meta["operation_id"]:
+        op = db.operations.find_one({"_id": meta["operation_id"]}, {"route_id": 1})
+        meta["route_id"] = op.get("route_id") if op else None
+    if meta["route_id"] and (meta["product_id"] is None or meta["workstation_id"] is None):
+        route = db.routes.find_one({"_id": meta["route_id"]},
+                                   {"product_id": 1, "family_id": 1, "workstation_id": 1})
+        if route:
+            meta["product_id"] = meta["product_id"] or route.get("product_id")
+            meta["family_id"] = meta["family_id"] or route.get("family_id")
+            meta["workstation_id"] = meta["workstation_id"] or route.get("workstation_id")
+
+    if meta["workstation_id"]:
+        ws = db.workstations.find_one({"_id": meta["workstation_id"]}, {"atelier_id": 1})
+        if ws:
+            meta["atelier_id"] = ws.get("atelier_id")
+    return meta
+
+
+def build_measurement(characteristic: dict, value: float, serial_number: str = "",
+                      operator: str = "", workstation_id=None, timestamp=None, meta=None) -> dict:
+    """Measurement document with its spec limits snapshotted (meta resolved unless given)"""
+    lsl, usl = spec_limits(characteristic)
+    return {
+        "timestamp": timestamp or datetime.now(timezone.utc),
+        "meta": meta or build_meta(characteristic, workstation_id),
+        "value": value,
+        "unit": characteristic.get("unit", ""),
+        "serial_number": serial_number,
+        "operator": operator,
+        "lsl": lsl,
+        "usl": usl,
+        "out_of_spec": lsl is not None and not (lsl <= value <= usl),
+    }
+
+
+def stored_ids(docs: list) -> set:
+    """Ids of the built readings that are already in the collection"""
+    if not docs:
+        return set()
+    return set(get_db().measurements.distinct("_id", {
+        "_id": {"$in": [d["_id"] for d in docs]},
+        "timestamp": {"$gte": min(d["timestamp"] for d in docs),
+                      "$lte": max(d["timestamp"] for d in docs)},
+    }))
+
+
+def insert_measurements(docs: list, progress: dict = None):
+    """
+    Insert built readings into the time-series collection, fold them into
+    the daily rollups (one insert_many and one rollup bulk_write per batch)
+    and run the alert rules over them.
+
+    A caller retrying a failed batch passes the same documents and the same
+    `progress` dict: completed steps are skipped, the insert leaves out what
+    a failed attempt stored and the rollups resume after the last applied
+    update (after a network error mid-bulk they are re-sent; the rollup
+    compaction corrects any double count).
+    """
+    if not docs:
+        return
+    progress = {} if progress is None else progress
+    db = get_db()
+    if not progress.get("inserted"):
+        pending = docs
+        if progress.get("attempted"):
+            stored = stored_ids(docs)
+            pending = [d for d in docs if d["_id"] not in stored]
+        progress["attempted"] = True
+        if pending:
+            db.measurements.insert_many(pending, ordered=False)
+        progress["inserted"] = True
+
+    start = progress.get("rolled", 0)
+    if start < len(docs):
+        try:
+            db[ROLLUP_COLLECTION].bulk_write([
+                rollup_update(d["value"], d["timestamp"], d["meta"], d["lsl"], d["usl"], d["out_of_spec"])
+                for d in docs[start:]
+            ])
+        except BulkWriteError as e:
+            # ordered: the updates before the first error were applied
+            progress["rolled"] = start + e.details["writeErrors"][0]["index"]
+            raise
+        progress["rolled"] = len(docs)
+        invalidate("measurements")
+
+    if not progress.get("evaluated"):
+        done = progress.setdefault("alerts_done", set())
+        try:
+            evaluate_alerts([d for d in docs if d["meta"]["characteristic_id"] not in done], done)
+        except Exception as e:
+            # readings are stored; a failed rule pass must not reject them, the
+            # readings it did not commit are replayed with the next batch
+            print(f"❌ Alert evaluation failed, readings deferred: {e}")
+            defer_alerts([d for d in docs if d["meta"]["characteristic_id"] not in done])
+        progress["evaluated"] = True
+
+
+def insert_measurement(characteristic: dict, value: float, serial_number: str = "",
+                       operator: str = "", workstation_id=None, timestamp=None):
+    """Insert one reading (see insert_measurements) and return its document"""
+    doc = build_measurement(characteristic, value, serial_number, operator, workstation_id, timestamp)
+    insert_measurements([doc])
+    return doc
+
+
+def measurement_query(meta_filters: dict = None, start=None, end=None) -> dict:
+    """Mongo filter on meta ids and a [start, end) time window"""
+    query = {}
+    for key, value in (meta_filters or {}).items():
+        if value is not None:
+            query[f"meta.{key}"] = value
+    window = {}
+    if start:
+        window["$gte"] = start
+    if end:
+        window["$lt"] = end
+    if window:
+        query["timestamp"] = window
+    return query
+
+
+def find_measurements(meta_filters: dict = None, start=None, end=None,
+                      skip: int = 0, limit: int = 100) -> list:
+    """One page of readings in a time window, newest first"""
+    cursor = (
+        get_db().measurements
+        .find(measurement_query(meta_filters, start, end), MEASUREMENT_PROJECTION)
+        .sort("timestamp", -1)
+        .skip(skip)
+        .limit(limit)
+    )
+    return list(cursor)
+
+
+def count_measurements(meta_filters: dict = None, start=None, end=None) -> int:
+    return get_db().measurements.count_documents(measurement_query(meta_filters, start, end))
@@ -1,57 +1,251 @@
 # utils/mongo.py
 
+import os
 import streamlit as st
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, UpdateMany, ASCENDING, DESCENDING
+from datetime import datetime, timezone
 from pathlib import Path
 import tempfile
 import base64
 import random
 import bcrypt
-from pymongo import MongoClient
 import certifi
+from utils.profiler import QueryCounter
 
 
+def get_setting(name: str, default=None):
+    """Environment variable first, then .streamlit/secrets.toml"""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
 
-# 1) Carrega URI diretamente
-MONGO_URI = st.secrets["MONGO_URI"]
 
-# 2) Se usa X.509, grava temporariamente o PEM no disco
-pem_text = st.secrets.get("MONGO_PEM")
-if pem_text:
-    # cria ficheiro temporário
+def _pem_path():
+    """Se usa X.509, grava temporariamente o PEM no disco"""
+    pem_text = get_setting("MONGO_PEM")
+    if not pem_text:
+        return None
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pem")
     tmp.write(pem_text.encode())
     tmp.flush()
-    PEM_PATH = tmp.name
-else:
-    PEM_PATH = None
-
-# 3) Conecta
-client = MongoClient(
-    MONGO_URI,
-    tls=bool(PEM_PATH),
-    tlsCertificateKeyFile=PEM_PATH,
-    tlsCAFile=certifi.where()
-)
+    return tmp.name
+
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """
+    Return the MongoClient, created on first use and shared by every session.
+    Nothing connects at import time. Commands are counted by utils.profiler.
+    MONGO_URI = "mongomock://" runs on an in-memory mongomock server
+    (benchmarks / headless runs; mongomock must be installed).
+    """
+    uri = get_setting("MONGO_URI")
+    if uri.startswith("mongomock://"):
+        import mongomock
+        return mongomock.MongoClient()
+
+    pem_path = _pem_path()
+    return MongoClient(
+        uri,
+        tls=bool(pem_path),
+        tlsCertificateKeyFile=pem_path,
+        tlsCAFile=certifi.where(),
+        event_listeners=[QueryCounter()]
+    )
+
 
 def get_db():
-    return client["spacial"]
+    return get_client()[get_setting("MONGO_DB", "spacial")]
 
 
-def get_client():
-    """Return the MongoClient."""
-    return client
+# Measurements are a time-series collection: one document per reading,
+# with the ids it belongs to grouped in the meta field
+MEASUREMENTS_TIMESERIES = {
+    "timeField": "timestamp",
+    "metaField": "meta",
+    "granularity": "seconds"
+}
+
+# Bump when the index manifest or collection layout changes:
+# the next startup re-applies the bootstrap once.
+SCHEMA_VERSION = 4
+META_COLLECTION = "_meta"
+
+# Process documents carry the ids of all their ancestors (parent first), so
+# any scope of the global filters is one equality on an indexed field.
+# utils/ancestry.py keeps them in sync on writes and re-parenting.
+# Measurements (and alerts) hold the same ids in `meta`; there meta.atelier_id
+# is the atelier of the workstation that measured.
+ANCESTRY = {
+    "families":        ["atelier_id"],
+    "products":        ["family_id", "atelier_id"],
+    "routes":          ["product_id", "family_id", "atelier_id"],
+    "operations":      ["route_id", "product_id", "family_id", "atelier_id"],
+    "characteristics": ["operation_id", "route_id", "product_id", "family_id", "atelier_id"],
+}
+# collection → the field its children reference it by
+ID_FIELDS = {
+    "ateliers": "atelier_id", "families": "family_id", "products": "product_id",
+    "routes": "route_id", "operations": "operation_id", "characteristics": "characteristic_id",
+}
 
+# Declarative index manifest: collection → indexes, applied with create_indexes
+INDEX_MANIFEST = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("preferred_language", ASCENDING)]),
+    ],
+    "families": [
+        IndexModel([("name", ASCENDING)], unique=True),
+        IndexModel([("atelier_id", ASCENDING)]),
+    ],
+    "ateliers": [
+        IndexModel([("name", ASCENDING)], unique=True),
+    ],
+    "workstations": [
+        IndexModel([("name", ASCENDING)], unique=True),
+        IndexModel([("atelier_id", ASCENDING)]),
+    ],
+    "products": [
+        IndexModel([("code", ASCENDING)], unique=True),
+        # scoped product lists, already sorted by code
+        IndexModel([("family_id", ASCENDING), ("code", ASCENDING)]),
+        IndexModel([("atelier_id", ASCENDING), ("code", ASCENDING)]),
+    ],
+    "routes": [
+        # also serves lookups by product_id alone (index prefix)
+        IndexModel([("product_id", ASCENDING), ("name", ASCENDING)], unique=True),
+        IndexModel([("family_id", ASCENDING), ("product_id", ASCENDING)]),
+        IndexModel([("atelier_id", ASCENDING), ("product_id", ASCENDING)]),
+    ],
+    "operations": [
+        # lookups by route_id, already sorted by step
+        IndexModel([("route_id", ASCENDING), ("step_number", ASCENDING)]),
+        IndexModel([("product_id", ASCENDING), ("route_id", ASCENDING), ("step_number", ASCENDING)]),
+        IndexModel([("family_id", ASCENDING), ("route_id", ASCENDING)]),
+        IndexModel([("atelier_id", ASCENDING), ("route_id", ASCENDING)]),
+    ],
+    "characteristics": [
+        IndexModel([("operation_id", ASCENDING)]),
+        IndexModel([("route_id", ASCENDING), ("operation_id", ASCENDING)]),
+        IndexModel([("product_id", ASCENDING), ("operation_id", ASCENDING)]),
+        IndexModel([("family_id", ASCENDING), ("operation_id", ASCENDING)]),
+        IndexModel([("atelier_id", ASCENDING), ("operation_id", ASCENDING)]),
+    ],
+    "measurements": [
+        IndexModel([("meta.characteristic_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("meta.operation_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("meta.product_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("meta.workstation_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("meta.route_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("meta.family_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("meta.atelier_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("serial_number", ASCENDING)]),
+    ],
+    "daily_rollups": [
+        IndexModel([("_id.day", ASCENDING)]),
+        IndexModel([("_id.characteristic_id", ASCENDING), ("_id.day", ASCENDING)]),
+    ],
+    "alerts": [
+        # active list (newest first) and de-duplication per characteristic/rule
+        IndexModel([("status", ASCENDING), ("last_seen", DESCENDING)]),
+        IndexModel([("characteristic_id", ASCENDING), ("rule", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("meta.product_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+}
+
+
+def ensure_measurements_collection(db):
+    """
+    Create `measurements` as a time-series collection.
+    A legacy (regular) collection is kept as `measurements_legacy`.
+    """
+    info = next(db.list_collections(filter={"name": "measurements"}), None)
+    if info and info.get("type") != "timeseries":
+        if db.measurements.estimated_document_count() > 0:
+            db.measurements.rename("measurements_legacy", dropTarget=True)
+            print("📦 Legacy measurements moved to `measurements_legacy`.")
+        else:
+            db.measurements.drop()
+        info = None
+
+    if not info:
+        db.create_collection("measurements", timeseries=MEASUREMENTS_TIMESERIES)
+
+
+def apply_index_manifest(db):
+    """Create every index in INDEX_MANIFEST (existing ones are left as they are)"""
+    for coll, indexes in INDEX_MANIFEST.items():
+        db[coll].create_indexes(indexes)
+
+
+def backfill_ancestry(db):
+    """
+    Write the ANCESTRY fields on existing documents, level by level from the
+    top: one update_many per parent (a single bulk_write per collection), then
+    the ids measurements and alerts are missing in `meta`, per characteristic.
+    """
+    for collection, fields in ANCESTRY.items():
+        if collection == "families":
+            continue
+        parent_field = fields[0]
+        parent_collection = next(c for c, f in ID_FIELDS.items() if f == parent_field)
+        ops = [
+            UpdateMany({parent_field: parent["_id"]},
+                       {"$set": {f: parent.get(f) for f in ANCESTRY[parent_collection]}})
+            for parent in db[parent_collection].find({}, {f: 1 for f in ANCESTRY[parent_collection]})
+        ]
+        if ops:
+            db[collection].bulk_write(ops, ordered=False)
 
+    meta_fields = [f for f in ANCESTRY["characteristics"] if f != "atelier_id"]
+    ops = [
+        UpdateMany({"meta.characteristic_id": char["_id"]},
+                   {"$set": {f"meta.{f}": char.get(f) for f in meta_fields}})
+        for char in db.characteristics.find({}, {f: 1 for f in meta_fields})
+    ]
+    if ops:
+        for collection in ("measurements", "alerts"):
+            db[collection].bulk_write(ops, ordered=False)
+
+
+def get_schema_version(db) -> int:
+    doc = db[META_COLLECTION].find_one({"_id": "schema"}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+@st.cache_resource(show_spinner=False)
 def initialize_mongo_if_needed():
     """
-    If no products exist, drop & seed all collections with demo data.
+    One-time bootstrap per server process (cached resource, so reruns skip it):
+      - seed demo data if there are no users
+      - if the stored schema version is behind SCHEMA_VERSION, create the
+        time-series collection, apply the index manifest, backfill the
+        ancestry fields and record the version
+    Safe to run again: every step is idempotent.
     """
     db = get_db()
-    if db["users"].count_documents({}) == 0:
+    if db.users.find_one({}, {"_id": 1}) is None:
         seed_demo_data(db)
         print("✅ MongoDB seeded successfully.")
 
+    version = get_schema_version(db)
+    if version < SCHEMA_VERSION:
+        ensure_measurements_collection(db)
+        apply_index_manifest(db)
+        backfill_ancestry(db)
+        db[META_COLLECTION].update_one(
+            {"_id": "schema"},
+            {"$set": {"version": SCHEMA_VERSION, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        print(f"🗂️ MongoDB schema upgraded {version} → {SCHEMA_VERSION}.")
+    return SCHEMA_VERSION
+
+
 def seed_demo_data(db):
     """
     Drop existing data and insert demo collections:
@@ -64,55 +258,45 @@ def seed_demo_data(db):
       - characteristics
       - measurements (left empty)
       - users
+    Each collection is written with a single insert_many.
     """
     print("🌱 Seeding MongoDB with demo data...")
 
-    # 1) Clear existing collections
+    # 1) Clear existing collections (and force the schema step to run again)
     for coll in [
         "users", "families", "products",
         "ateliers", "workstations", "routes",
-        "operations", "characteristics", "measurements"
+        "operations", "characteristics", "daily_rollups",
+        "alerts", "alert_state", "alert_backlog", META_COLLECTION
     ]:
         db[coll].delete_many({})
+    db.measurements.drop()
+    ensure_measurements_collection(db)
 
-    # 2) Create indexes
-    db.families.create_index("name", unique=True)
-    db.ateliers.create_index("name", unique=True)
-    db.workstations.create_index("name", unique=True)
-    db.products.create_index("code", unique=True)
-    db.routes.create_index([("product_id", 1), ("name", 1)], unique=True)
-    db.users.create_index("username", unique=True)
-    db.users.create_index("preferred_language")  # Add language index
-    # 3) Seed Families
+    # 2) Seed Families
     families = [
         "Turbines", "Primary Structures", "Cockpit Components",
         "Hydraulic Systems", "Instrumentation", "Outer Skin",
         "Navigation Systems", "Landing Gear", "Flight Controls"
     ]
-    family_ids = {}
-    for name in families:
-        res = db.families.insert_one({"name": name})
-        family_ids[name] = res.inserted_id
+    res = db.families.insert_many([{"name": name} for name in families])
+    family_ids = dict(zip(families, res.inserted_ids))
 
-    # 4) Seed Ateliers (Zones)
+    # 3) Seed Ateliers (Zones)
     ateliers = ["Assembly", "Machining", "Inspection", "Packaging"]
-    atelier_ids = {}
-    for name in ateliers:
-        res = db.ateliers.insert_one({"name": name})
-        atelier_ids[name] = res.inserted_id
-
-    # 5) Seed Workstations (2 per Atelier)
-    workstation_ids = {}
-    for atelier, a_id in atelier_ids.items():
-        for i in range(1, 3):
-            ws_name = f"{atelier} WS{i}"
-            res = db.workstations.insert_one({
-                "name": ws_name,
-                "atelier_id": a_id
-            })
-            workstation_ids[ws_name] = res.inserted_id
-
-    # 6) Seed Products
+    res = db.ateliers.insert_many([{"name": name} for name in ateliers])
+    atelier_ids = dict(zip(ateliers, res.inserted_ids))
+
+    # 4) Seed Workstations (2 per Atelier)
+    ws_docs = [
+        {"name": f"{atelier} WS{i}", "atelier_id": a_id}
+        for atelier, a_id in atelier_ids.items()
+        for i in range(1, 3)
+    ]
+    res = db.workstations.insert_many(ws_docs)
+    workstation_ids = {d["name"]: _id for d, _id in zip(ws_docs, res.inserted_ids)}
+
+    # 5) Seed Products
     products = [
         ("AX-900", "AX Turbine"),
         ("EST-FLEXWING", "Flexible Wing"),
@@ -120,64 +304,66 @@ def seed_demo_data(db):
         ("HYD-VALVEX", "Hydraulic Valve X"),
         ("INS-ALT360", "Altimeter 360")
     ]
-    product_ids = {}
-    for code, name in products:
-        fam = random.choice(families)
-        res = db.products.insert_one({
+    res = db.products.insert_many([
+        {
             "code": code,
             "name": name,
-            "family_id": family_ids[fam],
+            "family_id": family_ids[random.choice(families)],
             "description": f"{name} for aerospace applications"
-        })
-        product_ids[code] = res.inserted_id
-
-    # 7) Seed Routes (2 per Product, assigned to random WS)
-    route_ids = {}
-    for code, pid in product_ids.items():
-        for suffix in ("A", "B"):
-            route_name = f"{code}-Route-{suffix}"
-            ws_name = random.choice(list(workstation_ids.keys()))
-            res = db.routes.insert_one({
-                "product_id": pid,
-                "workstation_id": workstation_ids[ws_name],
-                "name": route_name
-            })
-            route_ids[route_name] = res.inserted_id
-
-    # 8) Seed Operations (3 per Route)
-    operation_ids = {}
-    for rname, rid in route_ids.items():
-        for step in range(1, 4):
-            op_name = f"Op{step} - {rname}"
-            res = db.operations.insert_one({
-                "route_id": rid,
-                "step_number": step,
-                "name": op_name,
-                "description": "",
-                "image_path": None,
-                "annotation_path": None
-            })
-            operation_ids[op_name] = res.inserted_id
-
-    # 9) Seed Characteristics (2 per Operation)
-    for opname, oid in operation_ids.items():
-        for axis in ("X", "Y"):
-            char_name = f"Char{axis} - {opname}"
-            db.characteristics.insert_one({
-                "operation_id": oid,
-                "name": char_name,
-                "designation": "Diameter",
-                "unit": "mm",
-                "nominal": 100.0,
-                "tol_min": -0.1,
-                "tol_max": 0.2,
-                "image_path": None,
-                "annotation_path": None
-            })
-
-    # 10) Leave `measurements` empty for real data entry
-
-    # 11) Seed Admin User
+        }
+        for code, name in products
+    ])
+    product_ids = {code: _id for (code, _), _id in zip(products, res.inserted_ids)}
+
+    # 6) Seed Routes (2 per Product, assigned to random WS)
+    route_docs = [
+        {
+            "product_id": pid,
+            "workstation_id": workstation_ids[random.choice(list(workstation_ids))],
+            "name": f"{code}-Route-{suffix}"
+        }
+        for code, pid in product_ids.items()
+        for suffix in ("A", "B")
+    ]
+    res = db.routes.insert_many(route_docs)
+    route_ids = {d["name"]: _id for d, _id in zip(route_docs, res.inserted_ids)}
+
+    # 7) Seed Operations (3 per Route)
+    op_docs = [
+        {
+            "route_id": rid,
+            "step_number": step,
+            "name": f"Op{step} - {rname}",
+            "description": "",
+            "image_path": None,
+            "annotation_path": None
+        }
+        for rname, rid in route_ids.items()
+        for step in range(1, 4)
+    ]
+    res = db.operations.insert_many(op_docs)
+    operation_ids = {d["name"]: _id for d, _id in zip(op_docs, res.inserted_ids)}
+
+    # 8) Seed Characteristics (2 per Operation)
+    db.characteristics.insert_many([
+        {
+            "operation_id": oid,
+            "name": f"Char{axis} - {opname}",
+            "designation": "Diameter",
+            "unit": "mm",
+            "nominal": 100.0,
+            "tol_min": -0.1,
+            "tol_max": 0.2,
+            "image_path": None,
+            "annotation_path": None
+        }
+        for opname, oid in operation_ids.items()
+        for axis in ("X", "Y")
+    ])
+
+    # 9) Leave `measurements` empty for real data entry
+
+    # 10) Seed Admin User
     username = "1"
     password = "1"
     create_admin_user(username, password)
@@ -0,0 +1,61 @@
+# utils/parallel.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+from utils.mongo import get_setting
+from utils.profiler import record_span
+
+# Independent reads of a page run together on one process-wide thread pool,
+# so a page pays the round-trip latency once per batch instead of once per
+# read. pymongo clients are thread-safe and pool their connections; cached
+# reads (st.cache_data) are shared across threads as they are across sessions.
+_pool = None
+_pool_lock = threading.Lock()
+_worker = threading.local()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(get_setting("QUERY_THREADS", 8)),
+                                       thread_name_prefix="query-batch")
+        return _pool
+
+
+def _run(name: str, func, ctx):
+    # the session's context lets cached reads run as in the script thread
+    thread = threading.current_thread()
+    add_script_run_ctx(thread, ctx)
+    _worker.active = True
+    t0 = time.perf_counter()
+    try:
+        return func()
+    finally:
+        _worker.active = False
+        # the pool thread must not keep (or lend the next read) a finished session
+        thread.__dict__.pop(SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+        record_span(name, (time.perf_counter() - t0) * 1000)
+
+
+def gather(batch: str, /, **reads) -> dict:
+    """
+    Run independent reads concurrently and return {name: result}:
+        gather("dashboard", kpis=get_dashboard_kpis, alerts=lambda: count_alerts("active"))
+    The batch wall time is recorded as the profiler span "batch.<batch>" and
+    each read as "batch.<batch>.<name>". The first failing read re-raises.
+    A batch started from inside another batch runs inline (no pool deadlock).
+    """
+    t0 = time.perf_counter()
+    try:
+        if len(reads) < 2 or getattr(_worker, "active", False):
+            return {name: func() for name, func in reads.items()}
+        ctx = get_script_run_ctx(suppress_warning=True)
+        futures = {name: _executor().submit(_run, f"batch.{batch}.{name}", func, ctx)
+                   for name, func in reads.items()}
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        record_span(f"batch.{batch}", (time.perf_counter() - t0) * 1000)
@@ -0,0 +1,82 @@
+# utils/profiler.py
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Process-wide counters: Mongo commands (via a CommandListener registered on
+# the client) and named timing spans. Read them with snapshot(), clear with reset().
+# Spans are recorded on every render in production, so each name keeps only
+# running aggregates: [count, total ms, max ms].
+_lock = threading.Lock()
+_queries = defaultdict(int)
+_query_ms = defaultdict(float)
+_spans = defaultdict(lambda: [0, 0.0, 0.0])
+
+# Driver housekeeping that is not a query issued by the app
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo",
+    "endSessions", "saslStart", "saslContinue", "killCursors",
+}
+
+
+def record_query(command: str, duration_ms: float = 0.0):
+    with _lock:
+        _queries[command] += 1
+        _query_ms[command] += duration_ms
+
+
+def record_span(name: str, duration_ms: float):
+    with _lock:
+        stats = _spans[name]
+        stats[0] += 1
+        stats[1] += duration_ms
+        stats[2] = max(stats[2], duration_ms)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block: `with span("dashboard.kpis"): ...`"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, (time.perf_counter() - t0) * 1000)
+
+
+def snapshot() -> dict:
+    """Copy of the counters: query counts/time per command and span stats"""
+    with _lock:
+        return {
+            "queries": sum(_queries.values()),
+            "by_command": dict(_queries),
+            "query_ms": round(sum(_query_ms.values()), 2),
+            "spans": {
+                name: {"count": count, "total_ms": round(total, 2), "max_ms": round(longest, 2)}
+                for name, (count, total, longest) in _spans.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _queries.clear()
+        _query_ms.clear()
+        _spans.clear()
+
+
+class QueryCounter(monitoring.CommandListener):
+    """Counts every command the app sends to Mongo, with its server time"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            record_query(event.command_name, event.duration_micros / 1000)
+
+    def failed(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            record_query(event.command_name, event.duration_micros / 1000)
@@ -0,0 +1,182 @@
+# utils/repository.py
+
+from typing import Callable, Dict, List, Optional, Tuple
+import streamlit as st
+from bson import ObjectId
+from utils.mongo import ANCESTRY, ID_FIELDS, get_db
+from utils.kpis import get_dashboard_kpis
+from utils.rollups import get_monthly_production, get_characteristic_trend
+
+# Cached reads are shared by every session and keyed by their arguments.
+# Write paths must call invalidate(<collection>) so the next rerun sees fresh data.
+CACHE_TTL = 300
+HASH_FUNCS = {ObjectId: str}
+
+
+def cached_read(func):
+    """st.cache_data with the repository TTL and ObjectId-aware argument hashing"""
+    return st.cache_data(ttl=CACHE_TTL, show_spinner=False, hash_funcs=HASH_FUNCS)(func)
+
+
+@cached_read
+def list_ateliers() -> List[dict]:
+    return list(get_db().ateliers.find({}).sort("name", 1))
+
+
+@cached_read
+def list_workstations(atelier_id: Optional[ObjectId] = None) -> List[dict]:
+    query = {"atelier_id": atelier_id} if atelier_id else {}
+    return list(get_db().workstations.find(query).sort("name", 1))
+
+
+@cached_read
+def list_families(atelier_id: Optional[ObjectId] = None) -> List[dict]:
+    query = {"atelier_id": atelier_id} if atelier_id else {}
+    return list(get_db().families.find(query).sort("name", 1))
+
+
+@cached_read
+def count_families() -> int:
+    return get_db().families.estimated_document_count()
+
+
+# Scope levels of the global filters, most specific first
+SCOPE_FIELDS = ("route_id", "product_id", "family_id", "atelier_id")
+
+
+def scope_query(collection: str, **scope) -> dict:
+    """
+    Filter for a collection from any combination of atelier_id / family_id /
+    product_id / route_id: one equality on the most specific level set, on
+    the document's own _id, an ancestry field or, for measurements, meta.
+    """
+    for field in SCOPE_FIELDS:
+        value = scope.get(field)
+        if not value:
+            continue
+        if ID_FIELDS.get(collection) == field:
+            return {"_id": value}
+        if collection in ("measurements", "alerts"):
+            return {f"meta.{field}": value}
+        if field in ANCESTRY.get(collection, []):
+            return {field: value}
+    return {}
+
+
+def product_query(family_id: Optional[ObjectId] = None,
+                  product_id: Optional[ObjectId] = None,
+                  atelier_id: Optional[ObjectId] = None) -> dict:
+    return scope_query("products", atelier_id=atelier_id, family_id=family_id, product_id=product_id)
+
+
+@cached_read
+def list_products(family_id: Optional[ObjectId] = None,
+                  product_id: Optional[ObjectId] = None,
+                  atelier_id: Optional[ObjectId] = None) -> List[dict]:
+    return list(get_db().products.find(product_query(family_id, product_id, atelier_id)).sort("code", 1))
+
+
+@cached_read
+def list_routes(product_id: Optional[ObjectId] = None) -> List[dict]:
+    query = {"product_id": product_id} if product_id else {}
+    return list(get_db().routes.find(query))
+
+
+@cached_read
+def list_operations(route_id: Optional[ObjectId] = None,
+                    product_id: Optional[ObjectId] = None) -> List[dict]:
+    """Operations of a route, or of every route of a product (one query), by step"""
+    query = {"route_id": route_id} if route_id else {"product_id": product_id}
+    return list(get_db().operations.find(query).sort([("route_id", 1), ("step_number", 1)]))
+
+
+@cached_read
+def list_characteristics(operation_id: Optional[ObjectId] = None, active_only: bool = False,
+                         product_id: Optional[ObjectId] = None) -> List[dict]:
+    """Characteristics of an operation, or of a whole product (one query)"""
+    query = {"operation_id": operation_id} if operation_id else {"product_id": product_id}
+    if active_only:
+        query["active"] = {"$ne": False}
+    return list(get_db().characteristics.find(query))
+
+
+CHAR_PAGE_SIZE = 100
+
+
+@cached_read
+def characteristic_page(operation_id: ObjectId, page: int = 0,
+                        page_size: int = CHAR_PAGE_SIZE) -> Tuple[int, List[dict]]:
+    """(total, one page by designation) of an operation's characteristics, in one $facet"""
+    result = list(get_db().characteristics.aggregate([
+        {"$match": {"operation_id": operation_id}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "rows": [{"$sort": {"designation": 1, "_id": 1}}, {"$skip": page * page_size}, {"$limit": page_size}],
+        }},
+    ]))[0]
+    return (result["total"][0]["n"] if result["total"] else 0), result["rows"]
+
+
+# Fields of the process tree, per level (everything the routes, characteristics
+# and measurements pages read)
+TREE_FIELDS = {
+    "routes":          ["_id", "name", "workstation_id"],
+    "operations":      ["_id", "route_id", "name", "step_number", "description", "image_path", "annotation_path"],
+    "characteristics": ["_id", "operation_id", "route_id", "product_id", "family_id", "atelier_id",
+                        "name", "designation", "unit", "nominal", "tol_min", "tol_max", "active",
+                        "image_path", "annotation_path"],
+}
+
+
+@cached_read
+def process_tree(product_id: ObjectId) -> List[dict]:
+    """
+    Routes of a product, each with its "operations" (by step) and each
+    operation with its "characteristics": one projected find per level on its
+    product_id index, nested here (a single document holding the whole tree
+    could exceed the 16 MB BSON limit on large products).
+    """
+    db = get_db()
+    found = {level: list(db[level].find({"product_id": product_id}, {f: 1 for f in fields}))
+             for level, fields in TREE_FIELDS.items()}
+
+    chars_by_op: Dict[ObjectId, list] = {}
+    for char in found["characteristics"]:
+        chars_by_op.setdefault(char.get("operation_id"), []).append(char)
+    ops_by_route: Dict[ObjectId, list] = {}
+    for op in sorted(found["operations"], key=lambda o: o.get("step_number") or 0):
+        op["characteristics"] = chars_by_op.get(op["_id"], [])
+        ops_by_route.setdefault(op.get("route_id"), []).append(op)
+    routes = found["routes"]
+    for route in routes:
+        route["operations"] = ops_by_route.get(route["_id"], [])
+    return routes
+
+
+# Which cached reads depend on which collection
+_DEPENDENTS: Dict[str, List[Callable]] = {
+    "ateliers":        [list_ateliers, get_dashboard_kpis],
+    "workstations":    [list_workstations, get_dashboard_kpis],
+    "families":        [list_families, count_families],
+    "products":        [list_products, get_dashboard_kpis],
+    "routes":          [list_routes, process_tree, get_dashboard_kpis],
+    "operations":      [list_operations, process_tree],
+    "characteristics": [list_characteristics, characteristic_page, process_tree],
+    "measurements":    [get_dashboard_kpis, get_monthly_production, get_characteristic_trend],
+    "daily_rollups":   [get_dashboard_kpis, get_monthly_production, get_characteristic_trend],
+}
+
+
+def register_dependent(collection: str, cached_func: Callable):
+    """Let another module's cached read be cleared when `collection` changes"""
+    _DEPENDENTS.setdefault(collection, []).append(cached_func)
+
+
+def invalidate(*collections: str):
+    """Clear every cached read that depends on the given collections"""
+    cleared = set()
+    for collection in collections:
+        for func in _DEPENDENTS.get(collection, []):
+            if id(func) not in cleared:
+                func.clear()
+                cleared.add(id(func))
@@ -0,0 +1,179 @@
+# utils/rollups.py
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import streamlit as st
+from bson import ObjectId
+from pymongo import UpdateOne
+from utils.mongo import get_db
+
+# Materialized per-day aggregates, one document per
+# (day, atelier, workstation, product, characteristic)
+ROLLUP_COLLECTION = "daily_rollups"
+DIMENSIONS = ("atelier_id", "workstation_id", "product_id", "characteristic_id")
+
+# Periodic compaction: rebuild the last N days from raw measurements
+COMPACTION_INTERVAL = 3600
+COMPACTION_DAYS = 2
+ROLLUP_TTL = 300
+
+_compaction_lock = threading.Lock()
+_last_compaction = 0.0
+
+
+def _day(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def rollup_key(timestamp: datetime, meta: dict) -> dict:
+    """Rollup _id for a measurement timestamp and its meta ids"""
+    key = {"day": _day(timestamp)}
+    for dim in DIMENSIONS:
+        key[dim] = meta.get(dim)
+    return key
+
+
+def rollup_update(value, timestamp, meta, lsl=None, usl=None, out_of_spec=False):
+    """UpdateOne that folds one measurement into its daily rollup"""
+    update = {
+        "$inc": {
+            "count": 1,
+            "oos_count": int(bool(out_of_spec)),
+            "sum": value,
+            "sum_sq": value * value,
+        },
+        "$min": {"min": value},
+        "$max": {"max": value},
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+    }
+    if lsl is not None and usl is not None:
+        update["$set"].update({"lsl": lsl, "usl": usl})
+    return UpdateOne({"_id": rollup_key(timestamp, meta)}, update, upsert=True)
+
+
+def record_measurement(value, timestamp, meta, lsl=None, usl=None, out_of_spec=False):
+    """Incrementally update the daily rollup for a newly inserted measurement"""
+    get_db()[ROLLUP_COLLECTION].bulk_write(
+        [rollup_update(value, timestamp, meta, lsl, usl, out_of_spec)]
+    )
+
+
+def compact_rollups(days=COMPACTION_DAYS):
+    """
+    Recompute rollups from raw measurements with $group + $merge.
+    days=None rebuilds the whole history.
+    """
+    db = get_db()
+    pipeline = []
+    if days is not None:
+        since = _day(datetime.now(timezone.utc) - timedelta(days=days))
+        pipeline.append({"$match": {"timestamp": {"$gte": since}}})
+
+    group_id = {"day": {"$dateFromParts": {
+        "year": {"$year": "$timestamp"},
+        "month": {"$month": "$timestamp"},
+        "day": {"$dayOfMonth": "$timestamp"},
+    }}}
+    for dim in DIMENSIONS:
+        group_id[dim] = {"$ifNull": [f"$meta.{dim}", None]}
+
+    pipeline += [
+        {"$group": {
+            "_id": group_id,
+            "count": {"$sum": 1},
+            "oos_count": {"$sum": {"$cond": [{"$eq": ["$out_of_spec", True]}, 1, 0]}},
+            "sum": {"$sum": "$value"},
+            "sum_sq": {"$sum": {"$multiply": ["$value", "$value"]}},
+            "min": {"$min": "$value"},
+            "max": {"$max": "$value"},
+            "lsl": {"$last": "$lsl"},
+            "usl": {"$last": "$usl"},
+        }},
+        {"$set": {"updated_at": "$$NOW"}},
+        {"$merge": {"into": ROLLUP_COLLECTION, "on": "_id",
+                    "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    db.measurements.aggregate(pipeline)
+
+
+def compact_rollups_if_due():
+    """Run the compaction job in a background thread, at most once per interval"""
+    global _last_compaction
+    with _compaction_lock:
+        now = time.time()
+        if now - _last_compaction < COMPACTION_INTERVAL:
+            return
+        _last_compaction = now
+    threading.Thread(target=compact_rollups, daemon=True, name="rollup-compaction").start()
+
+
+def rollup_stats(count, total, sum_sq, lsl=None, usl=None):
+    """Mean, variance and Cpk from rollup sums"""
+    mean = total / count if count else None
+    variance = (sum_sq - total * total / count) / (count - 1) if count > 1 else None
+    cpk = None
+    if variance and variance > 0 and lsl is not None and usl is not None:
+        sigma = variance ** 0.5
+        cpk = min(usl - mean, mean - lsl) / (3 * sigma)
+    return mean, variance, cpk
+
+
+def _rollup_match(start, end, filters):
+    match = {"_id.day": {"$gte": _day(start), "$lte": _day(end)}}
+    for dim, value in (filters or {}).items():
+        if dim in DIMENSIONS and value is not None:
+            match[f"_id.{dim}"] = value
+    return match
+
+
+@st.cache_data(ttl=ROLLUP_TTL, show_spinner=False, hash_funcs={ObjectId: str})
+def get_monthly_production(months=12, filters=None) -> list:
+    """Measured parts and OOS per month, read from the daily rollups"""
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=31 * months)
+    pipeline = [
+        {"$match": _rollup_match(start, end, filters)},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m", "date": "$_id.day"}},
+            "count": {"$sum": "$count"},
+            "oos_count": {"$sum": "$oos_count"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [
+        {"month": r["_id"], "count": r["count"], "oos_count": r["oos_count"]}
+        for r in get_db()[ROLLUP_COLLECTION].aggregate(pipeline)
+    ]
+
+
+@st.cache_data(ttl=ROLLUP_TTL, show_spinner=False, hash_funcs={ObjectId: str})
+def get_characteristic_trend(characteristic_id, days=365) -> list:
+    """Daily count, OOS, mean, variance and Cpk for one characteristic"""
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+    pipeline = [
+        {"$match": _rollup_match(start, end, {"characteristic_id": characteristic_id})},
+        {"$group": {
+            "_id": "$_id.day",
+            "count": {"$sum": "$count"},
+            "oos_count": {"$sum": "$oos_count"},
+            "sum": {"$sum": "$sum"},
+            "sum_sq": {"$sum": "$sum_sq"},
+            "lsl": {"$last": "$lsl"},
+            "usl": {"$last": "$usl"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    trend = []
+    for r in get_db()[ROLLUP_COLLECTION].aggregate(pipeline):
+        mean, variance, cpk = rollup_stats(r["count"], r["sum"], r["sum_sq"], r.get("lsl"), r.get("usl"))
+        trend.append({
+            "day": r["_id"],
+            "count": r["count"],
+            "oos_count": r["oos_count"],
+            "mean": mean,
+            "variance": variance,
+            "cpk": cpk,
+        })
+    return trend
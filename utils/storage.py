@@ -0,0 +1,235 @@
+# utils/storage.py
+
+import io
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import streamlit as st
+import gridfs
+from utils.mongo import get_db, get_setting
+
+# Local folders used by the "local" backend (one per bucket)
+BASE = Path(__file__).resolve().parent.parent
+LOCAL_DIRS = {
+    "images":      BASE / "static" / "images",
+    "annotations": BASE / "static" / "annotations",
+    "uploads":     BASE / "uploads",
+}
+
+# 255 KiB is the GridFS default chunk size; we stream with the same size locally
+CHUNK_SIZE = 255 * 1024
+
+# In-process cache limits
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_ITEM  = 8 * 1024 * 1024
+
+
+def _iter_source(data, chunk_size=CHUNK_SIZE):
+    """Yield chunks from bytes, a file-like object (e.g. UploadedFile) or an iterable of bytes."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start:start + chunk_size])
+    elif isinstance(data, str):
+        yield from _iter_source(data.encode("utf-8"), chunk_size)
+    elif hasattr(data, "read"):
+        if hasattr(data, "seek"):
+            data.seek(0)
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in data:
+            yield chunk
+
+
+class LRUByteCache:
+    """Thread-safe LRU cache of file contents, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_item=CACHE_MAX_ITEM):
+        self.max_bytes = max_bytes
+        self.max_item = max_item
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_item:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class LocalStorage:
+    """Stores files in a folder on the app server's disk."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name):
+        # Older documents store "uploads/foo.png" - only the basename is the key
+        return self.root / Path(name).name
+
+    def exists(self, name):
+        return self._path(name).exists()
+
+    def version(self, name):
+        """Token that changes when the file is rewritten (None if missing)"""
+        try:
+            stat = self._path(name).stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def write_stream(self, name, chunks):
+        with self._path(name).open("wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+    def iter_chunks(self, name, chunk_size=CHUNK_SIZE):
+        with self._path(name).open("rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete(self, name):
+        path = self._path(name)
+        if path.exists():
+            path.unlink()
+
+
+class GridFSStorage:
+    """Stores files in a MongoDB GridFS bucket, shared by every app node."""
+
+    def __init__(self, db, bucket_name):
+        self.bucket_name = bucket_name
+        self.files = db[f"{bucket_name}.files"]
+        self.fs = gridfs.GridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+
+    def exists(self, name):
+        return self.files.count_documents({"filename": Path(name).name}, limit=1) > 0
+
+    def version(self, name):
+        """_id of the latest revision (None if missing)"""
+        latest = self.files.find_one({"filename": Path(name).name}, {"_id": 1},
+                                     sort=[("uploadDate", -1), ("_id", -1)])
+        return latest["_id"] if latest else None
+
+    def write_stream(self, name, chunks):
+        name = Path(name).name
+        # Upload the new revision first, then drop the older ones
+        with self.fs.open_upload_stream(name) as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+            new_id = stream._id
+        for old in self.files.find({"filename": name, "_id": {"$ne": new_id}}, {"_id": 1}):
+            self.fs.delete(old["_id"])
+
+    def iter_chunks(self, name, chunk_size=CHUNK_SIZE):
+        try:
+            stream = self.fs.open_download_stream_by_name(Path(name).name)
+        except gridfs.errors.NoFile:
+            raise FileNotFoundError(name)
+        with stream:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete(self, name):
+        for old in self.files.find({"filename": Path(name).name}, {"_id": 1}):
+            self.fs.delete(old["_id"])
+
+
+class CachedStorage:
+    """
+    Front for a storage backend with an in-process LRU byte cache. Entries
+    are keyed on the backend's version of the file (mtime / GridFS revision),
+    checked on every read, so a rewrite or delete made by any app node is
+    seen at once; stale entries are never hit and age out of the LRU.
+    """
+
+    def __init__(self, backend, cache: LRUByteCache):
+        self.backend = backend
+        self.cache = cache
+
+    def _key(self, name):
+        version = self.backend.version(name)
+        if version is None:
+            raise FileNotFoundError(name)
+        return (id(self.backend), Path(name).name, version)
+
+    def exists(self, name):
+        if not name:
+            return False
+        return self.backend.exists(name)
+
+    def write(self, name, data):
+        """Write bytes, text or a file-like object in chunks."""
+        self.backend.write_stream(name, _iter_source(data))
+        return Path(name).name
+
+    def iter_chunks(self, name, chunk_size=CHUNK_SIZE):
+        cached = self.cache.get(self._key(name))
+        if cached is not None:
+            yield from _iter_source(cached, chunk_size)
+        else:
+            yield from self.backend.iter_chunks(name, chunk_size)
+
+    def read_bytes(self, name):
+        key = self._key(name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        data = b"".join(self.backend.iter_chunks(name))
+        self.cache.put(key, data)
+        return data
+
+    def read_text(self, name, encoding="utf-8"):
+        return self.read_bytes(name).decode(encoding)
+
+    def open(self, name):
+        """Return a file-like object (e.g. for PIL.Image.open)."""
+        return io.BytesIO(self.read_bytes(name))
+
+    def delete(self, name):
+        self.backend.delete(name)
+
+
+@st.cache_resource
+def _get_byte_cache():
+    return LRUByteCache()
+
+
+@st.cache_resource
+def get_storage(bucket: str) -> CachedStorage:
+    """
+    Return the storage for a bucket ("images", "annotations", "uploads").
+    Backend is chosen by the STORAGE_BACKEND secret: "local" (default) or "gridfs".
+    """
+    backend_name = get_setting("STORAGE_BACKEND", "local")
+    if backend_name == "gridfs":
+        backend = GridFSStorage(get_db(), bucket)
+    else:
+        backend = LocalStorage(LOCAL_DIRS[bucket])
+    return CachedStorage(backend, _get_byte_cache())
@@ -0,0 +1,275 @@
+# utils/stream.py
+
+import asyncio
+import csv
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+import streamlit as st
+from bson import ObjectId
+from pymongo.errors import ConnectionFailure
+from utils.mongo import get_db, get_setting
+from utils.measurement_store import (
+    MEASUREMENT_PROJECTION, build_measurement, build_meta, insert_measurements, stored_ids,
+)
+from utils.repository import register_dependent
+from utils.alerts import defer as defer_alerts
+
+# Gauges push readings over TCP (one JSON object or CSV line per reading) or
+# drop .jsonl/.ndjson/.csv files in a watched folder. Both are off unless
+# STREAM_PORT / STREAM_DIR are set.
+#   {"characteristic_id": "<id>", "value": 12.03, "serial_number": "SN1", "operator": "op"}
+#   <characteristic_id>,<value>[,<serial_number>[,<operator>[,<ISO timestamp>]]]
+STREAM_HOST = "127.0.0.1"
+STREAM_FILE_SUFFIXES = {".jsonl", ".ndjson", ".csv"}
+WATCH_INTERVAL = 1.0
+BATCH_SIZE = 500
+BUFFER_POINTS = 500  # latest points kept per characteristic for live charts
+FIELDS = ["characteristic_id", "value", "serial_number", "operator", "timestamp"]
+CHARACTERISTIC_TTL = 60  # seconds a characteristic's limits and ancestry are reused
+
+# A batch that fails to store is retried with backoff: until Mongo is
+# reachable again for connection errors, STORE_RETRIES times for others.
+# A retry resumes where the failed attempt stopped (see insert_measurements).
+STORE_RETRIES = 3
+RETRY_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+
+def parse_reading(line: str) -> dict:
+    """One JSON or CSV reading line → dict (ValueError if malformed)"""
+    line = line.strip()
+    if line.startswith("{"):
+        reading = json.loads(line)
+    else:
+        reading = dict(zip(FIELDS, next(csv.reader([line]))))
+    if "characteristic_id" not in reading or "value" not in reading:
+        raise ValueError("characteristic_id and value are required")
+    reading["characteristic_id"] = ObjectId(reading["characteristic_id"])
+    reading["value"] = float(reading["value"])
+    if reading.get("timestamp"):
+        timestamp = datetime.fromisoformat(reading["timestamp"])
+        reading["timestamp"] = timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+    return reading
+
+
+class MeasurementStream:
+    """
+    Ingestion loop in a background thread: TCP listener and folder watcher
+    feed an asyncio queue, drained in batches into Mongo. Stored readings are
+    kept per characteristic with a sequence number so pages can fetch only
+    what is new since their last refresh.
+    """
+
+    def __init__(self, port=None, folder=None, host=STREAM_HOST):
+        self.port = port
+        self.folder = folder
+        self.host = host
+        self.stats = {"received": 0, "stored": 0, "rejected": 0}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._points = defaultdict(lambda: deque(maxlen=BUFFER_POINTS))
+        self._characteristics = {}
+        # edits to characteristics (limits, re-parenting) drop the lookups
+        register_dependent("characteristics", self._characteristics)
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        threading.Thread(target=self._run, name="measurement-stream", daemon=True).start()
+        self._started.wait()
+
+    # -- buffer (any thread) ---------------------------------------------------
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def publish(self, characteristic_id, doc: dict):
+        """Add a stored reading to the live buffer"""
+        point = {key: doc.get(key) for key in MEASUREMENT_PROJECTION if key != "_id"}
+        # same form as timestamps read back from Mongo (naive UTC)
+        if point["timestamp"].tzinfo:
+            point["timestamp"] = point["timestamp"].astimezone(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            self._seq += 1
+            self._points[characteristic_id].append((self._seq, point))
+
+    def since(self, characteristic_id, seq: int = 0) -> tuple:
+        """(points stored after `seq` for a characteristic, current seq)"""
+        with self._lock:
+            points = [p for s, p in self._points.get(characteristic_id, ()) if s > seq]
+            return points, self._seq
+
+    def submit(self, reading: dict):
+        """Queue a parsed reading from another thread"""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, reading)
+
+    # -- event loop ------------------------------------------------------------
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._consume())
+        if self.port:
+            try:
+                self._loop.run_until_complete(asyncio.start_server(self._handle_client, self.host, self.port))
+                print(f"📡 Measurement stream listening on {self.host}:{self.port}")
+            except OSError as e:
+                print(f"❌ Measurement stream could not listen on {self.host}:{self.port}: {e}")
+        if self.folder:
+            self._loop.create_task(self._watch_folder())
+            print(f"📂 Measurement stream watching {self.folder}")
+        self._started.set()
+        self._loop.run_forever()
+
+    def _parse(self, line: str):
+        """Parsed reading, or None for blank and malformed lines"""
+        if not line.strip():
+            return None
+        self.stats["received"] += 1
+        try:
+            return parse_reading(line)
+        except (ValueError, TypeError, KeyError) as e:
+            self.stats["rejected"] += 1
+            print(f"⚠️ Rejected reading {line.strip()[:80]!r}: {e}")
+            return None
+
+    def _accept(self, line: str):
+        if reading := self._parse(line):
+            self._queue.put_nowait(reading)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                self._accept(line.decode("utf-8", errors="replace"))
+        finally:
+            writer.close()
+
+    async def _watch_folder(self):
+        done = self.folder / "done"
+        done.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                await self._scan_folder(done)
+            except Exception as e:
+                print(f"❌ Measurement stream folder pass failed: {e}")
+            await asyncio.sleep(WATCH_INTERVAL)
+
+    async def _scan_folder(self, done: Path):
+        """Store each finished file, moving it to done/ once all its readings are stored"""
+        now = datetime.now().timestamp()
+        for path in sorted(self.folder.iterdir()):
+            # skip files a gauge may still be writing
+            if path.suffix not in STREAM_FILE_SUFFIXES or now - path.stat().st_mtime < WATCH_INTERVAL:
+                continue
+            lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
+            for start in range(0, len(lines), BATCH_SIZE):
+                chunk = [(line, self._parse(line)) for line in lines[start:start + BATCH_SIZE]]
+                failed = await self._store_batch([r for _, r in chunk if r])
+                if failed:
+                    # keep what was not stored for the next pass
+                    failed = {id(r) for r in failed}
+                    kept = [line for line, r in chunk if id(r) in failed] + lines[start + BATCH_SIZE:]
+                    path.write_text("\n".join(kept) + "\n", encoding="utf-8")
+                    print(f"⚠️ {path.name}: {len(kept)} lines kept for the next pass")
+                    break
+            else:
+                path.replace(done / path.name)
+
+    async def _consume(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            failed = await self._store_batch(batch)
+            self.stats["rejected"] += len(failed)
+
+    async def _store_batch(self, readings: list) -> list:
+        """Store readings with retries (see STORE_RETRIES); returns those that could not be stored"""
+        if not readings:
+            return []
+        docs, attempt, progress = None, 0, {}
+        while True:
+            attempt += 1
+            try:
+                if docs is None:
+                    docs = await asyncio.to_thread(self._build, readings)
+                await asyncio.to_thread(self._write, docs, progress)
+                return []
+            except Exception as e:
+                print(f"❌ Measurement stream batch of {len(readings)} failed (attempt {attempt}): {e}")
+                if not isinstance(e, ConnectionFailure) and attempt >= STORE_RETRIES:
+                    return await asyncio.to_thread(self._not_stored, readings, docs, progress)
+                await asyncio.sleep(min(RETRY_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY))
+
+    # -- storage (worker thread) -----------------------------------------------
+
+    def _characteristic(self, characteristic_id):
+        """Characteristic and its resolved meta ids, reused for CHARACTERISTIC_TTL seconds"""
+        cached = self._characteristics.get(characteristic_id)
+        if cached is None or time.monotonic() - cached[2] > CHARACTERISTIC_TTL:
+            char = get_db().characteristics.find_one({"_id": characteristic_id})
+            cached = (char, build_meta(char) if char else None, time.monotonic())
+            self._characteristics[characteristic_id] = cached
+        return cached[0], cached[1]
+
+    def _build(self, batch: list) -> list:
+        """Measurement documents (with their _id, kept across retries) for known characteristics"""
+        docs = []
+        for reading in batch:
+            char, meta = self._characteristic(reading["characteristic_id"])
+            if char is None:
+                self.stats["rejected"] += 1
+                continue
+            doc = build_measurement(
+                char, reading["value"], reading.get("serial_number", ""), reading.get("operator", ""),
+                timestamp=reading.get("timestamp"), meta=dict(meta)
+            )
+            doc["_id"] = reading["_id"] = ObjectId()
+            docs.append(doc)
+        return docs
+
+    def _not_stored(self, readings: list, docs: list, progress: dict) -> list:
+        """Readings of a failed batch that are not stored (readings rejected by _build excluded)"""
+        if docs is None:
+            return readings
+        if progress.get("inserted"):
+            stored = {d["_id"] for d in docs}
+            if not progress.get("evaluated"):
+                try:
+                    defer_alerts([d for d in docs if d["meta"]["characteristic_id"]
+                                  not in progress.get("alerts_done", ())])
+                except Exception:
+                    pass
+        else:
+            try:
+                stored = stored_ids(docs)
+            except Exception:
+                stored = set()
+        for doc in docs:
+            if doc["_id"] in stored:
+                self.stats["stored"] += 1
+                self.publish(doc["meta"]["characteristic_id"], doc)
+        return [r for r in readings if "_id" in r and r["_id"] not in stored]
+
+    def _write(self, docs: list, progress: dict):
+        insert_measurements(docs, progress)
+        self.stats["stored"] += len(docs)
+        for doc in docs:
+            self.publish(doc["meta"]["characteristic_id"], doc)
+
+
+@st.cache_resource
+def get_stream():
+    """Process-wide measurement stream, started on first call (None when not configured)"""
+    port = get_setting("STREAM_PORT")
+    folder = get_setting("STREAM_DIR")
+    if not port and not folder:
+        return None
+    return MeasurementStream(
+        port=int(port) if port else None,
+        folder=Path(folder) if folder else None,
+        host=get_setting("STREAM_HOST", STREAM_HOST),
+    )